@@ -0,0 +1,85 @@
+import json
+import base64
+import binascii
+
+import sqlite_pool
+
+# --- CONFIGURATION ---
+ADMIN_PAGE_SIZE = 50
+ADMIN_MAX_PAGE_SIZE = 500
+
+# name -> (database, table, columns returned, time column, column a listing may be filtered by).
+# Listings are newest first and paged by keyset on (time column, id): every page is an index
+# range scan from the previous page's last row (see schema_migrations), however deep it is.
+LISTINGS = {
+    "account_requests": (sqlite_pool.AUTH_DB_PATH, "account_requests", ("id", "email", "created_at"),
+                         "created_at", None),
+    "password_requests": (sqlite_pool.AUTH_DB_PATH, "password_reset_requests", ("id", "email", "created_at"),
+                          "created_at", None),
+    "users": (sqlite_pool.AUTH_DB_PATH, "users", ("id", "email", "created_at"), "created_at", None),
+    "chat_logs": (sqlite_pool.LOG_DB_PATH, "chat_logs",
+                  ("id", "user_id", "timestamp", "user_input", "bot_response", "used_general_knowledge"),
+                  "timestamp", "user_id"),
+    "voice_logs": (sqlite_pool.LOG_DB_PATH, "voice_logs",
+                   ("id", "user_id", "timestamp", "query", "response", "used_general_knowledge"),
+                   "timestamp", "user_id"),
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(row, time_column):
+    raw = json.dumps([row[time_column], row["id"]]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """(time value, id) of the last row of the previous page."""
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return value, int(row_id)
+    except (binascii.Error, ValueError, TypeError, UnicodeError):
+        raise InvalidCursor(f"Invalid page cursor: {cursor!r}")
+
+
+def list_page(name, cursor=None, limit=ADMIN_PAGE_SIZE, filter_value=None):
+    """
+    One page of an admin listing, newest first. Pass the returned "next_cursor" to get
+    the following page; it is None on the last page. filter_value restricts listings
+    that have a filter column (e.g. the logs of one user_id).
+    Returns {"rows": [dict, ...], "next_cursor": str or None}.
+    """
+    path, table, columns, time_column, filter_column = LISTINGS[name]
+    limit = max(1, min(int(limit), ADMIN_MAX_PAGE_SIZE))
+    where, params = [], []
+    if filter_value is not None and filter_column:
+        where.append(f"{filter_column} = ?")
+        params.append(filter_value)
+    if cursor:
+        where.append(f"({time_column}, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # One row more than asked for tells whether there is a next page.
+    sql += f" ORDER BY {time_column} DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+
+    conn = sqlite_pool.get_connection(path)
+    try:
+        rows = [dict(row) for row in conn.execute(sql, params).fetchall()]
+    finally:
+        conn.close()
+    next_cursor = encode_cursor(rows[limit - 1], time_column) if len(rows) > limit else None
+    return {"rows": rows[:limit], "next_cursor": next_cursor}
+
+
+def count_rows(name):
+    path, table = LISTINGS[name][:2]
+    conn = sqlite_pool.get_connection(path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
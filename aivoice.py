@@ -1,16 +1,15 @@
 # aivoice.py (fixed handle_voice_query to use local Recognizer/Microphone)
 import speech_recognition as sr
-import pyttsx3
-from gtts import gTTS
-import pandas as pd
 import logging
 import os
+import sys
 import threading
 import queue
-import tempfile
+import subprocess
 import time
 from datetime import datetime
-from rapidfuzz import fuzz
+import faq_matcher
+import speech_synthesis
 from model.chatbot_model import enhanced_chatbot_response
 import argparse
 
@@ -44,14 +43,8 @@ TTS_ENGINE    = args.tts_engine
 LANGUAGE      = args.language
 
 # —— Load FAQ data ——
-try:
-    data = pd.read_csv('data/sail_faq.csv')
-except Exception as e:
-    logging.error(f"Error loading CSV data: {e}")
-    data = pd.DataFrame({
-        'Level1': ['Error'], 'Level2': ['Loading'], 'Level3': ['-'],
-        'Response': ['Sorry, there was an error loading the knowledge base.']
-    })
+# Keys are precomputed once; faq_matcher reloads the CSV when it changes.
+faq_matcher.load_faq()
 
 # —— Shared queue for recognized phrases ——
 question_queue = queue.Queue()
@@ -67,15 +60,10 @@ def search_response(question, allow_general_knowledge=False):
     if not question:
         return {"response": "Sorry, I couldn't understand that.", "query": ""}
     q = question.lower().strip()
-    best_score, best_resp = 0, None
-    for _, row in data.iterrows():
-        combined = ' '.join(str(x).lower() for x in [row['Level1'], row['Level2'], row['Level3']] if x and str(x)!='nan' and x!='-')
-        score = fuzz.token_set_ratio(q, combined)
-        logger.debug(f"Fuzzy: '{q}' vs '{combined}' -> {score}")
-        if score > best_score:
-            best_score, best_resp = score, row['Response']
-    if best_score >= 60:
-        return {"response": best_resp, "query": question, "feedback": True}
+    match = faq_matcher.match_faq(q)
+    if match:
+        logger.debug(f"Fuzzy: '{q}' vs '{match['key']}' -> {match['score']}")
+        return {"response": match['response'], "query": question, "feedback": True}
     try:
         response_data = enhanced_chatbot_response(q, "voice_user", allow_general_knowledge)
         response_data["query"] = question
@@ -85,21 +73,38 @@ def search_response(question, allow_general_knowledge=False):
         return {"response": "Sorry, I couldn't find an answer.", "query": question}
 
 # —— TTS engines ——
+# Both go through speech_synthesis: one engine for the process, audio cached by text
+# and voice, and long answers spoken sentence chunk by chunk while the rest synthesizes.
+# Command-line players by platform; WAV on Windows plays through winsound (no extra program).
+AUDIO_PLAYERS = {
+    "darwin": {"wav": ["afplay"], "mp3": ["afplay"]},
+    "linux": {"wav": ["aplay", "-q"], "mp3": ["mpg123", "-q"]},
+    "win32": {"mp3": ["mpg123", "-q"]},
+}
+
+def play_audio_file(path):
+    """Plays one audio file and returns when it has finished."""
+    extension = os.path.splitext(path)[1].lstrip('.')
+    if sys.platform == "win32" and extension == "wav":
+        import winsound
+        winsound.PlaySound(path, winsound.SND_FILENAME)
+        return
+    player = AUDIO_PLAYERS.get(sys.platform, AUDIO_PLAYERS["linux"])[extension]
+    subprocess.run(player + [path], stderr=subprocess.DEVNULL)
+
+def speak(text, engine):
+    speech_synthesis.TTS_ENGINE = engine
+    try:
+        for path in speech_synthesis.iter_audio_files(text):
+            play_audio_file(path)
+    except Exception as e:
+        logging.error(f"{engine} error: {e}")
+
 def speak_pyttsx3(text):
-    engine = pyttsx3.init()
-    engine.say(text)
-    engine.runAndWait()
+    speak(text, 'pyttsx3')
 
 def speak_gtts(text):
-    try:
-        tts = gTTS(text)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as fp:
-            tts.write_to_fp(fp)
-            temp_path = fp.name
-        os.system(f"mpg123 {temp_path} 2>/dev/null")
-        os.unlink(temp_path)
-    except Exception as e:
-        logging.error(f"gTTS error: {e}")
+    speak(text, 'gtts')
 
 # —— Background callback ——
 def callback(recog, audio):
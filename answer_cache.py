@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+import ingest_manifest
+
+# --- CONFIGURATION ---
+# When False every lookup misses and nothing is stored (e.g. to benchmark uncached generation).
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_TTL_SECONDS = 24 * 60 * 60
+ANSWER_CACHE_MAX_ENTRIES = 1000
+# Near-duplicate mode: reuse an answer when the same context was retrieved and the
+# query embedding is at least this similar to a cached query.
+ANSWER_CACHE_NEAR_DUPLICATES = False
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95
+REDIS_KEY_PREFIX = "answer_cache"
+# Batch ingest runs in another process, so it cannot bump this process' versions. Instead
+# every cached answer is keyed by its category's fingerprint in the ingest manifest, which
+# is re-read (at most this often) when the file changes.
+MANIFEST_CHECK_SECONDS = 5.0
+
+
+def context_hash(context):
+    return hashlib.sha256((context or "").encode('utf-8')).hexdigest()
+
+
+def _entry_key(category, clean_query, ctx_hash):
+    raw = json.dumps([category or "", clean_query, ctx_hash])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+# --- STORES ---
+class InProcessStore:
+    """LRU + TTL store for a single process."""
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl=ANSWER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def category_version(self, category):
+        with self._lock:
+            return self._versions.get(category or "", 0)
+
+    def bump_category_version(self, category):
+        with self._lock:
+            self._versions[category or ""] = self._versions.get(category or "", 0) + 1
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisStore:
+    """Shares cached answers between workers. Eviction is TTL plus Redis' own maxmemory policy."""
+
+    def __init__(self, client, ttl=ANSWER_CACHE_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+
+    def category_version(self, category):
+        value = self.client.get(f"{REDIS_KEY_PREFIX}:version:{category or ''}")
+        return int(value) if value else 0
+
+    def bump_category_version(self, category):
+        self.client.incr(f"{REDIS_KEY_PREFIX}:version:{category or ''}")
+
+    def get(self, key):
+        value = self.client.get(f"{REDIS_KEY_PREFIX}:{key}")
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value):
+        self.client.setex(f"{REDIS_KEY_PREFIX}:{key}", self.ttl, value.encode('utf-8'))
+
+    def clear(self):
+        for key in self.client.scan_iter(f"{REDIS_KEY_PREFIX}:*"):
+            self.client.delete(key)
+
+
+_store = None
+_store_lock = threading.Lock()
+# (category, version, context hash) -> [(unit query embedding, entry key), ...]
+_near_duplicates = OrderedDict()
+_near_duplicates_lock = threading.Lock()
+_stats = {"hits": 0, "near_hits": 0, "misses": 0}
+# (category fingerprints, manifest mtime): replaced as a whole when the manifest changes
+_fingerprints = ({}, None)
+_last_manifest_check = 0.0
+_manifest_check_lock = threading.Lock()
+
+
+def get_store():
+    """Uses Redis when database.get_redis_client can connect, otherwise an in-process store."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                client = None
+                try:
+                    from database import get_redis_client
+                    client = get_redis_client()
+                except Exception as e:
+                    print(f"[ANSWER CACHE] Redis unavailable: {e}")
+                _store = RedisStore(client) if client is not None else InProcessStore()
+                print(f"[ANSWER CACHE] Using {type(_store).__name__}.")
+    return _store
+
+
+def _document_version(category):
+    """The category's fingerprint in the ingest manifest, reloaded when the manifest changes."""
+    global _fingerprints, _last_manifest_check
+    now = time.time()
+    if now - _last_manifest_check >= MANIFEST_CHECK_SECONDS and _manifest_check_lock.acquire(blocking=False):
+        try:
+            _last_manifest_check = now
+            try:
+                mtime = os.path.getmtime(ingest_manifest.MANIFEST_PATH)
+            except OSError:
+                mtime = None
+            if mtime != _fingerprints[1]:
+                _fingerprints = (ingest_manifest.category_fingerprints(ingest_manifest.load_manifest()), mtime)
+        finally:
+            _manifest_check_lock.release()
+    return _fingerprints[0].get(category or "", "")
+
+
+def _cache_version(store, category):
+    return f"{store.category_version(category)}.{_document_version(category)}"
+
+
+def _embed(text):
+    from shared_utils import get_vector_store
+    vector = np.asarray(get_vector_store().embeddings.embed_query(text), dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _near_duplicate_key(category, version, ctx_hash, clean_query):
+    candidates = _near_duplicates.get((category or "", version, ctx_hash))
+    if not candidates:
+        return None, None
+    query_vector = _embed(clean_query)
+    with _near_duplicates_lock:
+        best_key, best_score = None, ANSWER_CACHE_SIMILARITY_THRESHOLD
+        for vector, key in candidates:
+            score = float(np.dot(query_vector, vector))
+            if score >= best_score:
+                best_key, best_score = key, score
+    return best_key, query_vector
+
+
+# --- PUBLIC API ---
+def get_cached_answer(category, clean_query, context):
+    """Returns a cached answer for this query and retrieved context, or None."""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    try:
+        store = get_store()
+        version = _cache_version(store, category)
+        ctx_hash = context_hash(context)
+        answer = store.get(_entry_key(f"{category}:{version}", clean_query, ctx_hash))
+        if answer is not None:
+            _stats["hits"] += 1
+            metrics.record_cache_lookup("answer", "hit")
+            return answer
+        if ANSWER_CACHE_NEAR_DUPLICATES:
+            key, _ = _near_duplicate_key(category, version, ctx_hash, clean_query)
+            if key:
+                answer = store.get(key)
+                if answer is not None:
+                    _stats["near_hits"] += 1
+                    metrics.record_cache_lookup("answer", "near_hit")
+                    return answer
+        _stats["misses"] += 1
+        metrics.record_cache_lookup("answer", "miss")
+    except Exception as e:
+        print(f"[ANSWER CACHE] Lookup failed: {e}")
+    return None
+
+
+def store_answer(category, clean_query, context, answer):
+    if not ANSWER_CACHE_ENABLED:
+        return
+    try:
+        store = get_store()
+        version = _cache_version(store, category)
+        ctx_hash = context_hash(context)
+        key = _entry_key(f"{category}:{version}", clean_query, ctx_hash)
+        store.set(key, answer)
+        if ANSWER_CACHE_NEAR_DUPLICATES:
+            vector = _embed(clean_query)
+            with _near_duplicates_lock:
+                bucket_key = (category or "", version, ctx_hash)
+                _near_duplicates.setdefault(bucket_key, []).append((vector, key))
+                _near_duplicates.move_to_end(bucket_key)
+                while len(_near_duplicates) > ANSWER_CACHE_MAX_ENTRIES:
+                    _near_duplicates.popitem(last=False)
+    except Exception as e:
+        print(f"[ANSWER CACHE] Store failed: {e}")
+
+
+def invalidate_category(category):
+    """
+    Drops every cached answer for a category in this process (or every process sharing
+    Redis). Re-ingesting a document needs no call: its manifest entry changes the key.
+    """
+    try:
+        get_store().bump_category_version(category)
+    except Exception as e:
+        print(f"[ANSWER CACHE] Invalidation failed: {e}")
+
+
+def clear_answer_cache():
+    try:
+        get_store().clear()
+    except Exception as e:
+        print(f"[ANSWER CACHE] Clear failed: {e}")
+    with _near_duplicates_lock:
+        _near_duplicates.clear()
+
+
+def answer_cache_stats():
+    return dict(_stats)
@@ -1,3 +1,5 @@
+import base64
+import binascii
 import json
 import logging
 import os
@@ -11,15 +13,37 @@ import string
 from datetime import datetime, timedelta
 from functools import wraps
 import bcrypt
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session, Response, stream_with_context
+from flask import Flask, request, jsonify, render_template, redirect, url_for, session, Response, stream_with_context, send_file
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_wtf.csrf import CSRFProtect
 from werkzeug.utils import secure_filename
 
+import metrics
+import sqlite_pool
+import admin_listings
+import schema_migrations
+
 # Import your custom modules with error handling
 try:
-    from model.chatbot_model import generate_llm_response
+    import voice_pipeline
+
+    print("[IMPORT] ✅ Successfully imported voice_pipeline")
+except ImportError as e:
+    print(f"[IMPORT] ❌ Failed to import voice_pipeline: {e}")
+    voice_pipeline = None
+
+try:
+    import speech_synthesis
+
+    print("[IMPORT] ✅ Successfully imported speech_synthesis")
+except ImportError as e:
+    print(f"[IMPORT] ❌ Failed to import speech_synthesis: {e}")
+    speech_synthesis = None
+
+try:
+    from model.chatbot_model import (generate_llm_response, generate_llm_response_stream, warm_up_generation_model,
+                                     plan_answer, answer_from_glossary, answer_from_faq)
 
     print("[IMPORT] ✅ Successfully imported chatbot_model")
 except ImportError as e:
@@ -29,8 +53,41 @@ except ImportError as e:
     def generate_llm_response(query, **kwargs):
         return {"response": f"System in test mode. You said: {query}", "context": "", "document": ""}
 
+
+    def generate_llm_response_stream(query, **kwargs):
+        yield {"type": "meta", "document": "", "context_length": 0}
+        yield {"type": "token", "text": f"System in test mode. You said: {query}"}
+        yield {"type": "done", "document": ""}
+
+
+    def warm_up_generation_model():
+        return False
+
+
+    def plan_answer(query, category=None):
+        return None
+
+
+    def answer_from_glossary(query, category=None, session_id=None, plan=None):
+        return None
+
+
+    def answer_from_faq(query, category=None, session_id=None):
+        return None
+
+try:
+    from answer_cache import clear_answer_cache
+except ImportError as e:
+    print(f"[IMPORT] ❌ Failed to import answer_cache: {e}")
+
+
+    def clear_answer_cache():
+        return None
+
 try:
-    from shared_utils import get_all_document_paths, semantic_search
+    from shared_utils import (get_all_document_paths, semantic_search, warm_up_retrieval,
+                              reload_vector_store, retrieval_health, ensure_clause_index,
+                              ensure_lexical_index, ensure_glossary_index, get_catalog_categories, invalidate_document_catalog, start_document_watcher)
 
     print("[IMPORT] ✅ Successfully imported shared_utils")
 except ImportError as e:
@@ -40,9 +97,49 @@ except ImportError as e:
     def get_all_document_paths():
         return []
 
+
+    def warm_up_retrieval():
+        return False
+
+
+    def reload_vector_store():
+        return None
+
+
+    def retrieval_health():
+        return {"status": "unavailable"}
+
+
+    def ensure_clause_index():
+        return None
+
+
+    def ensure_lexical_index():
+        return None
+
+
+    def ensure_glossary_index():
+        return None
+
+
+    def get_catalog_categories():
+        return []
+
+
+    def invalidate_document_catalog():
+        return None
+
+
+    def start_document_watcher():
+        return False
+
 # --- Enhanced Logging Configuration ---
+# DEBUG writes a line to disk for every request; full per-request dumps are sampled
+# instead (metrics.DEBUG_SAMPLE_RATE).
+LOG_LEVEL = logging.INFO
+
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=LOG_LEVEL,
     format="[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s",
     handlers=[
         logging.FileHandler("chatbot_backend.log", encoding='utf-8'),
@@ -80,6 +177,8 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs('data/documents', exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt'}
+# Clients that may scrape /metrics without an admin session (e.g. a local Prometheus).
+METRICS_ALLOWED_ADDRESSES = {'127.0.0.1', '::1'}
 
 
 def allowed_file(filename):
@@ -88,39 +187,9 @@ def allowed_file(filename):
 
 def get_document_categories():
     try:
-        categories = set()
-        folders = []
-
-        # Check multiple possible paths
-        paths_to_check = [
-            app.config['UPLOAD_FOLDER'],  # uploads/documents
-            "data/documents",
-            "hr",  # Direct hr folder
-            os.path.join(os.getcwd(), "hr"),  # Current directory/hr
-        ]
-
-        for base_path in paths_to_check:
-            if os.path.exists(base_path):
-                print(f"✅ Found path: {base_path}")
-                if os.path.isdir(base_path):
-                    # If it's the hr folder directly
-                    if base_path.endswith('hr'):
-                        files = [f for f in os.listdir(base_path) if os.path.isfile(os.path.join(base_path, f))]
-                        if files:
-                            categories.add('hr')
-                            print(f"📁 HR folder has {len(files)} files: {files[:3]}...")
-                    else:
-                        # Check for subfolders
-                        for item in os.listdir(base_path):
-                            folder_path = os.path.join(base_path, item)
-                            if os.path.isdir(folder_path):
-                                categories.add(item)
-                                files = [f for f in os.listdir(folder_path) if
-                                         os.path.isfile(os.path.join(folder_path, f))]
-                                print(f"📁 {item} folder has {len(files)} files")
-
-        print(f"🔍 Found categories: {list(categories)}")
-        return sorted(list(categories)) if categories else ['general', 'hr', 'pgp']
+        # Served from the cached document catalog; no directory walk per dropdown load.
+        categories = get_catalog_categories()
+        return categories if categories else ['general', 'hr', 'pgp']
 
     except Exception as e:
         print(f"❌ Error getting categories: {e}")
@@ -129,35 +198,15 @@ def get_document_categories():
 
 # --- Database Functions ---
 def get_db_connection():
-    conn = sqlite3.connect('chatbot.db', check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """A pooled connection to chatbot.db (WAL mode); close() returns it to the pool."""
+    return sqlite_pool.get_connection(sqlite_pool.AUTH_DB_PATH)
 
 
 def init_db():
+    schema_migrations.migrate_all()
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute('''CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT, 
-        email TEXT UNIQUE NOT NULL, 
-        password BLOB NOT NULL, 
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )''')
-
-    cursor.execute('''CREATE TABLE IF NOT EXISTS account_requests (
-        id INTEGER PRIMARY KEY AUTOINCREMENT, 
-        email TEXT UNIQUE NOT NULL, 
-        password BLOB NOT NULL, 
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )''')
-
-    cursor.execute('''CREATE TABLE IF NOT EXISTS password_reset_requests (
-        id INTEGER PRIMARY KEY AUTOINCREMENT, 
-        email TEXT NOT NULL, 
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )''')
-
     cursor.execute("SELECT COUNT(*) FROM users")
     user_count = cursor.fetchone()[0]
 
@@ -193,6 +242,19 @@ def require_login(f):
 
 init_db()
 
+# Open the vector store, load the embedding and generation models and load the
+# clause and BM25 indexes in the background so the first chat request does not pay for it.
+threading.Thread(target=warm_up_retrieval, daemon=True).start()
+threading.Thread(target=warm_up_generation_model, daemon=True).start()
+threading.Thread(target=ensure_clause_index, daemon=True).start()
+threading.Thread(target=ensure_lexical_index, daemon=True).start()
+threading.Thread(target=ensure_glossary_index, daemon=True).start()
+if voice_pipeline is not None and voice_pipeline.ASR_WARM_UP_AT_START:
+    threading.Thread(target=voice_pipeline.warm_up_asr, daemon=True).start()
+if speech_synthesis is not None and speech_synthesis.TTS_PRERENDER_FAQ:
+    threading.Thread(target=speech_synthesis.prerender_faq, daemon=True).start()
+start_document_watcher()
+
 
 def handle_simple_messages(message):
     """Enhanced greeting detection with fuzzy matching and comprehensive patterns"""
@@ -265,6 +327,22 @@ def handle_simple_messages(message):
     return None
 
 
+def answer_without_generation(message, selected_category, session_id, plan=None):
+    """
+    "What is X" / "full form of X" from the glossary index, then near-exact FAQ matches.
+    Returns (response, 'glossary' | 'faq'), or None when retrieval and generation are needed.
+    Pass the query's plan_answer() result on to generate_llm_response afterwards.
+    """
+    category = selected_category if selected_category != 'general' else None
+    response = answer_from_glossary(message, category=category, session_id=session_id, plan=plan)
+    if response:
+        return response, 'glossary'
+    response = answer_from_faq(message, category=category, session_id=session_id)
+    if response:
+        return response, 'faq'
+    return None
+
+
 def handle_dropdown_selection(selection):
     try:
         if selection == 'search_documents':
@@ -460,15 +538,12 @@ def admin_dashboard():
         return redirect(url_for('index'))
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM account_requests ORDER BY created_at DESC")
-        account_requests = cursor.fetchall()
-        cursor.execute("SELECT * FROM password_reset_requests ORDER BY created_at DESC")
-        password_requests = cursor.fetchall()
-        cursor.execute("SELECT email, created_at FROM users ORDER BY created_at DESC")
-        registered_users = cursor.fetchall()
-        conn.close()
+        # First page of each listing only; the page fetches more from /admin/listings/<name>
+        account_page = admin_listings.list_page("account_requests")
+        password_page = admin_listings.list_page("password_requests")
+        users_page = admin_listings.list_page("users")
+        user_count = admin_listings.count_rows("users")
+        pending_count = admin_listings.count_rows("account_requests") + admin_listings.count_rows("password_requests")
 
         # FIXED: Get folder information with recursive file counting
         folders = []
@@ -551,9 +626,13 @@ def admin_dashboard():
             print(f"📁 {folder['name']}: {folder['file_count']} files")
 
         return render_template('admin_dashboard.html',
-                               account_requests=account_requests,
-                               password_requests=password_requests,
-                               registered_users=registered_users,
+                               account_requests=account_page['rows'],
+                               account_requests_cursor=account_page['next_cursor'],
+                               password_requests=password_page['rows'],
+                               registered_users=users_page['rows'],
+                               registered_users_cursor=users_page['next_cursor'],
+                               user_count=user_count,
+                               pending_count=pending_count,
                                folders=folders)
 
     except Exception as e:
@@ -563,9 +642,34 @@ def admin_dashboard():
                                account_requests=[],
                                password_requests=[],
                                registered_users=[],
+                               user_count=0,
+                               pending_count=0,
                                folders=[])
 
 
+@app.route('/admin/listings/<name>', methods=['GET'])
+@require_login
+def admin_listing(name):
+    """
+    One page of an admin listing (account_requests, password_requests, users, chat_logs,
+    voice_logs), newest first: ?cursor=<next_cursor of the previous page>&limit=<n>.
+    The log listings also take ?user_id=.
+    """
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 403
+    if name not in admin_listings.LISTINGS:
+        return jsonify({'error': f'Unknown listing: {name}'}), 404
+    if name in ('chat_logs', 'voice_logs'):
+        sqlite_pool.flush_writes()  # Include rows still queued for the log writer
+    try:
+        page = admin_listings.list_page(name, cursor=request.args.get('cursor'),
+                                        limit=request.args.get('limit', admin_listings.ADMIN_PAGE_SIZE, type=int),
+                                        filter_value=request.args.get('user_id'))
+    except admin_listings.InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(page)
+
+
 @app.route('/admin/view_folder/<folder_name>', methods=['GET'])
 @require_login
 def view_folder_details(folder_name):
@@ -784,11 +888,32 @@ def chat_stream_integrated():
         # Generate complex response
         session_id = session.get('user_id', 'anonymous')
 
+        # Classified (and looked up in the glossary) once for both the quick answer and generation
+        plan = plan_answer(user_message, category=selected_category if selected_category != 'general' else None)
+
+        # Glossary and FAQ answers need no retrieval or generation
+        quick_answer = answer_without_generation(user_message, selected_category, session_id, plan=plan)
+        if quick_answer:
+            response_text, document_used = quick_answer
+            chat_logger.info(f"Answered from the {document_used}: {user_message}")
+            return jsonify({
+                'response': response_text,
+                'type': 'text',
+                'category': selected_category,
+                'context_length': 0,
+                'document': document_used,
+                'timestamp': datetime.now().isoformat()
+            })
+
+        if data.get('stream'):
+            return stream_llm_response(user_message, selected_category, session_id, plan)
+
         try:
             result = generate_llm_response(
                 query=user_message,
                 category=selected_category if selected_category != 'general' else None,
-                session_id=session_id
+                session_id=session_id,
+                plan=plan
             )
 
             response_text = result.get('response', 'Sorry, I could not generate a response.')
@@ -820,6 +945,31 @@ def chat_stream_integrated():
         return jsonify({'error': 'Failed to generate response', 'details': str(e)}), 500
 
 
+def stream_llm_response(user_message, selected_category, session_id, plan=None):
+    """Streams generation events to the browser as newline-delimited JSON."""
+
+    def generate():
+        try:
+            for event in generate_llm_response_stream(
+                    query=user_message,
+                    category=selected_category if selected_category != 'general' else None,
+                    session_id=session_id,
+                    plan=plan
+            ):
+                if event['type'] == 'meta':
+                    event['category'] = selected_category
+                elif event['type'] == 'done':
+                    event['timestamp'] = datetime.now().isoformat()
+                yield json.dumps(event) + "\n"
+            chat_logger.info(f"LLM response streamed successfully")
+        except Exception as llm_error:
+            chat_logger.error(f"LLM Error: {llm_error}")
+            yield json.dumps({'type': 'error', 'error': str(llm_error)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/admin/process_folder/<folder_name>', methods=['POST'])
 @require_login
 def process_folder(folder_name):
@@ -829,6 +979,7 @@ def process_folder(folder_name):
     try:
         # Call your processing scripts here
         # subprocess.run(['python', 'batch_process_documents.py', folder_name])
+        invalidate_document_catalog()
 
         return jsonify({
             'success': True,
@@ -847,6 +998,9 @@ def rebuild_embeddings():
     try:
         # Call your embedding rebuild script
         # subprocess.run(['python', 'rebuild_embeddings_and_paragraphs.py'])
+        invalidate_document_catalog()
+        reload_vector_store()
+        clear_answer_cache()
 
         return jsonify({
             'success': True,
@@ -856,46 +1010,112 @@ def rebuild_embeddings():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/admin/retrieval_health', methods=['GET'])
+@require_login
+def admin_retrieval_health():
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    health = retrieval_health()
+    return jsonify(health), (200 if health.get('status') == 'ok' else 503)
+
+
+@app.route('/admin/reload_retrieval', methods=['POST'])
+@require_login
+def admin_reload_retrieval():
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    try:
+        reload_vector_store()
+        admin_logger.info("Retrieval store reloaded")
+        return jsonify({'success': True, 'health': retrieval_health()})
+    except Exception as e:
+        admin_logger.error(f"Error reloading retrieval store: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+@limiter.exempt
+def prometheus_metrics():
+    """Per-stage latency histograms, cache hit ratios and LLM token/timing stats in Prometheus text format."""
+    if request.remote_addr not in METRICS_ALLOWED_ADDRESSES and not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 403
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
 # --- Voice Route ---
 @app.route('/voice', methods=['POST'])
 @require_login
 @csrf.exempt
 def voice_chat():
+    """
+    Answers a recorded question. Accepts the browser's JSON {"audio_data": base64, "category"}
+    or a multipart upload with an "audio" file. Speech recognition runs on the voice worker
+    pool; the transcript then takes the same path as a typed message.
+    """
     user_email = session.get('email', 'Unknown')
     chat_logger.debug(f"Voice chat requested by: {user_email}")
+    start_time = time.time()
 
     try:
-        data = request.get_json()
-        category = data.get('category', 'general')
-
-        # Simple voice responses based on category
-        if 'hr' in category.lower():
-            responses = [
-                {"query": "HR leave policy",
-                 "response": "HR Leave Policy: Employees are entitled to annual leave as per company policy. Please check the employee handbook for specific entitlements."},
-                {"query": "Salary information",
-                 "response": "For salary queries, please contact HR department. All compensation details are handled by HR."}
-            ]
-        elif 'pgp' in category.lower():
-            responses = [
-                {"query": "EMO procedures",
-                 "response": "EMO (Emergency Management Officer) handles emergency response procedures and safety protocols."},
-                {"query": "Safety guidelines",
-                 "response": "Safety is our priority. Always use PPE and follow safety protocols."}
-            ]
+        if 'audio' in request.files:
+            audio_bytes = request.files['audio'].read()
+            category = request.form.get('category', 'general')
         else:
-            responses = [
-                {"query": " information",
-                 "response": " is India's largest steel-making company. How can I help you with specific policies?"},
-                {"query": "General help",
-                 "response": "I can assist with HR policies, PGP guidelines, and company information."}
-            ]
+            data = request.get_json(silent=True) or {}
+            category = data.get('category', 'general')
+            try:
+                audio_bytes = base64.b64decode(data.get('audio_data') or '', validate=True)
+            except (binascii.Error, ValueError):
+                audio_bytes = b''
+        if not audio_bytes:
+            return jsonify({"query": "", "response": "No audio received. Please try recording again."}), 400
+        if voice_pipeline is None:
+            return jsonify({"query": "", "response": "Voice input is not available. Please use text input."}), 503
 
-        import random
-        response = random.choice(responses)
+        try:
+            query = voice_pipeline.transcribe(audio_bytes)
+        except voice_pipeline.VoiceBusy as e:
+            chat_logger.warning(f"Voice request refused: {e}")
+            return jsonify({"query": "", "response": "Voice is busy right now. Please try again or use text input."}), 503
+        except voice_pipeline.AudioDecodeError as e:
+            chat_logger.warning(f"Voice audio could not be decoded: {e}")
+            return jsonify({"query": "", "response": "Sorry, that recording could not be read. Please try again."}), 400
+        if not query:
+            return jsonify({"query": "", "response": "Sorry, I couldn't understand that."})
+
+        chat_logger.info(f"Voice query from {user_email}: '{query}', Category: '{category}'")
+        session_id = session.get('user_id', 'anonymous')
+        simple_response = handle_simple_messages(query)
+        if simple_response:
+            response_text, document_used = simple_response['response'], simple_response['document']
+        else:
+            plan = plan_answer(query, category=category if category != 'general' else None)
+            quick_answer = answer_without_generation(query, category, session_id, plan=plan)
+            if quick_answer:
+                response_text, document_used = quick_answer
+            else:
+                result = generate_llm_response(
+                    query=query,
+                    category=category if category != 'general' else None,
+                    session_id=session_id,
+                    plan=plan
+                )
+                response_text = result.get('response', 'Sorry, I could not generate a response.')
+                document_used = result.get('document', category)
+
+        # Spoken answer: one URL per sentence chunk, synthesized in the background (or cached)
+        audio_urls = []
+        if speech_synthesis is not None:
+            try:
+                audio_urls = [url_for('voice_audio', key=key) for key in speech_synthesis.prepare_speech(response_text)]
+            except Exception as e:
+                chat_logger.warning(f"Speech synthesis unavailable: {e}")
 
-        chat_logger.info(f"Voice response generated for {user_email}")
-        return jsonify(response)
+        metrics.observe("chatbot_stage_seconds", time.time() - start_time, stage="voice_request")
+        return jsonify({"query": query, "response": response_text, "document": document_used, "category": category,
+                        "audio": audio_urls, "timestamp": datetime.now().isoformat()})
 
     except Exception as e:
         chat_logger.error(f"Voice chat error: {e}")
@@ -905,6 +1125,17 @@ def voice_chat():
         }), 500
 
 
+@app.route('/voice/audio/<key>', methods=['GET'])
+@require_login
+@limiter.exempt
+def voice_audio(key):
+    """One chunk of a spoken answer; waits briefly if it is still being synthesized."""
+    path = speech_synthesis.get_audio_path(key) if speech_synthesis is not None else None
+    if path is None:
+        return jsonify({'error': 'Audio not available'}), 404
+    return send_file(path, mimetype=speech_synthesis.audio_format()[1], max_age=86400)
+
+
 # FIXED: Add error handlers
 @app.errorhandler(404)
 def not_found(error):
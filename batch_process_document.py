@@ -1,8 +1,15 @@
 import os
-import shutil
-from shared_utils import get_all_document_paths
-from data_processing import batch_process_document  # We will create this file next
-from rebuild_embeddings_and_paragraphs import build_and_cache_embeddings
+import argparse
+from shared_utils import get_all_document_paths, EMBEDDING_MODEL
+from data_processing import remove_ocr_cache, OCR_VERSION
+from shared_utils import extract_text_from_file
+from rebuild_embeddings_and_paragraphs import delete_document_embeddings, split_document_chunks
+from clause_index import save_clause_index, remove_document, load_clause_index, index_document
+import lexical_index
+import glossary_index
+from ingest_pipeline import IngestPipeline, OCR_WORKERS, EMBED_BATCH_SIZE, QUEUE_SIZE
+from ingest_manifest import load_manifest, save_manifest, make_entry, is_up_to_date
+from text_cache import get_content_hash, flush_index, remove_text
 
 # --- CONFIGURATION ---
 OCR_CACHE_DIR = "data/ocr_cache"
@@ -10,44 +17,110 @@ CHROMA_PATH = "data/chroma_db"
 DOCUMENT_DIRECTORIES = ["data/documents", "data/uploads"]
 
 
-def main():
-    # 1. Clean up old data for a fresh start
-    print("--- Clearing old cache and database ---")
-    if os.path.exists(OCR_CACHE_DIR):
-        shutil.rmtree(OCR_CACHE_DIR)
-    if os.path.exists(CHROMA_PATH):
-        shutil.rmtree(CHROMA_PATH)
+def remove_deleted_documents(manifest, current_filenames):
+    """Drops vectors, OCR text, clause and glossary entries of documents that no longer exist."""
+    for filename in [name for name in manifest if name not in current_filenames]:
+        print(f"\n--- Removing deleted document: {filename} ---")
+        if not delete_document_embeddings(filename):
+            continue  # Keep the manifest entry so the next run retries.
+        remove_ocr_cache(manifest[filename]['path'], file_hash=manifest[filename].get('file_hash'))
+        remove_document(filename)
+        lexical_index.remove_document(filename)
+        glossary_index.remove_document(filename)
+        del manifest[filename]
+        save_manifest(manifest)
 
+
+def main(full=False, ocr_workers=OCR_WORKERS, embed_batch_size=EMBED_BATCH_SIZE, queue_size=QUEUE_SIZE):
+    # The live index is never wiped: only new or changed documents are
+    # (re)processed, and a document's old vectors are removed only after
+    # its new ones are in place.
     os.makedirs(OCR_CACHE_DIR, exist_ok=True)
     os.makedirs(CHROMA_PATH, exist_ok=True)
-    print("Old data cleared successfully.")
+    load_clause_index()
+    lexical_index.load_lexical_index()
+    glossary_index.load_glossary_index()
+    manifest = load_manifest()
 
-    # 2. Get all documents to be processed
+    # 1. Get all documents to be processed
     all_docs = get_all_document_paths()
+    remove_deleted_documents(manifest, {doc['filename'] for doc in all_docs})
     if not all_docs:
         print("No documents found to process. Exiting.")
+        save_clause_index()
+        lexical_index.save_lexical_index()
+        glossary_index.save_glossary_index()
         return
 
-    print(f"\nFound {len(all_docs)} documents to process.")
+    print(f"\nFound {len(all_docs)} documents.")
 
-    # 3. Process each document
+    # 2. Work out which documents are new or changed
+    pending = []
+    hashes = {}
     for doc in all_docs:
         filename = doc['filename']
-        filepath = doc['path']
+        entry = manifest.get(filename)
+        # Hashed only if the file changed since the text cache last saw it
+        file_hash = get_content_hash(doc['path'])
+
+        if not full and is_up_to_date(entry, doc, file_hash, OCR_VERSION, EMBEDDING_MODEL):
+            if not lexical_index.is_indexed(filename):
+                # Ingested before the BM25 index existed: index its chunks without re-embedding
+                ids, texts = split_document_chunks(filename, extract_text_from_file(doc['path']))
+                lexical_index.index_document(filename, doc['category'], ids, texts)
+            if not glossary_index.is_indexed(filename, doc['category']):
+                # Likewise for the glossary: its terms come from the cached text
+                glossary_index.index_document(filename, doc['category'], extract_text_from_file(doc['path']))
+            continue
 
-        print(f"\n--- Processing Document: {filename} ---")
+        if entry and entry.get('file_hash') and entry.get('file_hash') != file_hash:
+            # The text and page checkpoints of the file's previous content would never be read again
+            remove_ocr_cache(doc['path'], file_hash=entry.get('file_hash'))
+        # Re-OCR the current content if asked to or if the OCR settings changed. Its page
+        # checkpoints are kept (they are per OCR version), so an interrupted re-OCR resumes.
+        if full or (entry and entry.get('ocr_version') != OCR_VERSION):
+            remove_text(doc['path'], file_hash=file_hash)
+        hashes[filename] = file_hash
+        pending.append(doc)
 
-        # Step A: Perform bilingual OCR and save to cache
-        success = batch_process_document(filepath, filename)
+    print(f"{len(pending)} new or changed, {len(all_docs) - len(pending)} unchanged.")
+
+    def on_document_done(doc, full_text, chunk_ids, chunk_texts):
+        filename = doc['filename']
+        # Index the document's clauses for O(1) clause lookups
+        index_document(filename, doc['category'], full_text, doc['path'])
+        # Index the same chunks the vector store holds for BM25 search
+        lexical_index.index_document(filename, doc['category'], chunk_ids, chunk_texts)
+        # Merge the document's acronyms into the glossary served before retrieval
+        glossary_index.index_document(filename, doc['category'], full_text)
+        # The new manifest entry also retires cached answers built from the old text
+        # (answer_cache keys answers by their category's manifest fingerprint).
+        manifest[filename] = make_entry(doc, hashes[filename], OCR_VERSION, EMBEDDING_MODEL)
+        save_manifest(manifest)
+        print(f"[SUCCESS] Ingested {filename}.")
 
-        if success:
-            # Step B: Build and cache embeddings for the newly OCR'd text
-            build_and_cache_embeddings(filename)
-        else:
-            print(f"[SKIPPING] Could not perform OCR on {filename}. Skipping embedding generation.")
+    # 3. OCR, chunk and embed the pending documents as overlapping pipeline stages
+    if pending:
+        pipeline = IngestPipeline(ocr_workers=ocr_workers, embed_batch_size=embed_batch_size,
+                                  queue_size=queue_size, on_document_done=on_document_done)
+        pipeline.run(pending)
 
+    save_clause_index()
+    lexical_index.save_lexical_index()
+    glossary_index.save_glossary_index()
+    flush_index()
     print("\n\n--- Batch processing complete. ---")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Incrementally OCR and embed documents")
+    parser.add_argument("--full", action="store_true",
+                        help="Reprocess every document, ignoring the manifest (the live index stays online)")
+    parser.add_argument("--ocr-workers", type=int, default=OCR_WORKERS, help="Documents OCR'd concurrently")
+    parser.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE,
+                        help="Chunks per embedding call")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help="Documents buffered between stages before upstream stages block")
+    args = parser.parse_args()
+    main(full=args.full, ocr_workers=args.ocr_workers, embed_batch_size=args.embed_batch_size,
+         queue_size=args.queue_size)
@@ -0,0 +1,325 @@
+"""
+End-to-end benchmark of the chat pipeline on a fixture corpus, with a local Ollama
+stand-in (benchmarks/ollama_stub.py) unless --ollama-host points at a real server.
+
+It ingests the corpus into a scratch workspace (text cache, clause index, BM25 index
+and Chroma), then reports:
+- p50/p95/p99 per stage: catalog scan, clause extraction, vector / lexical / hybrid
+  search, full context retrieval, prompt build, generation (total and first token);
+- recall@k of each search mode against the labelled questions
+  (same format as bench_hybrid_retrieval.py);
+- throughput and latency of generate_llm_response under N concurrent sessions.
+
+Results are written to JSON; pass --compare with an earlier result file to print
+the change per metric.
+
+Usage: python benchmarks/bench_chat_pipeline.py [--sessions 8] [--output results.json] [--compare baseline.json]
+"""
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+import subprocess
+import statistics
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from ollama_stub import StubSettings, start_stub_server
+
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+CLAUSE_PATTERN = re.compile(r'(\d+(\.\d+)*)')
+FILLER_WORDS = ("employee shall be entitled to the allowance subject to approval of competent authority "
+                "as per rules in force from time to time including grade pay service period").split()
+
+
+def summarize(seconds):
+    """count/mean/p50/p95/p99 in milliseconds."""
+    if not seconds:
+        return {"count": 0}
+    ordered = sorted(s * 1000 for s in seconds)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))], 3)
+
+    return {"count": len(ordered), "mean_ms": round(statistics.mean(ordered), 3),
+            "p50_ms": pct(50), "p95_ms": pct(95), "p99_ms": pct(99)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def prepare_workspace(workspace, corpus_dir, synthetic_docs, seed):
+    """Copies the fixture corpus to <workspace>/data/documents and adds synthetic filler documents."""
+    documents_dir = os.path.join(workspace, "data", "documents")
+    shutil.copytree(corpus_dir, documents_dir, dirs_exist_ok=True)
+    rng = random.Random(seed)
+    categories = sorted(name for name in os.listdir(documents_dir)
+                        if os.path.isdir(os.path.join(documents_dir, name)))
+    for i in range(synthetic_docs):
+        lines = []
+        for section in range(1, 9):
+            lines.append(f"{section}. SECTION {section} OF CIRCULAR {i}")
+            for clause in range(1, 6):
+                lines.append(f"{section}.{clause} " + " ".join(rng.choice(FILLER_WORDS) for _ in range(40)))
+        category = categories[i % len(categories)]
+        with open(os.path.join(documents_dir, category, f"synthetic_{i:04d}.txt"), 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines))
+
+
+def ingest(shared_utils, embed_batch_size):
+    """Loads every fixture document into the text cache, the vector store and the BM25 index."""
+    import text_cache
+    import lexical_index
+    from rebuild_embeddings_and_paragraphs import split_document_chunks
+
+    db = shared_utils.get_vector_store()
+    batch_ids, batch_texts, batch_meta = [], [], []
+    for doc in shared_utils.get_all_document_paths():
+        with open(doc['path'], 'r', encoding='utf-8') as f:
+            text = f.read()
+        text_cache.write_text(doc['path'], text)
+        ids, texts = split_document_chunks(doc['filename'], text)
+        lexical_index.index_document(doc['filename'], doc['category'], ids, texts)
+        batch_ids += ids
+        batch_texts += texts
+        batch_meta += [{"source": doc['filename']}] * len(ids)
+    for start in range(0, len(batch_ids), embed_batch_size):
+        db.add_texts(texts=batch_texts[start:start + embed_batch_size],
+                     metadatas=batch_meta[start:start + embed_batch_size],
+                     ids=batch_ids[start:start + embed_batch_size])
+    lexical_index.save_lexical_index()
+    text_cache.flush_index()
+    shared_utils.ensure_clause_index()
+    shared_utils.ensure_lexical_index()
+    return len(batch_ids)
+
+
+def run_stages(shared_utils, chatbot_model, ollama, questions, k, repeat):
+    from bench_hybrid_retrieval import recall
+
+    timings = {name: [] for name in ("catalog", "clause", "vector_search", "lexical_search", "hybrid_search",
+                                     "retrieve_context", "prompt_build", "generation", "time_to_first_token")}
+    recalls = {"vector": [], "lexical": [], "hybrid": []}
+    searches = {"vector": shared_utils.semantic_search, "lexical": shared_utils.lexical_search,
+                "hybrid": shared_utils.hybrid_search}
+
+    def timed(name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        timings[name].append(time.perf_counter() - start)
+        return result
+
+    for iteration in range(repeat):
+        for q in questions:
+            query = shared_utils.preprocess_query(q["question"])
+            category = q["category"]
+            timed("catalog", shared_utils.get_documents_in_category, category)
+            match = CLAUSE_PATTERN.search(query)
+            if match:
+                timed("clause", shared_utils.extract_clause_section, None, match.group(1), category)
+            for mode, search in searches.items():
+                chunks = timed(f"{mode}_search", search, query, top_k=k, category=category)
+                if iteration == 0:
+                    recalls[mode].append(recall(chunks, q["relevant"]))
+            # The prompt, context cap and output budget follow the query type, as in the app.
+            profile = chatbot_model.QUERY_PROFILES[chatbot_model.query_classifier.classify_query(q["question"])]
+            context, _ = timed("retrieve_context", chatbot_model._retrieve_context, q["question"], None, category,
+                               profile=profile)
+            messages = timed("prompt_build", chatbot_model._build_messages, q["question"], context or "", [],
+                             profile["instruction"])
+
+            if iteration == 0:
+                # Generation is by far the slowest stage; it is measured once per question.
+                start = time.perf_counter()
+                first_token = None
+                for part in ollama.chat(model=chatbot_model.GENERATION_MODEL, messages=messages,
+                                        options=chatbot_model._generation_options(profile), stream=True):
+                    if first_token is None and part["message"]["content"]:
+                        first_token = time.perf_counter() - start
+                timings["generation"].append(time.perf_counter() - start)
+                if first_token is not None:
+                    timings["time_to_first_token"].append(first_token)
+
+    return ({name: summarize(values) for name, values in timings.items()},
+            {mode: round(statistics.mean(values), 4) for mode, values in recalls.items()})
+
+
+def run_concurrent_sessions(chatbot_model, questions, sessions, queries_per_session, seed):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def session(index):
+        rng = random.Random(seed + index)
+        for _ in range(queries_per_session):
+            q = rng.choice(questions)
+            start = time.perf_counter()
+            try:
+                chatbot_model.generate_llm_response(q["question"], category=q["category"],
+                                                    session_id=f"bench-session-{index}")
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "sessions": sessions,
+        "queries": len(latencies),
+        "errors": len(errors),
+        "elapsed_seconds": round(elapsed, 3),
+        "queries_per_second": round(len(latencies) / elapsed, 3) if elapsed else None,
+        "latency": summarize(latencies),
+    }
+
+
+def compare(result, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    def delta(new, old):
+        if not old:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit')}):")
+    for name, stats in result["stages"].items():
+        old = baseline.get("stages", {}).get(name, {})
+        if stats.get("count") and old.get("count"):
+            print(f"  {name:20s} p50 {stats['p50_ms']:9.2f}ms ({delta(stats['p50_ms'], old['p50_ms'])})  "
+                  f"p95 {stats['p95_ms']:9.2f}ms ({delta(stats['p95_ms'], old['p95_ms'])})")
+    for mode, value in result["recall"].items():
+        old = baseline.get("recall", {}).get(mode)
+        if old is not None:
+            print(f"  recall@{result['config']['k']} {mode:8s} {value:.3f} (was {old:.3f})")
+    new_qps = result["throughput"]["queries_per_second"]
+    old_qps = baseline.get("throughput", {}).get("queries_per_second")
+    if new_qps and old_qps:
+        print(f"  throughput          {new_qps:.2f} q/s ({delta(new_qps, old_qps)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(FIXTURES_DIR, "corpus"),
+                        help="Directory of <category>/<document>.txt files")
+    parser.add_argument("--questions", default=os.path.join(FIXTURES_DIR, "questions.jsonl"))
+    parser.add_argument("--synthetic-docs", type=int, default=0, help="Filler documents added to the corpus")
+    parser.add_argument("--k", type=int, default=3, help="Chunks retrieved per question")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the questions for the retrieval stages")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent chat sessions")
+    parser.add_argument("--queries-per-session", type=int, default=5)
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the answer cache on (off by default)")
+    parser.add_argument("--ollama-host", help="Use this Ollama server instead of the stub")
+    parser.add_argument("--stub-tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--stub-prompt-tokens-per-second", type=float, default=4000.0)
+    parser.add_argument("--stub-answer-tokens", type=int, default=200)
+    parser.add_argument("--stub-parallel", type=int, default=1, help="Generations the stub serves at once")
+    parser.add_argument("--workspace", help="Scratch directory (default: a temporary directory)")
+    parser.add_argument("--output", default="bench_chat_pipeline.json", help="Result file")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own log output")
+    args = parser.parse_args()
+    output_path = os.path.abspath(args.output)
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    if args.ollama_host:
+        ollama_host = args.ollama_host
+    else:
+        settings = StubSettings(args.stub_tokens_per_second, args.stub_prompt_tokens_per_second,
+                                args.stub_answer_tokens, args.stub_parallel)
+        _, ollama_host = start_stub_server(0, settings)
+    # Must be set before ollama is imported: its default client reads it once.
+    os.environ["OLLAMA_HOST"] = ollama_host
+
+    with open(args.questions, 'r', encoding='utf-8') as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+    workspace = args.workspace or tempfile.mkdtemp(prefix="bench_chat_pipeline_")
+    prepare_workspace(workspace, args.corpus, args.synthetic_docs, args.seed)
+    # Every data path in the app is relative to the working directory.
+    os.chdir(workspace)
+
+    log = None if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(log) if log is not None else contextlib.nullcontext():
+        import ollama
+        import answer_cache
+        import shared_utils
+        from document_catalog import DocumentCatalog
+        from model import chatbot_model
+
+        answer_cache.ANSWER_CACHE_ENABLED = args.answer_cache
+        # The fixture corpus is plain text, which stands in for already-OCR'd PDFs.
+        shared_utils.document_catalog = DocumentCatalog(shared_utils.DOCUMENT_DIRECTORIES, extensions=('.txt',))
+
+        start = time.perf_counter()
+        chunks = ingest(shared_utils, embed_batch_size=64)
+        ingest_seconds = time.perf_counter() - start
+        stages, recalls = run_stages(shared_utils, chatbot_model, ollama, questions, args.k, args.repeat)
+        throughput = run_concurrent_sessions(chatbot_model, questions, args.sessions,
+                                             args.queries_per_session, args.seed)
+
+    result = {
+        "timestamp": datetime.now().isoformat(),
+        "commit": git_commit(),
+        "config": {
+            "documents": len(shared_utils.get_all_document_paths()), "chunks": chunks,
+            "questions": len(questions), "k": args.k, "repeat": args.repeat,
+            "retrieval_mode": shared_utils.RETRIEVAL_MODE, "answer_cache": args.answer_cache,
+            "ollama": args.ollama_host or "stub",
+            "stub": None if args.ollama_host else {
+                "tokens_per_second": args.stub_tokens_per_second,
+                "prompt_tokens_per_second": args.stub_prompt_tokens_per_second,
+                "answer_tokens": args.stub_answer_tokens, "parallel": args.stub_parallel,
+            },
+        },
+        "ingest_seconds": round(ingest_seconds, 3),
+        "stages": stages,
+        "recall": recalls,
+        "throughput": throughput,
+    }
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+
+    print(f"{result['config']['documents']} documents, {chunks} chunks, {len(questions)} questions "
+          f"(ingest {ingest_seconds:.1f}s)")
+    for name, stats in stages.items():
+        if stats.get("count"):
+            print(f"  {name:20s} p50 {stats['p50_ms']:9.2f}ms  p95 {stats['p95_ms']:9.2f}ms  "
+                  f"p99 {stats['p99_ms']:9.2f}ms  (n={stats['count']})")
+    print("  " + "  ".join(f"recall@{args.k} {mode}={value:.3f}" for mode, value in recalls.items()))
+    print(f"  {throughput['sessions']} sessions: {throughput['queries_per_second']} q/s, "
+          f"p95 {throughput['latency'].get('p95_ms')}ms, {throughput['errors']} errors")
+    print(f"Results written to {output_path}")
+    if compare_path:
+        compare(result, compare_path)
+    if not args.workspace:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
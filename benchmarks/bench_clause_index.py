@@ -0,0 +1,136 @@
+"""
+Compares the old per-query clause scan (read every OCR cache file in the category,
+run the start/end regexes) against a lookup in the precomputed clause index, which
+reads only the matching documents' text to cut the clause out.
+
+Usage: python benchmarks/bench_clause_index.py [--docs 1200] [--queries 200]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clause_index
+
+CATEGORIES = ["hr", "pgp", "general"]
+
+
+def make_document(rng, sections=12, clauses_per_section=6):
+    lines = []
+    for s in range(1, sections + 1):
+        lines.append(f"{s}. SECTION {s} HEADING")
+        for c in range(1, clauses_per_section + 1):
+            if c % 3 == 1:
+                lines.append(str(rng.randint(1, 300)))  # OCR'd page number on a line of its own
+            lines.append(f"{s}.{c} Clause {s}.{c} text about leave, travel and allowances.")
+            lines.extend(" ".join(rng.choice(["employee", "shall", "be", "entitled", "to", "the",
+                                              "policy", "approval", "of", "competent", "authority"])
+                                  for _ in range(14)) for _ in range(4))
+    return "\n".join(lines)
+
+
+def legacy_extract(cache_paths, clause_ref):
+    """The pre-index implementation of extract_clause_section, minus the directory walk."""
+    results = []
+    for path in cache_paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            full_text = f.read()
+        start_pattern_str = r"^\s*" + re.escape(clause_ref) + r"\.?\s+.*"
+        start_match = re.search(start_pattern_str, full_text, re.MULTILINE | re.IGNORECASE)
+        if not start_match: continue
+        end_index = len(full_text)
+        generic_end_pattern = re.compile(r"^\s*(\d{1,2}\.)\s+[A-Z\s/]+$", re.MULTILINE)
+        for match in generic_end_pattern.finditer(full_text, pos=start_match.end()):
+            end_index = match.start()
+            break
+        extracted_text = full_text[start_match.start():end_index].strip()
+        if extracted_text:
+            results.append(extracted_text)
+    return results
+
+
+def check_page_number_lines():
+    """Regression: a bare page number before a clause must not hide that clause."""
+    text = "1. LEAVE RULES\n12\n4.1 Casual leave is granted.\n4.2 Earned leave accrues monthly.\n"
+    clauses = clause_index.build_clause_entries(text)
+    assert sorted(clauses) == ["1", "4.1", "4.2"], sorted(clauses)
+    assert clauses["4.1"]["heading"] == "4.1 Casual leave is granted."
+
+
+def check_same_filename_in_two_categories():
+    """Regression: a filename used in two categories must keep both documents' clauses."""
+    clause_index.index_document("circular.pdf", "hr", "1. LEAVE\n1.1 Casual leave.\n", "hr/circular.pdf")
+    clause_index.index_document("circular.pdf", "pgp", "1. TRAVEL\n1.1 Air travel.\n", "pgp/circular.pdf")
+    assert [e["path"] for e in clause_index.lookup_clause("hr", "1.1")] == ["hr/circular.pdf"]
+    assert [e["path"] for e in clause_index.lookup_clause("pgp", "1.1")] == ["pgp/circular.pdf"]
+    clause_index.remove_document("circular.pdf", "hr")
+    assert not clause_index.lookup_clause("hr", "1.1") and clause_index.lookup_clause("pgp", "1.1")
+    clause_index.remove_document("circular.pdf")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clause index benchmark")
+    parser.add_argument("--docs", type=int, default=1200)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    check_page_number_lines()
+    check_same_filename_in_two_categories()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        by_category = {cat: [] for cat in CATEGORIES}
+        start = time.perf_counter()
+        for i in range(args.docs):
+            category = CATEGORIES[i % len(CATEGORIES)]
+            filename = f"doc_{i}.pdf"
+            text = make_document(rng)
+            path = os.path.join(tmp, filename + ".txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            by_category[category].append(path)
+            clause_index.index_document(filename, category, text, path)
+        clause_index.save_clause_index(os.path.join(tmp, "clause_index.json"))
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        clause_index.load_clause_index(os.path.join(tmp, "clause_index.json"))
+        load_time = time.perf_counter() - start
+
+        queries = [(rng.choice(CATEGORIES), f"{rng.randint(1, 12)}.{rng.randint(1, 6)}")
+                   for _ in range(args.queries)]
+
+        legacy_times, indexed_times = [], []
+        for category, clause_ref in queries:
+            t0 = time.perf_counter()
+            legacy = legacy_extract(by_category[category], clause_ref)
+            legacy_times.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            indexed = []
+            for entry in clause_index.lookup_clause(category, clause_ref):
+                with open(entry["path"], 'r', encoding='utf-8') as f:
+                    indexed.append(clause_index.clause_text(entry, f.read()))
+            indexed_times.append(time.perf_counter() - t0)
+
+            assert indexed == legacy, f"Mismatch for {category}/{clause_ref}"
+
+    print(f"Documents: {args.docs}, queries: {args.queries}")
+    print(f"Index build: {build_time:.2f}s, load: {load_time:.2f}s")
+    for name, times in (("legacy scan", legacy_times), ("clause index", indexed_times)):
+        print(f"{name:>13}: p50 {percentile(times, 50) * 1000:.3f} ms, "
+              f"p95 {percentile(times, 95) * 1000:.3f} ms")
+    print(f"Speed-up (p50): {percentile(legacy_times, 50) / max(percentile(indexed_times, 50), 1e-9):.0f}x")
+
+
+if __name__ == "__main__":
+    main()
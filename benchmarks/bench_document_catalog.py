@@ -0,0 +1,88 @@
+"""
+Compares the old per-call os.walk in get_all_document_paths against lookups in
+the cached DocumentCatalog on a synthetic document tree.
+
+Usage: python benchmarks/bench_document_catalog.py [--docs 5000] [--calls 300]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_catalog import DocumentCatalog
+
+CATEGORIES = ["hr", "pgp", "finance", "safety", "general"]
+
+
+def legacy_get_all_document_paths(directories):
+    """The pre-catalog implementation of shared_utils.get_all_document_paths."""
+    all_docs = []
+    for directory in directories:
+        if not os.path.exists(directory):
+            continue
+        for root, _, files in os.walk(directory):
+            for file in files:
+                if file.lower().endswith('.pdf'):
+                    relative_path = os.path.relpath(root, directory)
+                    category = relative_path.split(os.sep)[0]
+                    if category == '.':
+                        category = 'general'
+                    all_docs.append({"filename": file, "path": os.path.join(root, file),
+                                     "category": category.lower()})
+    return all_docs
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Document catalog benchmark")
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--calls", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        directories = [os.path.join(tmp, "documents"), os.path.join(tmp, "uploads")]
+        filenames = []
+        for i in range(args.docs):
+            folder = os.path.join(rng.choice(directories), rng.choice(CATEGORIES), f"batch_{i % 20}")
+            os.makedirs(folder, exist_ok=True)
+            filename = f"circular_{i}.pdf"
+            open(os.path.join(folder, filename), 'wb').close()
+            filenames.append(filename)
+
+        # recheck_seconds=0 so every catalog call pays for the mtime check (worst case).
+        catalog = DocumentCatalog(directories, recheck_seconds=0)
+        assert len(catalog.all_documents()) == len(legacy_get_all_document_paths(directories))
+
+        results = {}
+        for name, fn in (
+                ("legacy walk + filter", lambda f, c: [d for d in legacy_get_all_document_paths(directories)
+                                                       if d['category'] == c]),
+                ("catalog (mtime check)", lambda f, c: catalog.documents_in_category(c)),
+                ("legacy find by name", lambda f, c: next((d for d in legacy_get_all_document_paths(directories)
+                                                          if d['filename'] == f), None)),
+                ("catalog find by name", lambda f, c: catalog.find(f)),
+        ):
+            times = []
+            for _ in range(args.calls):
+                filename, category = rng.choice(filenames), rng.choice(CATEGORIES)
+                t0 = time.perf_counter()
+                fn(filename, category)
+                times.append(time.perf_counter() - t0)
+            results[name] = times
+
+    print(f"Documents: {args.docs}, calls per case: {args.calls}")
+    for name, times in results.items():
+        print(f"{name:>22}: p50 {percentile(times, 50) * 1000:.3f} ms, p95 {percentile(times, 95) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
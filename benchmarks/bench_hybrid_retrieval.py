@@ -0,0 +1,76 @@
+"""
+Measures recall@k and latency of the vector, BM25 and hybrid (RRF) retrieval modes
+against the live index (data/chroma_db and data/lexical_index.json), using a
+labelled question set.
+
+The question file is JSON lines, one question per line:
+    {"question": "what is the leave encashment limit", "category": "hr",
+     "relevant": ["encashment of earned leave", "300 days"]}
+"relevant" lists phrases that a correct chunk contains (matched case-insensitively).
+recall@k is the share of a question's phrases found in its top k chunks,
+averaged over the questions.
+
+Usage: python benchmarks/bench_hybrid_retrieval.py --questions questions.jsonl [--k 3] [--modes vector lexical hybrid]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shared_utils
+
+SEARCHES = {
+    "vector": shared_utils.semantic_search,
+    "lexical": shared_utils.lexical_search,
+    "hybrid": shared_utils.hybrid_search,
+}
+
+
+def load_questions(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def recall(chunks, relevant):
+    text = "\n".join(chunks).lower()
+    return sum(1 for phrase in relevant if phrase.lower() in text) / len(relevant)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", required=True, help="Labelled question file (JSON lines)")
+    parser.add_argument("--k", type=int, default=3, help="Chunks retrieved per question")
+    parser.add_argument("--modes", nargs="+", default=list(SEARCHES), choices=list(SEARCHES))
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    shared_utils.ensure_lexical_index()
+    if any(mode != "lexical" for mode in args.modes):
+        shared_utils.warm_up_retrieval()
+
+    print(f"{len(questions)} questions, k={args.k}")
+    for mode in args.modes:
+        search = SEARCHES[mode]
+        recalls, latencies = [], []
+        for q in questions:
+            query = shared_utils.preprocess_query(q["question"])
+            start = time.perf_counter()
+            chunks = search(query, top_k=args.k, category=q["category"])
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(recall(chunks, q["relevant"]))
+        print(f"{mode:8s} recall@{args.k}={statistics.mean(recalls):.3f}  "
+              f"hits={sum(1 for r in recalls if r > 0)}/{len(recalls)}  "
+              f"p50={percentile(latencies, 50):.1f}ms  p95={percentile(latencies, 95):.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
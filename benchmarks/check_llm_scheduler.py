@@ -0,0 +1,85 @@
+"""
+Checks that the LLM scheduler does not hang on a generation whose stream stalls:
+callers get GenerationTimeout (with the text generated so far) at the time limit,
+and the worker gives its slot back once the stalled read times out. Ollama itself
+is replaced by a fake client whose stream sends a few parts and then goes silent.
+
+Usage: python benchmarks/check_llm_scheduler.py
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_scheduler
+from llm_scheduler import GenerationScheduler, GenerationTimeout
+
+
+class StallingClient:
+    """Streams `parts`, then sends nothing until the read timeout (stall_seconds) expires."""
+
+    def __init__(self, parts, stall_seconds):
+        self.parts = parts
+        self.stall_seconds = stall_seconds
+        self.closed = threading.Event()
+
+    def chat(self, stream=True, **kwargs):
+        for text in self.parts:
+            yield {"message": {"role": "assistant", "content": text}, "done": False}
+        # What the HTTP client does when no bytes arrive within its read timeout.
+        time.sleep(self.stall_seconds)
+        self.closed.set()
+        raise TimeoutError("timed out")
+
+
+def run_stalled(generation_timeout, stall_seconds):
+    client = StallingClient(["Casual ", "leave is "], stall_seconds)
+    llm_scheduler.get_ollama_client = lambda: client
+    llm_scheduler.LLM_GENERATION_TIMEOUT_SECONDS = generation_timeout
+    llm_scheduler.LLM_STREAM_STALL_SECONDS = stall_seconds
+    scheduler = GenerationScheduler(max_in_flight=1)
+    ticket = scheduler.submit("user", "chat", model="fake", messages=[])
+    start = time.time()
+    try:
+        ticket.collect()
+        raise AssertionError("a stalled generation must not finish normally")
+    except GenerationTimeout as e:
+        partial_text = e.partial_text
+    return time.time() - start, partial_text, client, scheduler
+
+
+def check_time_limit_during_stall():
+    """The caller is released at the time limit even though no part arrives to check it."""
+    waited, partial_text, client, scheduler = run_stalled(generation_timeout=1, stall_seconds=3)
+    assert waited < 2.5, f"caller waited {waited:.1f}s past a 1s limit"
+    assert partial_text == "Casual leave is ", repr(partial_text)
+    assert client.closed.wait(5), "stalled stream never ended"
+    deadline = time.time() + 2
+    while scheduler.stats()["running"] and time.time() < deadline:
+        time.sleep(0.05)
+    assert scheduler.stats()["running"] == 0, "worker slot still held after the read timed out"
+
+
+def check_stall_before_time_limit():
+    """A read timeout well inside the time limit ends the answer like a time-out, keeping its text."""
+    waited, partial_text, _, _ = run_stalled(generation_timeout=30, stall_seconds=0.5)
+    assert waited < 5, f"caller waited {waited:.1f}s for a 0.5s stall"
+    assert partial_text == "Casual leave is ", repr(partial_text)
+
+
+def main():
+    original = (llm_scheduler.get_ollama_client, llm_scheduler.LLM_GENERATION_TIMEOUT_SECONDS,
+                llm_scheduler.LLM_STREAM_STALL_SECONDS)
+    try:
+        check_time_limit_during_stall()
+        check_stall_before_time_limit()
+    finally:
+        (llm_scheduler.get_ollama_client, llm_scheduler.LLM_GENERATION_TIMEOUT_SECONDS,
+         llm_scheduler.LLM_STREAM_STALL_SECONDS) = original
+    print("LLM scheduler: stalled streams end at the time limit and free their slot.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Checks that batch OCR resumes after being killed: a run of batch_process_document.main
+is killed partway through a scanned PDF, then main is run again, and pages that were
+checkpointed before the kill must not be OCR'd a second time.
+
+Tesseract is replaced by a slow fake OCR that logs every page it handles, and
+embeddings come from the local Ollama stand-in (benchmarks/ollama_stub.py).
+
+Usage: python benchmarks/check_ocr_resume.py [--pages 12]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+SECONDS_PER_PAGE = 0.3
+
+
+def make_scanned_pdf(path, pages):
+    """A PDF whose pages carry too little text to skip OCR."""
+    import fitz
+    doc = fitz.open()
+    for page_number in range(1, pages + 1):
+        doc.new_page().insert_text((72, 72), f"Page {page_number}")
+    doc.save(path)
+    doc.close()
+
+
+def fake_page_window(doc_path, first_page, last_page):
+    results = {}
+    for page_number in range(first_page, last_page + 1):
+        time.sleep(SECONDS_PER_PAGE)
+        with open(os.environ["OCR_RESUME_LOG"], "a", encoding="utf-8") as f:
+            f.write(f"{page_number}\n")
+        results[page_number] = f"{page_number}.1 Clause text of page {page_number} for the resume check."
+    return results
+
+
+def run_ingest():
+    """Child process: runs the batch ingest with the fake OCR, one page at a time."""
+    from concurrent.futures import ThreadPoolExecutor
+    import data_processing
+    import batch_process_document
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    data_processing.get_ocr_pool = lambda: pool
+    data_processing.process_page_window = fake_page_window
+    data_processing.OCR_PAGE_WINDOW = 1
+    data_processing.OCR_PROCESSES = 1
+    batch_process_document.main(ocr_workers=1)
+
+
+def read_log(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [int(line) for line in f if line.strip()]
+
+
+def checkpointed_pages(workspace):
+    pages = set()
+    for root, _, names in os.walk(os.path.join(workspace, "data", "ocr_cache", "pages")):
+        pages.update(int(name[:-4]) for name in names if name.endswith(".txt"))
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR resume check")
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_ingest()
+        return
+
+    from ollama_stub import start_stub_server
+
+    server, ollama_host = start_stub_server(0)
+    workspace = tempfile.mkdtemp(prefix="check_ocr_resume_")
+    try:
+        documents_dir = os.path.join(workspace, "data", "documents", "hr")
+        os.makedirs(documents_dir)
+        make_scanned_pdf(os.path.join(documents_dir, "scanned_circular.pdf"), args.pages)
+        log_path = os.path.join(workspace, "ocr_pages.log")
+        env = dict(os.environ, OLLAMA_HOST=ollama_host, OCR_RESUME_LOG=log_path,
+                   PYTHONPATH=os.pathsep.join([REPO_DIR, BENCH_DIR]))
+        command = [sys.executable, os.path.abspath(__file__), "--child"]
+
+        # 1. Kill the first run once a third of the pages are done.
+        first = subprocess.Popen(command, cwd=workspace, env=env,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.time() + 120
+        while len(read_log(log_path)) < args.pages // 3 and first.poll() is None and time.time() < deadline:
+            time.sleep(0.05)
+        first.kill()
+        first.wait()
+        assert first.returncode != 0, "the first run finished before it could be killed; use more --pages"
+        saved = checkpointed_pages(workspace)
+        first_run = read_log(log_path)
+        assert saved and len(saved) < args.pages, f"expected a partial run, got checkpoints {sorted(saved)}"
+
+        # 2. Run again to completion.
+        open(log_path, "w").close()
+        subprocess.run(command, cwd=workspace, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=300)
+        second_run = read_log(log_path)
+
+        redone = sorted(saved & set(second_run))
+        assert not redone, f"checkpointed pages were OCR'd again: {redone}"
+        assert saved | set(second_run) == set(range(1, args.pages + 1)), "some pages were never OCR'd"
+        assert not checkpointed_pages(workspace), "checkpoints left behind after a complete run"
+        print(f"OCR resume: {len(first_run)} pages OCR'd before the kill ({len(saved)} checkpointed), "
+              f"{len(second_run)} after; no checkpointed page was OCR'd again.")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+A local stand-in for the Ollama HTTP API, so the chat pipeline can be benchmarked
+without a GPU or the real models. It serves /api/embed, /api/embeddings,
+/api/generate and /api/chat:
+
+- embeddings are deterministic hashed bag-of-words vectors, so chunks that share
+  words with a query are near it (good enough to exercise retrieval and recall@k);
+- generation echoes words from the prompt's context, sleeping to simulate prompt
+  evaluation and token generation at the configured rates, and reports the same
+  timing fields (prompt_eval_duration, eval_duration, ...) as Ollama;
+- at most `parallel` generations run at once, like OLLAMA_NUM_PARALLEL.
+
+Point clients at it with OLLAMA_HOST=http://127.0.0.1:<port> before importing ollama.
+
+Usage: python benchmarks/ollama_stub.py [--port 11435] [--tokens-per-second 200]
+"""
+import re
+import json
+import time
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIM = 384
+TOKEN_PATTERN = re.compile(r"[\w\u0900-\u097F]+")
+
+
+def embed_text(text, dim=EMBEDDING_DIM):
+    vector = [0.0] * dim
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        digest = hashlib.md5(token.encode('utf-8')).digest()
+        index = int.from_bytes(digest[:4], 'little') % dim
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector] if norm else vector
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class StubSettings:
+    def __init__(self, tokens_per_second=200.0, prompt_tokens_per_second=4000.0, answer_tokens=200, parallel=1):
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.slots = threading.Semaphore(parallel)
+
+
+class OllamaStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = StubSettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self._send_json({"version": "0.0.0-stub"})
+        elif self.path in ("/api/tags", "/api/ps"):
+            self._send_json({"models": []})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        body = self._read_json()
+        if self.path == "/api/embed":
+            inputs = body.get("input", "")
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self._send_json({"model": body.get("model"), "embeddings": [embed_text(text) for text in inputs]})
+        elif self.path == "/api/embeddings":
+            self._send_json({"embedding": embed_text(body.get("prompt", ""))})
+        elif self.path == "/api/show":
+            self._send_json({"modelfile": "", "parameters": "", "template": "", "details": {}, "model_info": {}})
+        elif self.path == "/api/generate":
+            self._generate(body, body.get("system", "") + body.get("prompt", ""), chat=False)
+        elif self.path == "/api/chat":
+            prompt = "\n".join(message.get("content", "") for message in body.get("messages", []))
+            self._generate(body, prompt, chat=True)
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _generate(self, body, prompt, chat):
+        settings = self.settings
+        options = body.get("options") or {}
+        n_tokens = min(settings.answer_tokens, options.get("num_predict") or settings.answer_tokens)
+        if n_tokens < 0:
+            n_tokens = settings.answer_tokens
+        # Echo words from the context so the answer looks like the real thing.
+        source_words = prompt.split("Context:", 1)[-1].split() or ["ok"]
+        words = [source_words[i % len(source_words)] for i in range(n_tokens)]
+        prompt_tokens = max(1, len(prompt) // 4)
+        stream = body.get("stream", True)
+        model = body.get("model")
+
+        def piece(text, done=False):
+            item = {"model": model, "created_at": _now(), "done": done}
+            if chat:
+                item["message"] = {"role": "assistant", "content": text}
+            else:
+                item["response"] = text
+            return item
+
+        with settings.slots:
+            start = time.perf_counter()
+            if settings.prompt_tokens_per_second:
+                time.sleep(prompt_tokens / settings.prompt_tokens_per_second)
+            prompt_eval_ns = int((time.perf_counter() - start) * 1e9)
+            delay = 1.0 / settings.tokens_per_second if settings.tokens_per_second else 0.0
+            if stream:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+            eval_start = time.perf_counter()
+            for word in words:
+                if delay:
+                    time.sleep(delay)
+                if stream:
+                    self._write_chunk(piece(word + " "))
+            eval_ns = int((time.perf_counter() - eval_start) * 1e9)
+
+        final = piece("" if stream else " ".join(words), done=True)
+        final.update({
+            "done_reason": "length" if n_tokens == options.get("num_predict") else "stop",
+            "total_duration": prompt_eval_ns + eval_ns,
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": prompt_eval_ns,
+            "eval_count": n_tokens,
+            "eval_duration": eval_ns,
+        })
+        if stream:
+            self._write_chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self._send_json(final)
+
+    def _write_chunk(self, payload):
+        data = json.dumps(payload).encode('utf-8') + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_stub_server(port=0, settings=None):
+    """Starts the stub on a background thread. Returns (server, base_url)."""
+    handler = type("ConfiguredOllamaStubHandler", (OllamaStubHandler,), {"settings": settings or StubSettings()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="ollama-stub", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Ollama API stand-in for benchmarks")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Simulated generation speed (0 = instant)")
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=4000.0,
+                        help="Simulated prompt evaluation speed (0 = instant)")
+    parser.add_argument("--answer-tokens", type=int, default=200, help="Tokens generated per answer")
+    parser.add_argument("--parallel", type=int, default=1, help="Generations served at once")
+    args = parser.parse_args()
+    settings = StubSettings(args.tokens_per_second, args.prompt_tokens_per_second, args.answer_tokens, args.parallel)
+    server, url = start_stub_server(args.port, settings)
+    print(f"Ollama stub listening on {url} (set OLLAMA_HOST={url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
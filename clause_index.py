@@ -0,0 +1,162 @@
+import os
+import re
+import json
+import bisect
+import threading
+
+# --- CONFIGURATION ---
+OCR_CACHE_DIR = "data/ocr_cache"
+CLAUSE_INDEX_PATH = os.path.join(OCR_CACHE_DIR, "clause_index.json")
+CLAUSE_INDEX_VERSION = 3
+
+# Same boundaries extract_clause_section used to scan for on every query. Only spaces
+# and tabs may follow the number: with \s a bare page-number line ("12") would match as
+# a clause and swallow the clause on the next line.
+CLAUSE_START_PATTERN = re.compile(r"^[ \t]*(\d+(?:\.\d+)*)\.?[ \t]+.*", re.MULTILINE)
+CLAUSE_END_PATTERN = re.compile(r"^\s*(\d{1,2}\.)\s+[A-Z\s/]+$", re.MULTILINE)
+
+# (category, filename) -> {"path": ..., "text_length": ..., "clauses": {clause_ref: {"start", "end", "heading"}}}
+# Only offsets are kept: the text itself stays in the shared text cache.
+_documents = {}
+# (category, clause_ref) -> [filename, ...]
+_lookup = {}
+_index_lock = threading.RLock()
+
+
+def build_clause_entries(full_text):
+    """
+    Finds every numbered clause in a document's text once, recording where it
+    starts, its heading line and where the next top-level section begins.
+    """
+    end_starts = [m.start() for m in CLAUSE_END_PATTERN.finditer(full_text)]
+    clauses = {}
+    for match in CLAUSE_START_PATTERN.finditer(full_text):
+        clause_ref = match.group(1)
+        if clause_ref in clauses:
+            continue  # The first occurrence wins, as with re.search.
+        start_index = match.start()
+        next_end = bisect.bisect_left(end_starts, match.end())
+        end_index = end_starts[next_end] if next_end < len(end_starts) else len(full_text)
+        if not full_text[start_index:end_index].strip():
+            continue
+        clauses[clause_ref] = {
+            "start": start_index,
+            "end": end_index,
+            "heading": match.group(0).strip()[:200],
+        }
+    return clauses
+
+
+def _add_to_lookup(key, doc):
+    category, filename = key
+    for clause_ref in doc["clauses"]:
+        _lookup.setdefault((category, clause_ref), []).append(filename)
+
+
+def _remove_from_lookup(key, doc):
+    category, filename = key
+    for clause_ref in doc["clauses"]:
+        lookup_key = (category, clause_ref)
+        filenames = _lookup.get(lookup_key, [])
+        if filename in filenames:
+            filenames.remove(filename)
+        if not filenames:
+            _lookup.pop(lookup_key, None)
+
+
+def index_document(filename, category, full_text, path):
+    """
+    Adds or replaces one document's clauses in the in-memory index. full_text must be
+    the text the text cache returns for path: lookups slice that text by offset.
+    """
+    full_text = full_text or ""
+    key = (category, filename)
+    doc = {"path": path, "text_length": len(full_text), "clauses": build_clause_entries(full_text)}
+    with _index_lock:
+        old_doc = _documents.get(key)
+        if old_doc is not None:
+            _remove_from_lookup(key, old_doc)
+        _documents[key] = doc
+        _add_to_lookup(key, doc)
+
+
+def remove_document(filename, category=None):
+    """Drops a document from one category, or from every category if none is given."""
+    with _index_lock:
+        for key in [k for k in _documents if k[1] == filename and (category is None or k[0] == category)]:
+            _remove_from_lookup(key, _documents.pop(key))
+
+
+def is_indexed(filename, category=None):
+    with _index_lock:
+        if category is not None:
+            return (category, filename) in _documents
+        return any(k[1] == filename for k in _documents)
+
+
+def indexed_documents():
+    """[(category, filename), ...] of every indexed document."""
+    with _index_lock:
+        return list(_documents)
+
+
+def lookup_clause(category, clause_ref):
+    """
+    Returns [{"document", "path", "text_length", "heading", "start", "end"}] for a clause
+    in a category: a dictionary hit, no file I/O. clause_text() cuts the clause out of
+    the document's cached text.
+    """
+    results = []
+    with _index_lock:
+        for filename in _lookup.get((category, clause_ref), []):
+            doc = _documents[(category, filename)]
+            entry = doc["clauses"][clause_ref]
+            results.append({
+                "document": filename,
+                "path": doc["path"],
+                "text_length": doc["text_length"],
+                "heading": entry["heading"],
+                "start": entry["start"],
+                "end": entry["end"],
+            })
+    return results
+
+
+def clause_text(entry, full_text):
+    """The clause a lookup_clause entry points at, or None if the text is not the one indexed."""
+    if full_text is None or len(full_text) != entry["text_length"]:
+        return None
+    return full_text[entry["start"]:entry["end"]].strip()
+
+
+def save_clause_index(path=CLAUSE_INDEX_PATH):
+    with _index_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        documents = [{"category": category, "filename": filename, **doc}
+                     for (category, filename), doc in _documents.items()]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": CLAUSE_INDEX_VERSION, "documents": documents}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def load_clause_index(path=CLAUSE_INDEX_PATH):
+    """Loads the persisted index into memory. Returns the number of documents loaded."""
+    with _index_lock:
+        _documents.clear()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == CLAUSE_INDEX_VERSION:
+                    for doc in data.get("documents", []):
+                        key = (doc.pop("category"), doc.pop("filename"))
+                        _documents[key] = doc
+                else:
+                    print(f"[CLAUSE INDEX] Ignoring index with old version {data.get('version')}.")
+            except Exception as e:
+                print(f"[CLAUSE INDEX] Error loading index: {e}")
+        _lookup.clear()
+        for key, doc in _documents.items():
+            _add_to_lookup(key, doc)
+        return len(_documents)
@@ -0,0 +1,126 @@
+import re
+import math
+
+# --- CONFIGURATION ---
+# Upper bound on retrieved context per prompt, whatever the window allows: more
+# context mostly adds prompt-eval time. About the size of the old 7000-char cut.
+MAX_CONTEXT_TOKENS = 1800
+# Kept free for estimate error and the chat template's own tokens.
+SAFETY_MARGIN_TOKENS = 128
+# Chunks overlap by 200 chars; shorter shared runs are treated as coincidence.
+MIN_OVERLAP_CHARS = 40
+MAX_OVERLAP_CHARS = 400
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+# A line starting with a clause number ("2.3 ...", "10. LEAVE") opens a new clause.
+CLAUSE_START = re.compile(r"^\s*\d+(?:\.\d+)*\.?\s+\S", re.MULTILINE)
+
+
+def estimate_tokens(text):
+    """
+    Approximates the generation model's token count without loading its tokenizer:
+    about 4 characters per token for Latin text and 2 for Devanagari, rounded up.
+    """
+    if not text:
+        return 0
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return math.ceil((len(text) - non_ascii) / 4 + non_ascii / 2)
+
+
+def context_token_budget(template_tokens, options, max_context_tokens=MAX_CONTEXT_TOKENS):
+    """Tokens left for context: the window minus the prompt around it and the reserved output."""
+    available = options.get("num_ctx", 2048) - template_tokens - options.get("num_predict", 128) - SAFETY_MARGIN_TOKENS
+    return max(0, min(max_context_tokens, available))
+
+
+def _overlap(left, right):
+    """Length of the longest suffix of left that is a prefix of right (at least MIN_OVERLAP_CHARS)."""
+    tail = left[-MAX_OVERLAP_CHARS:]
+    probe = right[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    start = tail.find(probe)
+    while start != -1:
+        if right.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(probe, start + 1)
+    return 0
+
+
+def dedupe_chunks(chunks):
+    """
+    Drops chunks contained in a higher-ranked one and trims the text a chunk shares
+    with a higher-ranked neighbour (the splitter's overlap), keeping rank order.
+    """
+    kept = []
+    for chunk in chunks:
+        chunk = chunk.strip()
+        if not chunk or any(chunk in other for other in kept):
+            continue
+        for other in kept:
+            head = _overlap(other, chunk)
+            if head:
+                chunk = chunk[head:].lstrip()
+            tail = _overlap(chunk, other)
+            if tail:
+                chunk = chunk[:-tail].rstrip()
+        if chunk:
+            kept.append(chunk)
+    return kept
+
+
+def split_clauses(text):
+    """Splits text into blocks that each start at a clause number (the first may be a preamble)."""
+    starts = [m.start() for m in CLAUSE_START.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts = [0] + starts
+    return [block for block in (text[a:b].strip() for a, b in zip(starts, starts[1:] + [len(text)])) if block]
+
+
+def _cut_at_line(text, budget_tokens):
+    """Longest run of whole lines that fits; used only when a single clause exceeds the budget."""
+    lines, used = [], 0
+    for line in text.splitlines():
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget_tokens:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
+
+
+def pack_context(pieces, budget_tokens):
+    """
+    Builds the prompt context from ranked pieces of text within budget_tokens.
+    Duplicate and overlapping text is removed first. Whole pieces are taken in
+    rank order. A piece that does not fit contributes its leading whole clauses,
+    so a clause is never cut in half. Returns (context, tokens_used).
+    """
+    separator_tokens = estimate_tokens(CONTEXT_SEPARATOR)
+    parts, used = [], 0
+    for piece in dedupe_chunks(pieces):
+        extra = separator_tokens if parts else 0
+        cost = estimate_tokens(piece)
+        if used + extra + cost <= budget_tokens:
+            parts.append(piece)
+            used += extra + cost
+            continue
+        blocks = []
+        for block in split_clauses(piece):
+            block_cost = estimate_tokens(block) + 1
+            if used + extra + block_cost > budget_tokens:
+                break
+            blocks.append(block)
+            used += block_cost
+        if blocks:
+            parts.append("\n".join(blocks))
+            used += extra
+    if not parts and pieces:
+        # Even the best piece's first clause is over budget: keep as many whole lines as fit.
+        first = dedupe_chunks(pieces)
+        if first:
+            text = _cut_at_line(first[0], budget_tokens)
+            if text:
+                parts.append(text)
+                used = estimate_tokens(text)
+    return CONTEXT_SEPARATOR.join(parts), used
@@ -0,0 +1,205 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import sqlite_pool
+import schema_migrations
+
+# --- CONFIGURATION ---
+# "auto" uses Redis when database.get_redis_client can connect, otherwise SQLite;
+# "memory" keeps history in this process only (lost on restart, not shared between workers).
+CONVERSATION_MEMORY_BACKEND = "auto"
+CONVERSATION_DB_PATH = sqlite_pool.LOG_DB_PATH
+CONVERSATION_TTL_SECONDS = 2 * 60 * 60
+# Turns kept per session; get_conversation_context never looks further back.
+CONVERSATION_MAX_TURNS = 3
+# Answers are stored already cut to this many characters.
+RESPONSE_SUMMARY_CHARS = 200
+# In-process store: least recently used sessions are dropped beyond these caps.
+CONVERSATION_MAX_SESSIONS = 10000
+CONVERSATION_MAX_BYTES = 16 * 1024 * 1024
+REDIS_KEY_PREFIX = "conversation"
+
+
+def make_turn(query, response, document):
+    return {
+        "query": query,
+        "response": response[:RESPONSE_SUMMARY_CHARS],
+        "document": document,
+        "timestamp": time.time(),
+    }
+
+
+# --- STORES ---
+class InProcessMemory:
+    """LRU + TTL store for a single process, capped by session count and total size."""
+
+    def __init__(self, max_sessions=CONVERSATION_MAX_SESSIONS, max_bytes=CONVERSATION_MAX_BYTES,
+                 ttl=CONVERSATION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # session_id -> (turns, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_turns(self, session_id):
+        with self._lock:
+            item = self._sessions.get(session_id)
+            if item is None:
+                return []
+            turns, size, expires_at = item
+            if expires_at < time.time():
+                del self._sessions[session_id]
+                self._bytes -= size
+                return []
+            self._sessions.move_to_end(session_id)
+            return list(turns)
+
+    def append_turn(self, session_id, turn):
+        with self._lock:
+            turns, size, _ = self._sessions.pop(session_id, ([], 0, 0))
+            self._bytes -= size
+            turns = (turns + [turn])[-CONVERSATION_MAX_TURNS:]
+            size = len(json.dumps(turns))
+            self._sessions[session_id] = (turns, size, time.time() + self.ttl)
+            self._bytes += size
+            while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._sessions.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def clear_session(self, session_id):
+        with self._lock:
+            item = self._sessions.pop(session_id, None)
+            if item is not None:
+                self._bytes -= item[1]
+
+
+class RedisMemory:
+    """One capped Redis list per session, expiring CONVERSATION_TTL_SECONDS after the last turn."""
+
+    def __init__(self, client, ttl=CONVERSATION_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+
+    def _key(self, session_id):
+        return f"{REDIS_KEY_PREFIX}:{session_id}"
+
+    def get_turns(self, session_id):
+        return [json.loads(raw) for raw in self.client.lrange(self._key(session_id), -CONVERSATION_MAX_TURNS, -1)]
+
+    def append_turn(self, session_id, turn):
+        key = self._key(session_id)
+        pipe = self.client.pipeline()
+        pipe.rpush(key, json.dumps(turn, ensure_ascii=False))
+        pipe.ltrim(key, -CONVERSATION_MAX_TURNS, -1)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def clear_session(self, session_id):
+        self.client.delete(self._key(session_id))
+
+
+class SQLiteMemory:
+    """One row per session holding its recent turns as JSON; shared by every worker on the host."""
+
+    def __init__(self, path=CONVERSATION_DB_PATH, ttl=CONVERSATION_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._last_purge = 0.0
+        schema_migrations.migrate(path, schema=schema_migrations.CONVERSATION_SCHEMA)
+
+    @contextmanager
+    def _connection(self):
+        """A connection from the shared SQLite pool, returned to it afterwards."""
+        conn = sqlite_pool.get_connection(self.path)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get_turns(self, session_id):
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT turns FROM conversation_memory WHERE session_id = ? AND expires_at >= ?",
+                (str(session_id), time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def append_turn(self, session_id, turn):
+        now = time.time()
+        with self._connection() as conn, conn:
+            # Take the write lock before reading, so concurrent appends to one session
+            # (chat and voice, or two tabs) cannot both start from the same old turns.
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT turns FROM conversation_memory WHERE session_id = ? AND expires_at >= ?",
+                (str(session_id), now)
+            ).fetchone()
+            turns = (json.loads(row[0]) if row else []) + [turn]
+            conn.execute(
+                "INSERT OR REPLACE INTO conversation_memory (session_id, turns, expires_at) VALUES (?, ?, ?)",
+                (str(session_id), json.dumps(turns[-CONVERSATION_MAX_TURNS:], ensure_ascii=False), now + self.ttl)
+            )
+            # Expired sessions are deleted now and then rather than on every write.
+            if now - self._last_purge > 60:
+                self._last_purge = now
+                conn.execute("DELETE FROM conversation_memory WHERE expires_at < ?", (now,))
+
+    def clear_session(self, session_id):
+        with self._connection() as conn, conn:
+            conn.execute("DELETE FROM conversation_memory WHERE session_id = ?", (str(session_id),))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Picks the backend configured by CONVERSATION_MEMORY_BACKEND, falling back to in-process memory."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = None
+                if CONVERSATION_MEMORY_BACKEND == "auto":
+                    try:
+                        from database import get_redis_client
+                        client = get_redis_client()
+                        if client is not None:
+                            store = RedisMemory(client)
+                    except Exception as e:
+                        print(f"[CONVERSATION MEMORY] Redis unavailable: {e}")
+                    if store is None:
+                        try:
+                            store = SQLiteMemory()
+                        except Exception as e:
+                            print(f"[CONVERSATION MEMORY] SQLite unavailable: {e}")
+                _store = store or InProcessMemory()
+                print(f"[CONVERSATION MEMORY] Using {type(_store).__name__}.")
+    return _store
+
+
+# --- PUBLIC API ---
+def get_turns(session_id):
+    try:
+        return get_store().get_turns(session_id)
+    except Exception as e:
+        print(f"[CONVERSATION MEMORY] Lookup failed: {e}")
+        return []
+
+
+def append_turn(session_id, query, response, document):
+    try:
+        get_store().append_turn(session_id, make_turn(query, response, document))
+    except Exception as e:
+        print(f"[CONVERSATION MEMORY] Save failed: {e}")
+
+
+def clear_session(session_id):
+    try:
+        get_store().clear_session(session_id)
+    except Exception as e:
+        print(f"[CONVERSATION MEMORY] Clear failed: {e}")
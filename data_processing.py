@@ -1,10 +1,25 @@
 import os
+import time
+import shutil
+import threading
+import fitz
 import pytesseract
-from pdf2image import convert_from_path
-from concurrent.futures import ThreadPoolExecutor
+import metrics
+import text_cache
+from pdf2image import convert_from_path, pdfinfo_from_path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 
 # --- CONFIGURATION ---
 OCR_CACHE_DIR = "data/ocr_cache"
+OCR_PAGES_DIR = os.path.join(OCR_CACHE_DIR, "pages")
+# Bump when the OCR settings change so incremental ingest re-OCRs every document.
+OCR_VERSION = 1
+# Pages rendered together by one worker. Peak memory is about
+# OCR_PROCESSES * OCR_PAGE_WINDOW rendered pages, whatever the document length.
+OCR_PAGE_WINDOW = 4
+OCR_PROCESSES = os.cpu_count() or 4
+# Pages whose embedded text layer has at least this many characters skip OCR.
+TEXT_LAYER_MIN_CHARS = 100
 
 
 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
@@ -12,14 +27,25 @@ pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tessera
 
 # --- END OF FIX ---
 
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+
+def get_ocr_pool():
+    """One process pool shared by every document being OCR'd, sized to the cores."""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ProcessPoolExecutor(max_workers=OCR_PROCESSES)
+        return _ocr_pool
+
 
 def process_page_bilingual(img_tuple):
-    """Processes a single page with both English and Hindi OCR."""
+    """Processes a single page with both English and Hindi OCR. Returns the page's text."""
     i, img = img_tuple
     custom_config = r'--oem 3 --psm 6 -c preserve_interword_spaces=1'
     try:
-        text = pytesseract.image_to_string(img, lang='eng+hin', config=custom_config)
-        return f"\n--- Page {i + 1} ---\n" + text
+        return pytesseract.image_to_string(img, lang='eng+hin', config=custom_config)
     except pytesseract.TesseractNotFoundError:
         # This error will no longer happen because we set the command path above.
         # But we keep the check for safety.
@@ -31,35 +57,172 @@ def process_page_bilingual(img_tuple):
         return ""
 
 
-def batch_process_document(doc_path, doc_filename):
+def process_page_window(doc_path, first_page, last_page):
+    """
+    Runs in a worker process: renders pages first_page..last_page (1-based) and
+    OCRs them. Returns {page_number: text}; text is None if Tesseract is missing.
+    """
+    images = convert_from_path(doc_path, first_page=first_page, last_page=last_page)
+    return {first_page + offset: process_page_bilingual((first_page + offset - 1, img))
+            for offset, img in enumerate(images)}
+
+
+# --- PAGE CHECKPOINTS ---
+# Kept per content hash (like the text cache) and OCR version, so a renamed file still
+# resumes and a changed file or OCR setting never reuses another content's pages.
+def _checkpoint_root(file_hash):
+    return os.path.join(OCR_PAGES_DIR, file_hash)
+
+
+def _checkpoint_dir(file_hash):
+    return os.path.join(_checkpoint_root(file_hash), f"v{OCR_VERSION}")
+
+
+def _checkpoint_path(file_hash, page_number):
+    return os.path.join(_checkpoint_dir(file_hash), f"{page_number:05d}.txt")
+
+
+def _save_page_checkpoint(file_hash, page_number, text):
+    path = _checkpoint_path(file_hash, page_number)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _load_page_checkpoints(file_hash):
+    pages = {}
+    checkpoint_dir = _checkpoint_dir(file_hash)
+    if not os.path.isdir(checkpoint_dir):
+        return pages
+    for name in os.listdir(checkpoint_dir):
+        if name.endswith(".txt"):
+            with open(os.path.join(checkpoint_dir, name), "r", encoding="utf-8") as f:
+                pages[int(name[:-4])] = f.read()
+    return pages
+
+
+def _page_windows(page_numbers, window):
+    """Groups sorted page numbers into runs of consecutive pages, at most `window` long."""
+    windows = []
+    for page in page_numbers:
+        if windows and page == windows[-1][1] + 1 and windows[-1][1] - windows[-1][0] + 1 < window:
+            windows[-1][1] = page
+        else:
+            windows.append([page, page])
+    return windows
+
+
+def read_text_layer(doc_path):
+    """
+    Returns (page_count, {page_number: text}) for the pages of a PDF that carry a
+    usable embedded text layer. Scanned pages are left out and need OCR.
+    """
+    doc = fitz.open(doc_path)
+    try:
+        text_pages = {}
+        for page_index in range(len(doc)):
+            text = doc.load_page(page_index).get_text()
+            if len(text.strip()) >= TEXT_LAYER_MIN_CHARS:
+                text_pages[page_index + 1] = text
+        return len(doc), text_pages
+    finally:
+        doc.close()
+
+
+def remove_ocr_cache(doc_path, file_hash=None):
     """
-    Performs bilingual OCR on a PDF and saves the text to the cache.
-    Returns True on success, False on failure.
+    Deletes the cached text and page checkpoints of a document's current content, or
+    of file_hash (e.g. the previous content of a changed file, or a deleted file).
+    """
+    if file_hash is None:
+        try:
+            file_hash = text_cache.get_content_hash(doc_path)
+        except OSError:
+            return
+    text_cache.remove_text(doc_path, file_hash=file_hash)
+    shutil.rmtree(_checkpoint_root(file_hash), ignore_errors=True)
+
+
+def batch_process_document(doc_path, doc_filename, stats=None):
+    """
+    Extracts a PDF's text and saves it to the shared text cache. Pages with an embedded
+    text layer are read directly; only scanned pages get bilingual OCR,
+    rendered and OCR'd in windows on a process pool. Every finished page is
+    checkpointed under the file's content hash, so an interrupted run resumes where
+    it stopped.
+    If a stats dict is given, page counts are added to its "pages",
+    "text_layer_pages" and "ocr_pages" keys. Returns True on success, False on failure.
     """
     if not doc_path.lower().endswith('.pdf'):
         print(f"'{doc_filename}' is not a PDF. Skipping OCR.")
         return False
 
-    cache_file_path = os.path.join(OCR_CACHE_DIR, doc_filename + ".txt")
-
-    if os.path.exists(cache_file_path):
+    if text_cache.has_text(doc_path):
+        metrics.record_cache_lookup("ocr_text", "hit")
         print(f"Cache exists for {doc_filename}. Skipping OCR.")
         return True
+    metrics.record_cache_lookup("ocr_text", "miss")
 
+    start_time = time.perf_counter()
     try:
-        print(f"Starting OCR for {doc_filename}...")
-        images = convert_from_path(doc_path)
-
-        with ThreadPoolExecutor() as executor:
-            page_texts = list(executor.map(process_page_bilingual, enumerate(images)))
-
-        if any(text is None for text in page_texts):
+        file_hash = text_cache.get_content_hash(doc_path)
+        try:
+            page_count, text_layer_pages = read_text_layer(doc_path)
+        except Exception as e:
+            print(f"[WARN] Could not read text layer of {doc_filename}, OCR'ing every page: {e}")
+            page_count, text_layer_pages = pdfinfo_from_path(doc_path)["Pages"], {}
+        os.makedirs(_checkpoint_dir(file_hash), exist_ok=True)
+        pages = _load_page_checkpoints(file_hash)
+        if pages:
+            print(f"Resuming {doc_filename}: {len(pages)}/{page_count} pages already done.")
+        for page_number, text in text_layer_pages.items():
+            if page_number not in pages:
+                _save_page_checkpoint(file_hash, page_number, text)
+                pages[page_number] = text
+        missing = [page for page in range(1, page_count + 1) if page not in pages]
+        print(f"{doc_filename}: {page_count} pages, {len(text_layer_pages)} with a text layer, "
+              f"{len(missing)} to OCR.")
+
+        pool = get_ocr_pool()
+        windows = _page_windows(missing, OCR_PAGE_WINDOW)
+        in_flight = set()
+        failed = False
+        while windows or in_flight:
+            # Keep a bounded number of windows queued so memory does not grow with page count.
+            while windows and len(in_flight) < OCR_PROCESSES * 2:
+                first_page, last_page = windows.pop(0)
+                in_flight.add(pool.submit(process_page_window, doc_path, first_page, last_page))
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    results = future.result()
+                except Exception as e:
+                    print(f"[ERROR] Failed to render pages of {doc_filename}: {e}")
+                    failed = True
+                    continue
+                for page_number, text in results.items():
+                    if text is None:
+                        failed = True
+                        continue
+                    _save_page_checkpoint(file_hash, page_number, text)
+                    pages[page_number] = text
+
+        if failed or len(pages) < page_count:
+            print(f"[ERROR] OCR incomplete for {doc_filename}; finished pages are checkpointed for the next run.")
             return False
 
-        full_text = "".join(page_texts)
-
-        with open(cache_file_path, "w", encoding="utf-8") as f:
-            f.write(full_text)
+        metrics.observe("chatbot_stage_seconds", time.perf_counter() - start_time, stage="ocr_document")
+        metrics.inc("chatbot_pages_processed_total", len(text_layer_pages), source="text_layer")
+        metrics.inc("chatbot_pages_processed_total", page_count - len(text_layer_pages), source="ocr")
+        if stats is not None:
+            stats["pages"] = stats.get("pages", 0) + page_count
+            stats["text_layer_pages"] = stats.get("text_layer_pages", 0) + len(text_layer_pages)
+            stats["ocr_pages"] = stats.get("ocr_pages", 0) + page_count - len(text_layer_pages)
+
+        # Text-layer and OCR'd pages are stored per page and read back in page order
+        text_cache.write_pages(doc_path, {page: pages[page] for page in range(1, page_count + 1)})
+        shutil.rmtree(_checkpoint_root(file_hash), ignore_errors=True)
 
         print(f"Successfully saved OCR text for {doc_filename} to cache.")
         return True
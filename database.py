@@ -5,136 +5,46 @@ import chromadb
 from chromadb.config import Settings
 from datetime import datetime
 
+import sqlite_pool
+import schema_migrations
+
 
 def get_db_connection():
-    conn = sqlite3.connect('sail_chatbot.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    """A pooled connection to sail_chatbot.db (WAL mode); close() returns it to the pool."""
+    return sqlite_pool.get_connection(sqlite_pool.LOG_DB_PATH)
 
 
 def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Create users table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL
-    )
-    ''')
-
-    # Create chat_logs table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS chat_logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id TEXT NOT NULL,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        user_input TEXT NOT NULL,
-        bot_response TEXT NOT NULL,
-        used_general_knowledge BOOLEAN NOT NULL DEFAULT 0
-    )
-    ''')
-
-    # Create voice_logs table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS voice_logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id TEXT NOT NULL,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        query TEXT NOT NULL,
-        response TEXT NOT NULL,
-        used_general_knowledge BOOLEAN NOT NULL DEFAULT 0
-    )
-    ''')
-
-    # Create feedback table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS feedback (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id TEXT NOT NULL,
-        response_id INTEGER,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        rating INTEGER NOT NULL,
-        comments TEXT
-    )
-    ''')
-
-    # Create account_requests table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS account_requests (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-
-    # Create password_requests table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS password_requests (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        email TEXT NOT NULL,
-        token TEXT NOT NULL,
-        request_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-        expiry DATETIME NOT NULL,
-        status TEXT DEFAULT 'Pending'
-    )
-    ''')
-
-    # Create documents table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS documents (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        filename TEXT NOT NULL,
-        content TEXT NOT NULL,
-        uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-
-    conn.commit()
-    conn.close()
+    """Creates or upgrades the sail_chatbot.db tables (see schema_migrations)."""
+    schema_migrations.migrate(sqlite_pool.LOG_DB_PATH)
     print("Database initialized successfully!")
 
 
+# Log rows are committed in batches by sqlite_pool's background writer, so logging adds
+# no disk latency to the request that produced them. The functions therefore return
+# nothing; call sqlite_pool.flush_writes() before reading rows that were just logged.
 def log_chat_interaction(user_id, user_input, bot_response, used_general_knowledge=False):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
+    sqlite_pool.enqueue_write(
+        sqlite_pool.LOG_DB_PATH,
         "INSERT INTO chat_logs (user_id, user_input, bot_response, used_general_knowledge) VALUES (?, ?, ?, ?)",
         (user_id, user_input, bot_response, used_general_knowledge)
     )
-    log_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return log_id
 
 
 def log_voice_interaction(user_id, query, response, used_general_knowledge=False):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
+    sqlite_pool.enqueue_write(
+        sqlite_pool.LOG_DB_PATH,
         "INSERT INTO voice_logs (user_id, query, response, used_general_knowledge) VALUES (?, ?, ?, ?)",
         (user_id, query, response, used_general_knowledge)
     )
-    log_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return log_id
 
 
 def save_feedback(user_id, response_id, rating, comments=None):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
+    sqlite_pool.enqueue_write(
+        sqlite_pool.LOG_DB_PATH,
         "INSERT INTO feedback (user_id, response_id, rating, comments) VALUES (?, ?, ?, ?)",
         (user_id, response_id, rating, comments)
     )
-    feedback_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return feedback_id
 
 
 def get_chroma_client():
@@ -9,17 +9,14 @@ from rapidfuzz import process, fuzz
 import ollama
 import pytesseract
 from pdf2image import convert_from_path
-import hashlib
 import json
-from datetime import datetime
+import text_cache
+import glossary_index
 from concurrent.futures import ThreadPoolExecutor
 import threading
 
 
-OCR_CACHE_DIR = "data/ocr_cache"
 GLOSSARY_CACHE_DIR = "data/glossary_cache"
-_glossary_cache = {}
-_glossary_lock = threading.Lock()
 
 def preprocess_query(query):
     stopwords = [
@@ -32,31 +29,26 @@ def preprocess_query(query):
     return q.strip()
 
 def extract_dynamic_glossary(full_text):
-    glossary = {}
-    for match in re.finditer(r'([A-Za-z ,&/-]+)\s*\(\s*([A-Z]{2,})\s*\)', full_text):
-        definition, acronym = match.group(1).strip(), match.group(2)
-        glossary[acronym.lower()] = definition
-    for match in re.finditer(r'\b([A-Z]{2,})\s*[:\-–]\s*([A-Za-z ,&()/-]+)', full_text):
-        acronym, definition = match.group(1), match.group(2).strip()
-        glossary[acronym.lower()] = definition
-    for match in re.finditer(r'\b([A-Z]{2,})\s+means\s+([A-Za-z ,&()/-]+)', full_text, re.IGNORECASE):
-        acronym, definition = match.group(1), match.group(2).strip()
-        glossary[acronym.lower()] = definition
-    return glossary
+    return glossary_index.build_glossary_entries(full_text)
 
 def glossary_lookup(query, glossary=None):
-    if glossary is None:
-        glossary = get_global_glossary()
     q = query.lower().strip()
     patterns = [r"meaning of (\w+)", r"what is (\w+)", r"define (\w+)", r"full form of (\w+)", r"fullform of (\w+)"]
+    # Without an explicit glossary, terms are looked up in the merged index built at ingest.
+    if glossary is None:
+        find = glossary_index.lookup_term
+    else:
+        find = glossary.get
     for pat in patterns:
         m = re.search(pat, q)
         if m:
             term = m.group(1)
-            if term in glossary:
-                return f"{term.upper()} stands for '{glossary[term]}'."
-    if q in glossary:
-        return f"{q.upper()} stands for '{glossary[q]}'."
+            definition = find(term)
+            if definition:
+                return f"{term.upper()} stands for '{definition}'."
+    definition = find(q)
+    if definition:
+        return f"{q.upper()} stands for '{definition}'."
     return None
 
 def save_glossary_to_cache(document_name, glossary):
@@ -91,59 +83,20 @@ def build_document_glossary(document_name):
     return glossary
 
 def get_global_glossary():
-    with _glossary_lock:
-        if not _glossary_cache:
-            all_docs = get_all_document_paths()
-            combined_glossary = {}
-            for doc in all_docs:
-                doc_glossary = build_document_glossary(doc['filename'])
-                combined_glossary.update(doc_glossary)
-            _glossary_cache.update(combined_glossary)
-        return _glossary_cache.copy()
+    # One merged index, written incrementally at ingest and loaded once per process.
+    ensure_glossary_index()
+    return glossary_index.merged_glossary()
 
 def get_file_hash(file_path):
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
-
-def get_ocr_cache_path(file_path):
-    os.makedirs(OCR_CACHE_DIR, exist_ok=True)
-    file_hash = get_file_hash(file_path)
-    filename = os.path.basename(file_path).replace('.pdf', '').replace('.docx', '').replace('.doc', '')
-    cache_filename = f"{filename}_{file_hash}.txt"
-    return os.path.join(OCR_CACHE_DIR, cache_filename)
+    # Served from the shared text cache index: only re-hashed when size/mtime change.
+    return text_cache.get_content_hash(file_path)
 
 def save_ocr_to_cache(file_path, ocr_text):
-    cache_path = get_ocr_cache_path(file_path)
-    metadata_path = cache_path.replace('.txt', '_metadata.json')
-    with open(cache_path, 'w', encoding='utf-8') as f:
-        f.write(ocr_text)
-    metadata = {
-        'original_file': file_path,
-        'file_size': os.path.getsize(file_path),
-        'ocr_date': datetime.now().isoformat(),
-        'file_hash': get_file_hash(file_path),
-        'text_length': len(ocr_text)
-    }
-    with open(metadata_path, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2)
+    text_cache.write_text(file_path, ocr_text)
 
 def load_ocr_from_cache(file_path):
-    cache_path = get_ocr_cache_path(file_path)
-    metadata_path = cache_path.replace('.txt', '_metadata.json')
-    if not os.path.exists(cache_path) or not os.path.exists(metadata_path):
-        return None
     try:
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-        current_hash = get_file_hash(file_path)
-        if metadata.get('file_hash') != current_hash:
-            return None
-        with open(cache_path, 'r', encoding='utf-8') as f:
-            ocr_text = f.read()
-        return ocr_text
+        return text_cache.read_text(file_path)
     except Exception as e:
         print(f"[CACHE] Error loading cache: {e}")
         return None
@@ -244,12 +197,10 @@ def extract_text_from_image_with_cache(file_path):
         return ""
 
 def extract_text_from_file(file_path):
-    ocr_cache_path = get_ocr_cache_path(file_path)
-    if os.path.exists(ocr_cache_path):
-        with open(ocr_cache_path, 'r', encoding='utf-8') as f:
-            text = f.read()
-        print(f"[DEBUG] Loaded {len(text)} chars from OCR cache for {file_path}")
-        return text
+    cached_text = load_ocr_from_cache(file_path)
+    if cached_text is not None:
+        print(f"[DEBUG] Loaded {len(cached_text)} chars from OCR cache for {file_path}")
+        return cached_text
     # If not cached, extract and cache it
     if file_path.lower().endswith('.pdf'):
         text = extract_text_from_pdf_enhanced(file_path)
@@ -305,16 +256,18 @@ def find_document_by_name(document_name):
 
 from shared_utils import *
 def semantic_search_across_category(query, category, top_k=3):
-    docs = get_all_document_paths()
-    docs_in_cat = [doc for doc in docs if doc['category'].lower() == category.lower()]
+    docs_in_cat = [doc['filename'] for doc in get_documents_in_category(category.lower())]
     print(f"[SEMANTIC SEARCH] Searching {len(docs_in_cat)} docs in category '{category}' for query '{query}'")
-    all_matches = []
-    for doc in docs_in_cat:
-        print(f"[SEMANTIC SEARCH] Checking doc: {doc['filename']}")
-        matches = semantic_search(query, doc['filename'], top_k=top_k)
-        print(f"[SEMANTIC SEARCH] Matches for {doc['filename']}: {matches}")
-        for m in matches:
-            all_matches.append((m, doc['filename']))
+    if not docs_in_cat:
+        print("[SEMANTIC SEARCH] No matches found.")
+        return None
+    try:
+        # One filtered lookup on the pooled store instead of one store per document.
+        results = get_vector_store().similarity_search(query, k=top_k, filter={"source": {"$in": docs_in_cat}})
+    except Exception as e:
+        print(f"[SEMANTIC SEARCH] Search failed: {e}")
+        return None
+    all_matches = [(doc.page_content, doc.metadata.get('source', '')) for doc in results]
     all_matches = [x for x in all_matches if x[0].strip()]
     if not all_matches:
         print("[SEMANTIC SEARCH] No matches found.")
@@ -322,4 +275,3 @@ def semantic_search_across_category(query, category, top_k=3):
     best_chunk, best_doc = all_matches[0]
     print(f"[SEMANTIC SEARCH] Best match in {best_doc}: {best_chunk[:100]}")
     return f"From {best_doc}:\n\n{best_chunk.strip()}"
-
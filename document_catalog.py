@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+
+import metrics
+
+# How often (seconds) lookups re-check directory mtimes for changes.
+CATALOG_RECHECK_SECONDS = 2.0
+
+
+class DocumentCatalog:
+    """
+    In-memory index of the documents under a set of base directories, keyed by
+    filename and by category. The tree is only walked again when a directory's
+    mtime changes (a file or folder was added, removed or renamed in it), when
+    a file watcher reports a change, or when invalidate() is called.
+    """
+
+    def __init__(self, directories, extensions=('.pdf',), recheck_seconds=CATALOG_RECHECK_SECONDS):
+        self.directories = list(directories)
+        self.extensions = tuple(extensions)
+        self.recheck_seconds = recheck_seconds
+        self._lock = threading.RLock()
+        self._documents = []
+        self._by_filename = {}
+        self._by_category = {}
+        self._folder_categories = set()
+        self._dir_mtimes = None  # None means "scan on next access"
+        self._last_check = 0.0
+        self._watcher = None
+
+    # --- SCANNING ---
+    @metrics.timed("catalog_scan")
+    def _scan(self):
+        documents = []
+        folder_categories = set()
+        dir_mtimes = {}
+        for directory in self.directories:
+            if not os.path.exists(directory):
+                dir_mtimes[directory] = None
+                continue
+            for root, dirs, files in os.walk(directory):
+                dir_mtimes[root] = os.stat(root).st_mtime_ns
+                if root == directory:
+                    folder_categories.update(d.lower() for d in dirs if not d.startswith('.'))
+                for file in files:
+                    if not file.lower().endswith(self.extensions):
+                        continue
+                    # The category is the first folder below the base directory,
+                    # e.g. 'hr/policies' -> 'hr'. Files in the base itself are 'general'.
+                    relative_path = os.path.relpath(root, directory)
+                    category = relative_path.split(os.sep)[0]
+                    if category == '.':
+                        category = 'general'
+                    documents.append({
+                        "filename": file,
+                        "path": os.path.join(root, file),
+                        "category": category.lower()
+                    })
+
+        by_filename = {}
+        by_category = {}
+        for doc in documents:
+            by_filename.setdefault(doc['filename'], doc)  # First match wins, as before.
+            by_category.setdefault(doc['category'], []).append(doc)
+
+        self._documents = documents
+        self._by_filename = by_filename
+        self._by_category = by_category
+        self._folder_categories = folder_categories
+        self._dir_mtimes = dir_mtimes
+        self._last_check = time.monotonic()
+
+    def _is_stale(self):
+        for directory, mtime in self._dir_mtimes.items():
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime:
+                return True
+        return False
+
+    def _refresh(self):
+        with self._lock:
+            if self._dir_mtimes is None:
+                self._scan()
+            elif time.monotonic() - self._last_check >= self.recheck_seconds:
+                if self._is_stale():
+                    self._scan()
+                else:
+                    self._last_check = time.monotonic()
+
+    def invalidate(self):
+        """Forces a rescan on the next lookup (e.g. after an upload or ingest)."""
+        with self._lock:
+            self._dir_mtimes = None
+
+    # --- LOOKUPS ---
+    def all_documents(self):
+        self._refresh()
+        return list(self._documents)
+
+    def documents_in_category(self, category):
+        self._refresh()
+        return list(self._by_category.get(category, []))
+
+    def find(self, filename):
+        self._refresh()
+        return self._by_filename.get(filename)
+
+    def categories(self):
+        """Categories that have documents, plus empty category folders."""
+        self._refresh()
+        return set(self._by_category) | self._folder_categories
+
+    # --- OPTIONAL WATCHER ---
+    def start_watcher(self):
+        """
+        Invalidates the catalog as soon as anything changes under the base
+        directories. Uses the optional 'watchfiles' package; without it the
+        mtime check alone keeps the catalog fresh.
+        """
+        if self._watcher is not None:
+            return True
+        try:
+            from watchfiles import watch
+        except ImportError:
+            print("[CATALOG] watchfiles not installed; relying on directory mtime checks.")
+            return False
+        paths = [d for d in self.directories if os.path.exists(d)]
+        if not paths:
+            return False
+
+        def run():
+            try:
+                for _ in watch(*paths):
+                    self.invalidate()
+            except Exception as e:
+                print(f"[CATALOG] File watcher stopped: {e}")
+
+        self._watcher = threading.Thread(target=run, daemon=True, name="document-catalog-watcher")
+        self._watcher.start()
+        return True
@@ -0,0 +1,93 @@
+import os
+import csv
+import time
+import threading
+
+from rapidfuzz import process, fuzz
+
+import metrics
+
+# --- CONFIGURATION ---
+FAQ_CSV_PATH = "data/sail_faq.csv"
+# Same cut-off the voice assistant has always used with token_set_ratio.
+FAQ_MATCH_THRESHOLD = 60
+# The CSV's modification time is checked at most this often; a change reloads it.
+FAQ_RELOAD_CHECK_SECONDS = 5.0
+KEY_COLUMNS = ("Level1", "Level2", "Level3")
+# Cells that mean "no value" in the sheet.
+EMPTY_CELLS = {"", "-", "nan"}
+
+# (keys, responses, mtime): replaced as a whole on reload, so readers never need the lock.
+_faq = ((), (), None)
+_last_check = 0.0
+_load_lock = threading.Lock()
+
+
+def _row_key(row):
+    """The Level1/2/3 cells of a row, lowercased and joined: what questions are matched against."""
+    cells = (str(row.get(column) or "").strip() for column in KEY_COLUMNS)
+    return " ".join(cell.lower() for cell in cells if cell.lower() not in EMPTY_CELLS)
+
+
+def load_faq(path=FAQ_CSV_PATH):
+    """Reads the FAQ sheet and precomputes every row's match key. Returns the number of rows."""
+    global _faq
+    try:
+        mtime = os.path.getmtime(path)
+        keys, responses = [], []
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                key = _row_key(row)
+                response = (row.get("Response") or "").strip()
+                if key and response:
+                    keys.append(key)
+                    responses.append(response)
+    except Exception as e:
+        print(f"[FAQ] Error loading {path}: {e}")
+        return len(_faq[0])
+    _faq = (tuple(keys), tuple(responses), mtime)
+    print(f"[FAQ] Loaded {len(keys)} entries from {path}.")
+    return len(keys)
+
+
+def _current_faq(path=FAQ_CSV_PATH):
+    """The loaded FAQ, reloading it first if the CSV changed since the last check."""
+    global _last_check
+    now = time.time()
+    if now - _last_check >= FAQ_RELOAD_CHECK_SECONDS and _load_lock.acquire(blocking=False):
+        try:
+            _last_check = now
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                mtime = None
+            if mtime is not None and mtime != _faq[2]:
+                load_faq(path)
+        finally:
+            _load_lock.release()
+    return _faq
+
+
+def match_faq(question, threshold=FAQ_MATCH_THRESHOLD, scorer=fuzz.token_set_ratio):
+    """
+    Best FAQ entry for a question, scored against every row in one rapidfuzz call.
+    Returns {"response", "key", "score"} or None when nothing reaches threshold.
+    """
+    q = (question or "").lower().strip()
+    if not q:
+        return None
+    keys, responses, _ = _current_faq()
+    if not keys:
+        return None
+    with metrics.stage_timer("faq_match"):
+        best = process.extractOne(q, keys, scorer=scorer, score_cutoff=threshold)
+    metrics.record_cache_lookup("faq", "hit" if best else "miss")
+    if best is None:
+        return None
+    key, score, index = best
+    return {"response": responses[index], "key": key, "score": score}
+
+
+def faq_responses():
+    """Every answer in the FAQ sheet, e.g. to pre-render them as speech."""
+    return _current_faq()[1]
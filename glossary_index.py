@@ -0,0 +1,153 @@
+import os
+import re
+import json
+import threading
+
+# --- CONFIGURATION ---
+GLOSSARY_INDEX_PATH = "data/glossary_index.json"
+# Bump when the extraction rules change: an index of another version is ignored and rebuilt.
+GLOSSARY_INDEX_VERSION = 1
+# Definitions found by the "Words (ACR)" rule are cut to at most this many words.
+MAX_DEFINITION_WORDS = 10
+
+# The three forms extract_dynamic_glossary has always recognised.
+PARENTHESISED_ACRONYM = re.compile(r'([A-Za-z ,&/-]+)\s*\(\s*([A-Z]{2,})\s*\)')
+ACRONYM_WITH_SEPARATOR = re.compile(r'\b([A-Z]{2,})\s*[:\-–]\s*([A-Za-z ,&()/-]+)')
+ACRONYM_MEANS = re.compile(r'\b([A-Z]{2,})\s+means\s+([A-Za-z ,&()/-]+)', re.IGNORECASE)
+
+# filename -> {"category": ..., "terms": {term: definition}}   (what is persisted)
+_documents = {}
+# term -> [filename, ...] of documents defining it
+_lookup = {}
+_index_lock = threading.RLock()
+
+
+def _trim_definition(definition, acronym):
+    """
+    "Employees may avail Leave Travel Concession (LTC)" -> "Leave Travel Concession":
+    keeps the trailing words whose initials spell the acronym, else the last few words.
+    """
+    words = definition.split()
+    initials = acronym.lower()
+    for start in range(len(words) - 1, -1, -1):
+        tail = words[start:]
+        capitalised = "".join(word[0].lower() for word in tail if word[0].isupper())
+        # "Head of Department (HOD)" spells the acronym only with its small words.
+        if initials in (capitalised, "".join(word[0].lower() for word in tail)):
+            return " ".join(tail)
+        if len(capitalised) > len(initials):
+            break
+    return " ".join(words[-MAX_DEFINITION_WORDS:])
+
+
+def build_glossary_entries(full_text):
+    """Finds the acronyms a document defines. Returns {acronym (lowercase): definition}."""
+    glossary = {}
+    for match in PARENTHESISED_ACRONYM.finditer(full_text):
+        definition, acronym = match.group(1).strip(" ,-/&"), match.group(2)
+        definition = _trim_definition(definition, acronym)
+        if definition:
+            glossary[acronym.lower()] = definition
+    for pattern in (ACRONYM_WITH_SEPARATOR, ACRONYM_MEANS):
+        for match in pattern.finditer(full_text):
+            acronym, definition = match.group(1), match.group(2).strip()
+            if definition:
+                glossary[acronym.lower()] = definition
+    return glossary
+
+
+def _add_to_lookup(filename, doc):
+    for term in doc["terms"]:
+        filenames = _lookup.setdefault(term, [])
+        filenames.append(filename)
+        filenames.sort()
+
+
+def _remove_from_lookup(filename, doc):
+    for term in doc["terms"]:
+        filenames = _lookup.get(term, [])
+        if filename in filenames:
+            filenames.remove(filename)
+        if not filenames:
+            _lookup.pop(term, None)
+
+
+def index_document(filename, category, full_text):
+    """Adds or replaces one document's glossary terms. Called at ingest time."""
+    doc = {"category": category, "terms": build_glossary_entries(full_text or "")}
+    with _index_lock:
+        old_doc = _documents.get(filename)
+        if old_doc is not None:
+            _remove_from_lookup(filename, old_doc)
+        _documents[filename] = doc
+        _add_to_lookup(filename, doc)
+
+
+def remove_document(filename):
+    with _index_lock:
+        doc = _documents.pop(filename, None)
+        if doc is not None:
+            _remove_from_lookup(filename, doc)
+
+
+def is_indexed(filename, category=None):
+    doc = _documents.get(filename)
+    return doc is not None and (category is None or doc["category"] == category)
+
+
+def indexed_documents():
+    with _index_lock:
+        return list(_documents)
+
+
+def lookup_term(term, category=None):
+    """
+    Definition of a term, preferring documents of the given category. When several
+    documents define it, the last filename in sorted order wins. A dictionary hit,
+    no file I/O.
+    """
+    term = (term or "").lower().strip()
+    with _index_lock:
+        filenames = _lookup.get(term)
+        if not filenames:
+            return None
+        if category:
+            filenames = [f for f in filenames if _documents[f]["category"] == category] or filenames
+        return _documents[filenames[-1]]["terms"][term]
+
+
+def merged_glossary():
+    """The whole glossary as one {term: definition} dict (same precedence as lookup_term)."""
+    with _index_lock:
+        return {term: _documents[filenames[-1]]["terms"][term] for term, filenames in _lookup.items()}
+
+
+def save_glossary_index(path=GLOSSARY_INDEX_PATH):
+    with _index_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": GLOSSARY_INDEX_VERSION, "documents": _documents}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def load_glossary_index(path=GLOSSARY_INDEX_PATH):
+    """Loads the persisted index into memory. Returns the number of documents loaded."""
+    data = {}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != GLOSSARY_INDEX_VERSION:
+                print(f"[GLOSSARY INDEX] Ignoring index with old version {data.get('version')}.")
+                data = {}
+        except Exception as e:
+            print(f"[GLOSSARY INDEX] Error loading index: {e}")
+            data = {}
+    with _index_lock:
+        _documents.clear()
+        _lookup.clear()
+        for filename, doc in data.get("documents", {}).items():
+            _documents[filename] = doc
+            _add_to_lookup(filename, doc)
+        return len(_documents)
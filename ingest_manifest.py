@@ -0,0 +1,68 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+# --- CONFIGURATION ---
+MANIFEST_PATH = "data/ingest_manifest.json"
+
+_manifest_lock = threading.Lock()
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Returns {filename: entry} for every document the index was last built from."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[MANIFEST] Error loading manifest, treating every document as new: {e}")
+        return {}
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Writes the manifest atomically so a crash mid-ingest never leaves it half written."""
+    with _manifest_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def make_entry(doc, file_hash, ocr_version, embedding_model):
+    stat = os.stat(doc['path'])
+    return {
+        "path": doc['path'],
+        "category": doc['category'],
+        "file_hash": file_hash,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "ocr_version": ocr_version,
+        "embedding_model": embedding_model,
+        "ingested_at": datetime.now().isoformat(),
+    }
+
+
+def is_up_to_date(entry, doc, file_hash, ocr_version, embedding_model):
+    return bool(entry) and (
+        entry.get("file_hash") == file_hash
+        and entry.get("category") == doc['category']
+        and entry.get("ocr_version") == ocr_version
+        and entry.get("embedding_model") == embedding_model
+    )
+
+
+def category_fingerprints(manifest):
+    """
+    {category: hash of its documents' entries}. It changes whenever a document of the
+    category is added, re-ingested or removed, so answers cached under it go stale.
+    """
+    entries = {}
+    for filename, entry in manifest.items():
+        entries.setdefault(entry.get("category") or "", []).append(
+            [filename, entry.get("file_hash"), entry.get("ocr_version"), entry.get("embedding_model")])
+    return {category: hashlib.sha256(json.dumps(sorted(docs)).encode('utf-8')).hexdigest()[:16]
+            for category, docs in entries.items()}
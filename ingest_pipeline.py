@@ -0,0 +1,229 @@
+import os
+import re
+import time
+import queue
+import threading
+
+import metrics
+from shared_utils import extract_text_from_file, get_vector_store
+from data_processing import batch_process_document
+from rebuild_embeddings_and_paragraphs import split_document_chunks, get_document_chunk_ids, delete_document_embeddings
+
+# --- CONFIGURATION ---
+# Each OCR worker feeds one document at a time into data_processing's shared
+# process pool; a few documents at once keeps the pool (one process per core) full.
+OCR_WORKERS = max(2, (os.cpu_count() or 4) // 4)
+EMBED_BATCH_SIZE = 64
+QUEUE_SIZE = 8
+REPORT_INTERVAL_SECONDS = 30
+
+_STOP = object()
+_PAGE_MARKER = re.compile(r"^--- Page \d+ ---$", re.MULTILINE)
+
+
+class IngestPipeline:
+    """
+    OCR -> chunk -> embed, with the stages running concurrently and connected by
+    bounded queues. A slow embedding stage blocks the chunker, which blocks the
+    OCR workers, so memory stays bounded however many documents are queued.
+
+    on_document_done(doc, full_text, chunk_ids, chunk_texts) is called (from the
+    embedding thread) once all of a document's chunks are stored and its stale
+    chunks are deleted.
+    """
+
+    def __init__(self, ocr_workers=OCR_WORKERS, embed_batch_size=EMBED_BATCH_SIZE,
+                 queue_size=QUEUE_SIZE, on_document_done=None):
+        self.ocr_workers = ocr_workers
+        self.embed_batch_size = embed_batch_size
+        self.on_document_done = on_document_done
+        self.doc_queue = queue.Queue()
+        self.chunk_queue = queue.Queue(maxsize=queue_size)
+        self.embed_queue = queue.Queue(maxsize=queue_size * embed_batch_size)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "documents": 0, "documents_failed": 0, "pages": 0, "text_layer_pages": 0, "ocr_pages": 0,
+            "chunks": 0, "embed_batches": 0,
+            "ocr_seconds": 0.0, "chunk_seconds": 0.0, "embed_seconds": 0.0,
+        }
+
+    def _add_stat(self, name, value):
+        with self._lock:
+            self.stats[name] += value
+
+    def _fail(self, filename, reason, entry=None):
+        """
+        Counts a failed document. With its pending entry, chunks of the new version that
+        were already stored are deleted, so only the previous version stays searchable.
+        """
+        print(f"[PIPELINE] {filename}: {reason}")
+        if entry is not None:
+            new_ids = sorted(set(entry["ids"]) - set(entry["old_ids"]))
+            if not delete_document_embeddings(filename, ids=new_ids):
+                print(f"[PIPELINE] {filename}: {len(new_ids)} chunks of the new version could not be removed.")
+        self._add_stat("documents_failed", 1)
+        metrics.inc("chatbot_documents_processed_total", result="failed")
+
+    # --- STAGE 1: OCR ---
+    def _ocr_worker(self):
+        while True:
+            doc = self.doc_queue.get()
+            if doc is _STOP:
+                return
+            start = time.perf_counter()
+            page_stats = {}
+            success = batch_process_document(doc['path'], doc['filename'], stats=page_stats)
+            full_text = extract_text_from_file(doc['path']) if success else ""
+            self._add_stat("ocr_seconds", time.perf_counter() - start)
+            if not full_text:
+                self._fail(doc['filename'], "OCR failed or produced no text. Skipping embedding generation.")
+                continue
+            if page_stats:
+                for name in ("pages", "text_layer_pages", "ocr_pages"):
+                    self._add_stat(name, page_stats.get(name, 0))
+            else:
+                # Text came from an existing cache file; count its page markers.
+                self._add_stat("pages", max(1, len(_PAGE_MARKER.findall(full_text))))
+            self.chunk_queue.put((doc, full_text))
+
+    # --- STAGE 2: CHUNKING ---
+    def _chunker(self):
+        while True:
+            item = self.chunk_queue.get()
+            if item is _STOP:
+                self.embed_queue.put(_STOP)
+                return
+            doc, full_text = item
+            filename = doc['filename']
+            start = time.perf_counter()
+            try:
+                old_ids = get_document_chunk_ids(filename)
+            except Exception as e:
+                self._fail(filename, f"Could not list existing chunks: {e}")
+                continue
+            ids, texts = split_document_chunks(filename, full_text)
+            self._add_stat("chunk_seconds", time.perf_counter() - start)
+            if not ids:
+                self._fail(filename, "Text splitting resulted in no chunks.")
+                continue
+            with self._lock:
+                self._pending[filename] = {
+                    "doc": doc, "text": full_text, "ids": ids, "texts": texts, "old_ids": old_ids,
+                    "remaining": len(ids), "failed": False,
+                }
+            for chunk_id, text in zip(ids, texts):
+                self.embed_queue.put((filename, chunk_id, text))
+
+    # --- STAGE 3: EMBEDDING ---
+    def _embed_batch(self, batch):
+        start = time.perf_counter()
+        failed = False
+        try:
+            # One embedding call for the whole batch, across documents.
+            get_vector_store().add_texts(
+                texts=[text for _, _, text in batch],
+                metadatas=[{"source": filename} for filename, _, _ in batch],
+                ids=[chunk_id for _, chunk_id, _ in batch]
+            )
+            self._add_stat("chunks", len(batch))
+            metrics.inc("chatbot_chunks_embedded_total", len(batch))
+        except Exception as e:
+            print(f"[PIPELINE] Embedding batch of {len(batch)} chunks failed: {e}")
+            failed = True
+        self._add_stat("embed_seconds", time.perf_counter() - start)
+        metrics.observe("chatbot_stage_seconds", time.perf_counter() - start, stage="embed_batch")
+        self._add_stat("embed_batches", 1)
+
+        finished = []
+        with self._lock:
+            for filename, _, _ in batch:
+                entry = self._pending[filename]
+                entry["failed"] = entry["failed"] or failed
+                entry["remaining"] -= 1
+                if entry["remaining"] == 0:
+                    finished.append(self._pending.pop(filename))
+        for entry in finished:
+            self._finish_document(entry)
+
+    def _finish_document(self, entry):
+        filename = entry["doc"]['filename']
+        if entry["failed"]:
+            self._fail(filename, "Some chunks could not be embedded; keeping the previous version.", entry)
+            return
+        stale_ids = sorted(set(entry["old_ids"]) - set(entry["ids"]))
+        if not delete_document_embeddings(filename, ids=stale_ids):
+            self._fail(filename, "Could not remove stale chunks.")
+            return
+        if self.on_document_done:
+            try:
+                self.on_document_done(entry["doc"], entry["text"], entry["ids"], entry["texts"])
+            except Exception as e:
+                # The embedding thread must keep draining, or the chunker blocks on a full queue.
+                # The next run retries the document unless its manifest entry was saved.
+                self._fail(filename, f"Post-ingest step failed: {e}")
+                return
+        self._add_stat("documents", 1)
+        metrics.inc("chatbot_documents_processed_total", result="ok")
+
+    def _embedder(self):
+        batch = []
+        while True:
+            try:
+                item = self.embed_queue.get(timeout=0.5)
+            except queue.Empty:
+                # Nothing arriving: flush a partial batch so a document's tail is not held back.
+                if batch:
+                    self._embed_batch(batch)
+                    batch = []
+                continue
+            if item is _STOP:
+                if batch:
+                    self._embed_batch(batch)
+                return
+            batch.append(item)
+            if len(batch) >= self.embed_batch_size:
+                self._embed_batch(batch)
+                batch = []
+
+    # --- DRIVER ---
+    def report(self, elapsed):
+        with self._lock:
+            stats = dict(self.stats)
+        elapsed = max(elapsed, 1e-9)
+        print(f"[PIPELINE] {stats['documents']} docs done, {stats['documents_failed']} failed | "
+              f"{stats['pages']} pages ({stats['pages'] / elapsed:.2f} pages/sec, "
+              f"{stats['ocr_pages']} OCR'd, {stats['text_layer_pages']} from text layer) | "
+              f"{stats['chunks']} chunks ({stats['chunks'] / elapsed:.2f} chunks/sec) | "
+              f"{elapsed:.1f}s elapsed")
+        return stats
+
+    def run(self, docs):
+        """Processes every document and returns the throughput stats."""
+        start = time.perf_counter()
+        ocr_threads = [threading.Thread(target=self._ocr_worker, name=f"ocr-{i}", daemon=True)
+                       for i in range(self.ocr_workers)]
+        chunk_thread = threading.Thread(target=self._chunker, name="chunker", daemon=True)
+        embed_thread = threading.Thread(target=self._embedder, name="embedder", daemon=True)
+        for thread in ocr_threads + [chunk_thread, embed_thread]:
+            thread.start()
+
+        for doc in docs:
+            self.doc_queue.put(doc)
+        for _ in ocr_threads:
+            self.doc_queue.put(_STOP)
+
+        last_report = time.perf_counter()
+        for thread in ocr_threads:
+            while thread.is_alive():
+                thread.join(timeout=1.0)
+                if time.perf_counter() - last_report >= REPORT_INTERVAL_SECONDS:
+                    self.report(time.perf_counter() - start)
+                    last_report = time.perf_counter()
+        self.chunk_queue.put(_STOP)
+        chunk_thread.join()
+        embed_thread.join()
+
+        stats = self.report(time.perf_counter() - start)
+        stats["elapsed_seconds"] = time.perf_counter() - start
+        return stats
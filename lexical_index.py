@@ -0,0 +1,142 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter
+
+# --- CONFIGURATION ---
+LEXICAL_INDEX_PATH = "data/lexical_index.json"
+LEXICAL_INDEX_VERSION = 1
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Latin words/numbers plus the Devanagari block, so Hindi words are not split at vowel signs.
+TOKEN_PATTERN = re.compile(r"[\w\u0900-\u097F]+")
+# Words so common that their postings cover most chunks: they add little to the score
+# but dominate the cost of a search, so they are not indexed.
+STOPWORDS = frozenset("""a an and are as at be by for from has have in is it of on or that the this
+to was were will with what which who how when where do does i me my you your please tell about""".split())
+
+# source -> {"category": ..., "chunks": {chunk_id: text}}   (what is persisted)
+_documents = {}
+# chunk_id -> (source, text, token count)
+_chunks = {}
+# term -> {chunk_id: term frequency}
+_postings = {}
+_total_tokens = 0
+_index_lock = threading.RLock()
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _add_chunk(source, chunk_id, text):
+    global _total_tokens
+    counts = Counter(tokenize(text))
+    length = sum(counts.values())
+    _chunks[chunk_id] = (source, text, length)
+    _total_tokens += length
+    for term, tf in counts.items():
+        _postings.setdefault(term, {})[chunk_id] = tf
+
+
+def _remove_chunk(chunk_id):
+    global _total_tokens
+    source, text, length = _chunks.pop(chunk_id)
+    _total_tokens -= length
+    for term in set(tokenize(text)):
+        postings = _postings.get(term)
+        if postings is not None:
+            postings.pop(chunk_id, None)
+            if not postings:
+                del _postings[term]
+
+
+def index_document(source, category, chunk_ids, chunk_texts):
+    """Adds or replaces one document's chunks. Uses the same chunk ids as the vector store."""
+    with _index_lock:
+        remove_document(source)
+        _documents[source] = {"category": category, "chunks": dict(zip(chunk_ids, chunk_texts))}
+        for chunk_id, text in zip(chunk_ids, chunk_texts):
+            _add_chunk(source, chunk_id, text)
+
+
+def remove_document(source):
+    with _index_lock:
+        doc = _documents.pop(source, None)
+        if doc is not None:
+            for chunk_id in doc["chunks"]:
+                if chunk_id in _chunks:
+                    _remove_chunk(chunk_id)
+
+
+def is_indexed(source):
+    return source in _documents
+
+
+def indexed_documents():
+    return list(_documents)
+
+
+def search(query, top_k=10, sources=None):
+    """
+    BM25 search over the indexed chunks. Returns [(chunk_id, source, text, score)],
+    best first, optionally restricted to a set of source filenames.
+    """
+    terms = set(tokenize(query))
+    with _index_lock:
+        n_chunks = len(_chunks)
+        if not n_chunks or not terms:
+            return []
+        avg_length = _total_tokens / n_chunks
+        scores = {}
+        for term in terms:
+            postings = _postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_chunks - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                source, _, length = _chunks[chunk_id]
+                if sources is not None and source not in sources:
+                    continue
+                norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * norm
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(chunk_id, _chunks[chunk_id][0], _chunks[chunk_id][1], score) for chunk_id, score in best]
+
+
+def save_lexical_index(path=LEXICAL_INDEX_PATH):
+    with _index_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": LEXICAL_INDEX_VERSION, "documents": _documents}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def load_lexical_index(path=LEXICAL_INDEX_PATH):
+    """Loads the persisted chunks and rebuilds the postings in memory. Returns the document count."""
+    global _total_tokens
+    data = {}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != LEXICAL_INDEX_VERSION:
+                print(f"[LEXICAL INDEX] Ignoring index with old version {data.get('version')}.")
+                data = {}
+        except Exception as e:
+            print(f"[LEXICAL INDEX] Error loading index: {e}")
+            data = {}
+    with _index_lock:
+        _documents.clear()
+        _chunks.clear()
+        _postings.clear()
+        _total_tokens = 0
+        for source, doc in data.get("documents", {}).items():
+            _documents[source] = doc
+            for chunk_id, text in doc["chunks"].items():
+                _add_chunk(source, chunk_id, text)
+        return len(_documents)
@@ -0,0 +1,318 @@
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+
+import ollama
+
+import metrics
+
+# --- CONFIGURATION ---
+# Generations sent to Ollama at once. Match OLLAMA_NUM_PARALLEL: anything above it
+# only queues inside Ollama, where it cannot be cancelled or reordered.
+LLM_MAX_IN_FLIGHT = 2
+# A request still queued after this long gives up instead of waiting indefinitely.
+LLM_QUEUE_TIMEOUT_SECONDS = 120
+# A running generation is stopped after this long.
+LLM_GENERATION_TIMEOUT_SECONDS = 300
+# A generation that streams nothing for this long is stopped as stalled (the Ollama
+# client's read timeout). It also bounds how long a cancelled or timed-out generation
+# can hold its slot while Ollama sends nothing.
+LLM_STREAM_STALL_SECONDS = 60
+# How often waiting callers are told their queue position.
+QUEUE_POLL_SECONDS = 0.5
+
+
+class SchedulerTimeout(Exception):
+    """The request was still queued after LLM_QUEUE_TIMEOUT_SECONDS: nothing was generated."""
+    pass
+
+
+class GenerationTimeout(Exception):
+    """A running generation was stopped after LLM_GENERATION_TIMEOUT_SECONDS."""
+
+    def __init__(self, message, partial_text=""):
+        super().__init__(message)
+        # What collect() had gathered before the generation was stopped.
+        self.partial_text = partial_text
+
+
+class SchedulerCancelled(Exception):
+    pass
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_ollama_client():
+    """Shared Ollama client whose reads time out after LLM_STREAM_STALL_SECONDS."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ollama.Client(timeout=LLM_STREAM_STALL_SECONDS)
+    return _client
+
+
+def part_text(method, part):
+    """The text carried by one streamed generate/chat part."""
+    if method == "chat":
+        return part["message"]["content"] or ""
+    return part["response"] or ""
+
+
+class _Job:
+    def __init__(self, key, user_key, method, kwargs):
+        self.key = key
+        self.user_key = user_key
+        self.method = method
+        self.kwargs = kwargs
+        self.parts = []
+        self.subscribers = 0
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self.cond = threading.Condition()
+
+
+class Ticket:
+    """One caller's handle on a (possibly shared) generation."""
+
+    def __init__(self, scheduler, job):
+        self._scheduler = scheduler
+        self._job = job
+        self._released = False
+
+    def events(self):
+        """
+        Yields ("queued", position) while the generation waits for a slot (1 = next),
+        then ("part", part) for every part Ollama streams back. A coalesced caller
+        first receives the parts produced before it joined. Raises SchedulerTimeout
+        if the request waits longer than LLM_QUEUE_TIMEOUT_SECONDS, and
+        GenerationTimeout after the parts generated before the time limit. Closing the
+        generator (e.g. the client disconnected) releases the ticket. The time limit
+        is checked here as well, so a stream that stalls cannot hold the caller past it.
+        """
+        job = self._job
+        index = 0
+        last_position = None
+        try:
+            while True:
+                with job.cond:
+                    if index >= len(job.parts) and not job.done:
+                        job.cond.wait(QUEUE_POLL_SECONDS)
+                    new_parts = job.parts[index:]
+                    index += len(new_parts)
+                    finished = job.done and index >= len(job.parts)
+                    started = job.started_at is not None
+                for part in new_parts:
+                    yield "part", part
+                if finished:
+                    if job.error is not None:
+                        raise job.error
+                    if job.cancelled:
+                        raise SchedulerCancelled("Generation was cancelled.")
+                    return
+                if started and time.time() - job.started_at > LLM_GENERATION_TIMEOUT_SECONDS:
+                    raise GenerationTimeout(f"Generation exceeded {LLM_GENERATION_TIMEOUT_SECONDS}s.")
+                if not started:
+                    if time.time() - job.submitted_at > LLM_QUEUE_TIMEOUT_SECONDS:
+                        raise SchedulerTimeout(f"Still queued after {LLM_QUEUE_TIMEOUT_SECONDS}s.")
+                    position = self._scheduler.queue_position(job)
+                    if position is not None and position != last_position:
+                        last_position = position
+                        yield "queued", position
+        finally:
+            self.cancel()
+
+    def collect(self):
+        """
+        Waits for the whole generation. Returns (text, final_part). A GenerationTimeout
+        carries the text generated so far as partial_text.
+        """
+        pieces = []
+        final = None
+        try:
+            for kind, part in self.events():
+                if kind == "part":
+                    pieces.append(part_text(self._job.method, part))
+                    final = part
+        except GenerationTimeout as e:
+            raise GenerationTimeout(str(e), partial_text="".join(pieces)) from e
+        return "".join(pieces), final
+
+    def cancel(self):
+        """Detaches this caller; the generation stops once no caller is left."""
+        if not self._released:
+            self._released = True
+            self._scheduler._release(self._job)
+
+
+class GenerationScheduler:
+    """
+    Sits in front of Ollama: at most max_in_flight generations run at once, queued
+    requests are served round-robin across users so one user's burst cannot starve
+    the others, and identical requests (same method, model, prompt and options)
+    that are queued or running share a single generation.
+    """
+
+    def __init__(self, max_in_flight=LLM_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Condition()
+        self._queues = {}         # user_key -> deque of queued jobs
+        self._rotation = deque()  # user keys with queued jobs, in serving order
+        self._by_key = {}         # request key -> queued or running job
+        self._running = 0
+        self._workers = []
+
+    def _start_workers(self):
+        while len(self._workers) < self.max_in_flight:
+            worker = threading.Thread(target=self._worker, name=f"llm-worker-{len(self._workers)}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    @staticmethod
+    def request_key(method, kwargs):
+        raw = json.dumps([method, kwargs], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def submit(self, user_key, method="generate", **kwargs):
+        """Queues an ollama.<method>(stream=True, **kwargs) call and returns a Ticket."""
+        key = self.request_key(method, kwargs)
+        with self._lock:
+            self._start_workers()
+            job = self._by_key.get(key)
+            if job is not None and not job.cancelled:
+                metrics.inc("chatbot_llm_coalesced_total")
+            else:
+                job = _Job(key, user_key, method, kwargs)
+                self._by_key[key] = job
+                if user_key not in self._queues:
+                    self._queues[user_key] = deque()
+                    self._rotation.append(user_key)
+                self._queues[user_key].append(job)
+                self._lock.notify()
+            job.subscribers += 1
+        return Ticket(self, job)
+
+    def queue_position(self, job):
+        """1-based place of a queued job in the serving order, or None once it has started."""
+        with self._lock:
+            queue = self._queues.get(job.user_key)
+            if queue is None or job not in queue:
+                return None
+            own_index = queue.index(job)
+            rotation = list(self._rotation)
+            user_index = rotation.index(job.user_key)
+            ahead = own_index
+            # Round-robin: users served before this one in a round get one extra turn.
+            for i, user_key in enumerate(rotation):
+                if user_key != job.user_key:
+                    ahead += min(len(self._queues[user_key]), own_index + (1 if i < user_index else 0))
+            return ahead + 1
+
+    def stats(self):
+        with self._lock:
+            return {"running": self._running, "queued": sum(len(q) for q in self._queues.values()),
+                    "users_waiting": len(self._queues), "max_in_flight": self.max_in_flight}
+
+    # --- INTERNALS ---
+    def _remove_queued(self, job):
+        queue = self._queues.get(job.user_key)
+        if queue is None or job not in queue:
+            return False
+        queue.remove(job)
+        if not queue:
+            del self._queues[job.user_key]
+            self._rotation.remove(job.user_key)
+        return True
+
+    def _release(self, job):
+        with self._lock:
+            job.subscribers -= 1
+            if job.subscribers > 0 or job.done:
+                return
+            job.cancelled = True
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+            removed = self._remove_queued(job)
+        metrics.inc("chatbot_llm_cancelled_total", state="queued" if removed else "running")
+        if removed:
+            with job.cond:
+                job.done = True
+                job.cond.notify_all()
+
+    def _next_job(self):
+        with self._lock:
+            while not self._rotation:
+                self._lock.wait()
+            user_key = self._rotation.popleft()
+            queue = self._queues[user_key]
+            job = queue.popleft()
+            if queue:
+                self._rotation.append(user_key)
+            else:
+                del self._queues[user_key]
+            self._running += 1
+            return job
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    if self._by_key.get(job.key) is job:
+                        del self._by_key[job.key]
+                with job.cond:
+                    job.done = True
+                    job.cond.notify_all()
+
+    def _run(self, job):
+        job.started_at = time.time()
+        metrics.observe("chatbot_stage_seconds", job.started_at - job.submitted_at, stage="llm_queue_wait")
+        stream = None
+        last_part_at = job.started_at
+        try:
+            stream = getattr(get_ollama_client(), job.method)(stream=True, **job.kwargs)
+            for part in stream:
+                last_part_at = time.time()
+                if job.cancelled:
+                    break
+                if time.time() - job.started_at > LLM_GENERATION_TIMEOUT_SECONDS:
+                    job.error = GenerationTimeout(f"Generation exceeded {LLM_GENERATION_TIMEOUT_SECONDS}s.")
+                    break
+                if part["done"]:
+                    # Recorded once per generation, however many callers share it.
+                    metrics.record_llm_response(part, job.kwargs.get("model"))
+                    if part.get("prompt_eval_count") is not None:
+                        print(f"[PERF] Prompt eval: {part['prompt_eval_count']} tokens evaluated in "
+                              f"{(part.get('prompt_eval_duration') or 0) / 1e9:.2f}s")
+                with job.cond:
+                    job.parts.append(part)
+                    job.cond.notify_all()
+        except Exception as e:
+            if time.time() - last_part_at >= LLM_STREAM_STALL_SECONDS:
+                # The read timed out: keep what was generated and end it like the time limit.
+                print(f"[LLM SCHEDULER] Generation stalled for {LLM_STREAM_STALL_SECONDS}s: {e}")
+                job.error = GenerationTimeout(f"Ollama sent nothing for {LLM_STREAM_STALL_SECONDS}s.")
+            else:
+                print(f"[LLM SCHEDULER] Generation failed: {e}")
+                job.error = e
+        finally:
+            # Closing the stream drops the HTTP connection, which stops Ollama generating.
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+
+
+scheduler = GenerationScheduler()
+metrics.register_gauge("chatbot_llm_running", "Generations currently running in Ollama.",
+                       lambda: scheduler.stats()["running"])
+metrics.register_gauge("chatbot_llm_queued", "Generations waiting for a slot.",
+                       lambda: scheduler.stats()["queued"])
@@ -0,0 +1,202 @@
+import time
+import random
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+# --- CONFIGURATION ---
+# Upper bounds (seconds) of the histogram buckets; covers cache hits up to long generations.
+HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Share of requests whose full debug output (e.g. the retrieved context) is printed.
+DEBUG_SAMPLE_RATE = 0.01
+
+METRIC_HELP = {
+    "chatbot_stage_seconds": ("histogram", "Time spent in each pipeline stage."),
+    "chatbot_llm_prompt_eval_seconds": ("histogram", "Ollama prompt_eval_duration per generation."),
+    "chatbot_llm_eval_seconds": ("histogram", "Ollama eval_duration per generation."),
+    "chatbot_llm_load_seconds": ("histogram", "Ollama load_duration per generation (model load on a cold start)."),
+    "chatbot_query_seconds": ("histogram", "End-to-end answer time by query type and what answered it."),
+    "chatbot_queries_total": ("counter", "Chat queries by query type and what answered them (glossary, answer_cache, llm...)."),
+    "chatbot_llm_tokens_total": ("counter", "Tokens processed by the generation model."),
+    "chatbot_llm_requests_total": ("counter", "Generation requests sent to Ollama."),
+    "chatbot_cache_lookups_total": ("counter", "Cache lookups by cache and result."),
+    "chatbot_documents_processed_total": ("counter", "Documents processed at ingest, by result."),
+    "chatbot_pages_processed_total": ("counter", "PDF pages processed at ingest, by source."),
+    "chatbot_chunks_embedded_total": ("counter", "Chunks embedded at ingest."),
+    "chatbot_llm_coalesced_total": ("counter", "Requests that joined an identical queued or running generation."),
+    "chatbot_db_writes_total": ("counter", "Log rows written to SQLite, by mode (queued for the background writer or direct)."),
+    "chatbot_voice_rejected_total": ("counter", "Voice requests refused because the voice workers were saturated or too slow."),
+    "chatbot_llm_cancelled_total": ("counter", "Generations abandoned by every caller, by state."),
+}
+
+_lock = threading.Lock()
+# (name, labels) -> [bucket counts..., sum, count]
+_histograms = {}
+# (name, labels) -> value
+_counters = {}
+# name -> (help, callback returning the current value)
+_gauges = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    """Adds one observation to a histogram."""
+    key = _key(name, labels)
+    with _lock:
+        data = _histograms.get(key)
+        if data is None:
+            data = _histograms[key] = [0] * len(HISTOGRAM_BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if value <= bound:
+                data[i] += 1
+                break
+        data[-2] += value
+        data[-1] += 1
+
+
+def inc(name, value=1, **labels):
+    """Increments a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def stage_timer(stage):
+    """Times the enclosed block as one observation of chatbot_stage_seconds{stage=...}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("chatbot_stage_seconds", time.perf_counter() - start, stage=stage)
+
+
+def timed(stage):
+    """Decorator form of stage_timer for plain (non-generator) functions."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_gauge(name, help_text, callback):
+    """Adds a gauge whose value is read from callback() at every scrape."""
+    _gauges[name] = (help_text, callback)
+
+
+def record_cache_lookup(cache, result):
+    inc("chatbot_cache_lookups_total", cache=cache, result=result)
+
+
+def record_llm_response(response, model=None):
+    """
+    Records token counts and Ollama's own timings from a final (done) generate/chat
+    response. prompt_eval_count only counts the prompt tokens Ollama had to evaluate,
+    so prompt-cache reuse shows up as lower prompt token counts and eval times.
+    """
+    def field(name):
+        try:
+            return response[name]
+        except (KeyError, TypeError):
+            return getattr(response, name, None)
+
+    labels = {"model": model or field("model") or "unknown"}
+    inc("chatbot_llm_requests_total", **labels)
+    if field("prompt_eval_count"):
+        inc("chatbot_llm_tokens_total", field("prompt_eval_count"), kind="prompt", **labels)
+    if field("eval_count"):
+        inc("chatbot_llm_tokens_total", field("eval_count"), kind="completion", **labels)
+    if field("prompt_eval_duration"):
+        observe("chatbot_llm_prompt_eval_seconds", field("prompt_eval_duration") / 1e9, **labels)
+    if field("eval_duration"):
+        observe("chatbot_llm_eval_seconds", field("eval_duration") / 1e9, **labels)
+    if field("load_duration"):
+        observe("chatbot_llm_load_seconds", field("load_duration") / 1e9, **labels)
+
+
+def sample_debug():
+    """True for the share of requests (DEBUG_SAMPLE_RATE) that should print full debug output."""
+    return DEBUG_SAMPLE_RATE >= 1 or random.random() < DEBUG_SAMPLE_RATE
+
+
+# --- EXPORT ---
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def snapshot():
+    """Returns plain copies of every histogram and counter, e.g. for JSON reports."""
+    with _lock:
+        return ({key: list(data) for key, data in _histograms.items()}, dict(_counters))
+
+
+def cache_hit_ratios(counters):
+    """{cache: hits / lookups}, counting near-duplicate hits as hits."""
+    totals, hits = {}, {}
+    for (name, labels), value in counters.items():
+        if name != "chatbot_cache_lookups_total":
+            continue
+        labels = dict(labels)
+        cache = labels.get("cache")
+        totals[cache] = totals.get(cache, 0) + value
+        if labels.get("result") != "miss":
+            hits[cache] = hits.get(cache, 0) + value
+    return {cache: hits.get(cache, 0) / total for cache, total in totals.items() if total}
+
+
+def render_prometheus():
+    """Renders every metric in the Prometheus text exposition format."""
+    histograms, counters = snapshot()
+    lines = []
+    by_name = {}
+    for (name, labels), data in histograms.items():
+        by_name.setdefault(name, []).append((labels, data))
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    for name in sorted(by_name):
+        kind, help_text = METRIC_HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, data in sorted(by_name[name], key=lambda item: item[0]):
+            if kind != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {data}")
+                continue
+            cumulative = 0
+            for bound, count in zip(HISTOGRAM_BUCKETS + (float("inf"),), data[:-2] + [data[-1] - sum(data[:-2])]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_bound(bound))])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {data[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {data[-1]}")
+
+    ratios = cache_hit_ratios(counters)
+    if ratios:
+        lines.append("# HELP chatbot_cache_hit_ratio Share of cache lookups that were hits.")
+        lines.append("# TYPE chatbot_cache_hit_ratio gauge")
+        for cache, ratio in sorted(ratios.items()):
+            lines.append(f'chatbot_cache_hit_ratio{{cache="{cache}"}} {ratio:.6f}')
+
+    for name, (help_text, callback) in sorted(_gauges.items()):
+        try:
+            value = callback()
+        except Exception as e:
+            print(f"[METRICS] Gauge {name} failed: {e}")
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
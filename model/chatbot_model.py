@@ -1,55 +1,76 @@
 import os
 import re
-import ollama
-import threading
 import time
+import metrics
+import conversation_memory
+import query_classifier
+import glossary_index
+import faq_matcher
+from rapidfuzz import fuzz
+from context_packer import estimate_tokens, context_token_budget, pack_context, MAX_CONTEXT_TOKENS
+from llm_scheduler import scheduler, SchedulerTimeout, GenerationTimeout, part_text
 from shared_utils import *  # Make sure this imports your updated shared_utils.py
+from answer_cache import get_cached_answer, store_answer
 
 # --- GLOBAL CONFIGURATION ---
 GENERATION_MODEL = "qwen2:7b-instruct"
+# How long Ollama keeps the model loaded after the last request.
+GENERATION_KEEP_ALIVE = "30m"
 
-# --- CONVERSATION HISTORY (Unchanged) ---
-_conversation_lock = threading.Lock()
-_conversation_history = {}
-
-
-def get_conversation_context(session_id, max_history=3):
-    with _conversation_lock:
-        history = _conversation_history.get(session_id, [])
-        recent_history = history[-max_history:]
-        context_parts = []
-        for entry in recent_history:
-            context_parts.append(f"Previous Q: {entry['query']}")
-            context_parts.append(f"Previous A: {entry['response'][:200]}...")
-        return "\n".join(context_parts)
+# --- CONVERSATION HISTORY ---
+# Recent turns live in conversation_memory (Redis, SQLite or in-process, with TTL
+# and size caps), already cut to their summary length, so building the history
+# is one fetch per request.
+def get_conversation_messages(session_id, max_history=3):
+    """The session's recent turns as chat messages (answers are stored truncated)."""
+    messages = []
+    for entry in conversation_memory.get_turns(session_id)[-max_history:]:
+        messages.append({"role": "user", "content": entry['query']})
+        messages.append({"role": "assistant", "content": f"{entry['response']}..."})
+    return messages
 
 
 def save_conversation(session_id, query, response, document):
-    with _conversation_lock:
-        if session_id not in _conversation_history:
-            _conversation_history[session_id] = []
-        _conversation_history[session_id].append({
-            'query': query,
-            'response': response,
-            'document': document,
-            'timestamp': time.time()
-        })
-        if len(_conversation_history[session_id]) > 10:
-            _conversation_history[session_id] = _conversation_history[session_id][-10:]
+    conversation_memory.append_turn(session_id, query, response, document)
 
 
 # --- FINAL, HYBRID RESPONSE GENERATION ---
+BUSY_RESPONSE = "The assistant is busy right now. Please try again in a moment."
+# Appended to the part of an answer generated before the generation time limit.
+TRUNCATED_NOTICE = "\n\n(The answer was cut short because it took too long to generate. Please ask a narrower question.)"
 
-def generate_llm_response(query, document_name=None, category=None, session_id=None):
-    start_time = time.time()
+# Shared by every query type. Only num_predict and stop change per type: a different
+# num_ctx would make Ollama reload the model.
+GENERATION_OPTIONS = {
+    "temperature": 0.2,
+    "num_predict": 4096,  # Increased prediction length for long policies
+    "num_ctx": 8192,  # Increased context window
+}
+# The model sometimes carries on by inventing the next turn; stop it there.
+STOP_SEQUENCES = ["\nQuestion:", "\nContext:"]
+# Chunks fetched per query; the packer keeps as many as the token budget allows.
+SEARCH_CANDIDATES = 6
+# The text chat answers from the FAQ sheet only on a near-exact match. Unlike the voice
+# assistant's token_set_ratio, token_sort_ratio penalises extra words, so a detailed
+# policy question mentioning an FAQ topic still goes to retrieval.
+FAQ_CHAT_MATCH_THRESHOLD = 90
+FAQ_CHAT_SCORER = fuzz.token_sort_ratio
+
+
+@metrics.timed("retrieve_context")
+def _retrieve_context(query, document_name=None, category=None, debug=False, history=(), profile=None):
+    """
+    Runs the hybrid clause/semantic retrieval. Returns (context, clause_ref).
+    The context is packed to the tokens the prompt has room for: the model's
+    num_ctx minus the rest of the prompt and the reserved output, capped by the
+    query type's max_context_tokens.
+    Step-by-step debug output is printed only when debug is True (a sampled request).
+    """
+    profile = profile or QUERY_PROFILES[query_classifier.CLAUSE]
     clean_query = preprocess_query(query)
-    context = None
-    conversation_context = ""
+    pieces = []
     clause_ref = None
 
-    if session_id:
-        conversation_context = get_conversation_context(session_id)
-
     # --- HYBRID RETRIEVAL STRATEGY ---
 
     # 1. Primary Strategy: Attempt PRECISE clause extraction.
@@ -57,95 +78,380 @@ def generate_llm_response(query, document_name=None, category=None, session_id=N
     clause_match = re.search(clause_pattern, clean_query)
     if clause_match:
         clause_ref = clause_match.group(1).strip()
-        print(f"[DEBUG] Clause pattern matched: {clause_ref}. Attempting precise extraction.")
+        if debug:
+            print(f"[DEBUG] Clause pattern matched: {clause_ref}. Attempting precise extraction.")
 
-        search_target_name = document_name or category
         results = extract_clause_section(document_name=document_name, clause_ref=clause_ref, category=category)
         if results:
-            context = "\n\n---\n\n".join([f"From document '{res['document']}':\n{res['text']}" for res in results])
-            print(f"[DEBUG] SUCCESS: Precisely extracted context for clause {clause_ref}.")
-
-    # 2. Fallback Strategy: If precise extraction failed or wasn't triggered, use SEMANTIC search.
-    if not context and (category or document_name):
-        print(
-            f"[DEBUG] Precise extraction failed or not applicable. Falling back to semantic search for query: '{clean_query}'")
-        search_target = category if category else document_name
-        best_chunks = semantic_search(clean_query, document_name, top_k=3, category=category)
-
-        if best_chunks:
-            context = "\n\n---\n\n".join(best_chunks)
-            print(f"[DEBUG] SUCCESS: Found context via semantic search.")
-
-    # 3. Handle "Not Found" case if both strategies fail.
-    if not context:
-        if clause_ref:
-            response_text = f"Information for clause '{clause_ref}' could not be found in the '{category}' documents. Please check the clause number or rephrase your query."
-        else:
-            response_text = f"Sorry, no relevant information was found for your query: '{query}' in the '{category}' documents. Please try rephrasing."
+            pieces = [f"From document '{res['document']}':\n{res['text']}" for res in results]
+            if debug:
+                print(f"[DEBUG] SUCCESS: Precisely extracted context for clause {clause_ref}.")
 
-        if session_id:
-            save_conversation(session_id, query, response_text, category)
-        return {"response": response_text, "context": "", "document": category}
+    # 2. Fallback Strategy: If precise extraction failed or wasn't triggered, search the chunks
+    #    (vector, BM25 or both fused, per RETRIEVAL_MODE).
+    if not pieces and (category or document_name):
+        if debug:
+            print(
+                f"[DEBUG] Precise extraction failed or not applicable. Falling back to {RETRIEVAL_MODE} search for query: '{clean_query}'")
+        pieces = search_chunks(clean_query, document_name, top_k=SEARCH_CANDIDATES, category=category)
+
+        if pieces and debug:
+            print(f"[DEBUG] SUCCESS: Found context via {RETRIEVAL_MODE} search.")
+
+    if not pieces:
+        return None, clause_ref
+
+    # Ranked pieces are de-duplicated and packed as whole clauses up to the budget.
+    template_tokens = _estimate_message_tokens(_build_messages(query, "", history, profile["instruction"]))
+    budget = context_token_budget(template_tokens, _generation_options(profile), profile["max_context_tokens"])
+    context, used = pack_context(pieces, budget)
+    if debug:
+        print(f"[DEBUG] Packed {len(pieces)} pieces into {used}/{budget} context tokens.")
+    return context or None, clause_ref
 
-    # Truncate context if it's too long.
-    if len(context) > 7000:  # Increased context size
-        context = context[:7000] + "..."
 
-    # --- PROMPT AND LLM CALL (Your excellent prompt is unchanged) ---
-    prompt = f"""You are a compliance and policy extraction assistant for Steel Authority of India Limited (SAIL).
+def _not_found_text(query, clause_ref, category):
+    if clause_ref:
+        return f"Information for clause '{clause_ref}' could not be found in the '{category}' documents. Please check the clause number or rephrase your query."
+    return f"Sorry, no relevant information was found for your query: '{query}' in the '{category}' documents. Please try rephrasing."
 
-{f"Previous conversation context: {conversation_context}" if conversation_context else ""}
 
-Below is an excerpt from an official policy document. Your task is to:
+# --- PROMPT ---
+# The instructions are a fixed system message placed first, ahead of the history and
+# the per-query context, so Ollama can reuse their evaluated KV cache on every call.
+# What differs per query type (the answer format) goes last, in the user message.
+SYSTEM_PROMPT = """You are a compliance and policy extraction assistant for Steel Authority of India Limited (SAIL).
 
-1. Extract and enumerate every single clause, point, subpoint, number, requirement, exception, and procedural step exactly as written in the context. Do NOT summarize, rephrase, or omit anything. Use a numbered or bullet list, preserving the order and wording from the context.
-2. For each point and subpoint, provide a clear, plain-language explanation immediately after it.
-3. If this appears to be a follow-up question based on the conversation history, remember the previous context and build upon it.
-4. DO NOT AT ALL COSTS:
-- Give a paraphrased summary
-- Omit any point/clause/subpoint/topic/any no.
-- Use Inaccurate terms
-5. List every clause, rule, and subpoint exactly as written, in the order presented.
-6. After each clause, provide a plain-language explanation.
+Each question comes with an excerpt from an official policy document. Answer only from that excerpt:
+- Keep every clause number, amount, limit, exception and procedural step exactly as written. Do not use inaccurate terms.
+- If this appears to be a follow-up question based on the conversation history, remember the previous context and build upon it.
+- The last paragraph of each question says how to format the answer.
 
 If the context is incomplete, then u have two options:
 a) If some partial content is relevant build only upon that and inform the user of in-sufficiency of information.
 b) If no content is absolutely not relevant say :"No relevant information found."
+"""
 
-Context:
-{context}
+ANSWER_INSTRUCTION = ("Answer:\nEnumerate every clause, point, subpoint, number, requirement, exception and procedural "
+                      "step in the context, in the order presented, as a numbered or bullet list. "
+                      "Firstly, print all content in policy as is no changes at all. Then, immediately after, "
+                      "provide a clear explanation in natural language. Do not skip any clause, subpoint, or number. "
+                      "Do not summarize or omit anything. Please do not skip any point or subpoint or terms.")
+OVERVIEW_INSTRUCTION = ("Answer:\nGive a short overview of the policy in the context: what it covers, who it applies to "
+                        "and its main rules, as at most 8 bullet points, each with its clause number. "
+                        "Do not copy whole clauses.")
+DEFINITION_INSTRUCTION = ("Answer:\nIn one or two sentences, say what the term means according to the context. "
+                          "Do not list other clauses.")
+SMALL_TALK_INSTRUCTION = ("Reply in one short, friendly sentence and offer to help with questions about "
+                          "HR or PGP policies.")
 
-Question: {query}
+# Prompt, output budget and stop sequences per query_classifier type. A max_context_tokens
+# of 0 means no retrieval at all.
+QUERY_PROFILES = {
+    query_classifier.CLAUSE: {"instruction": ANSWER_INSTRUCTION, "num_predict": GENERATION_OPTIONS["num_predict"],
+                              "max_context_tokens": MAX_CONTEXT_TOKENS, "stop": []},
+    query_classifier.OVERVIEW: {"instruction": OVERVIEW_INSTRUCTION, "num_predict": 768,
+                                "max_context_tokens": MAX_CONTEXT_TOKENS, "stop": []},
+    query_classifier.DEFINITION: {"instruction": DEFINITION_INSTRUCTION, "num_predict": 160,
+                                  "max_context_tokens": 600, "stop": ["\n\n\n"]},
+    query_classifier.SMALL_TALK: {"instruction": SMALL_TALK_INSTRUCTION, "num_predict": 64,
+                                  "max_context_tokens": 0, "stop": ["\n\n"]},
+}
+# Rough per-message overhead of the chat template, in tokens.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _generation_options(profile):
+    return {**GENERATION_OPTIONS, "num_predict": profile["num_predict"], "stop": STOP_SEQUENCES + profile["stop"]}
 
-Answer:
-Firstly, print all content in policy as is no changes at all. Then, immediately after, provide a clear explanation in natural language. Do not skip any clause, subpoint, or number. Do not summarize or omit anything. Please do not skip any point or subpoint or terms.
-"""
 
-    print(f"[DEBUG] Sending prompt to Ollama generation model: {GENERATION_MODEL}")
-    print("=" * 80)
-    print("[DEBUG] CONTEXT SENT TO OLLAMA:")
-    print(context)
-    print("=" * 80)
+def _build_messages(query, context, history, instruction=ANSWER_INSTRUCTION):
+    """System prompt, then earlier turns, then this turn's context (if any), question and answer format."""
+    question = f"Question: {query}\n\n{instruction}"
+    if context is not None:
+        question = f"Context:\n{context}\n\n{question}"
+    return ([{"role": "system", "content": SYSTEM_PROMPT}]
+            + list(history)
+            + [{"role": "user", "content": question}])
 
+
+def _estimate_message_tokens(messages):
+    return sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def warm_up_generation_model():
+    """
+    Loads the generation model and evaluates the system prompt once at start-up, so the
+    first user pays neither. Uses the normal num_ctx: a different value would make
+    Ollama reload the model on the next real request.
+    """
     try:
-        response = ollama.generate(
-            model=GENERATION_MODEL,
-            prompt=prompt,
-            options={
-                "temperature": 0.2,
-                "num_predict": 4096,  # Increased prediction length for long policies
-                "num_ctx": 8192,  # Increased context window
-            }
-        )
-        response_text = response["response"]
+        start_time = time.time()
+        ticket = scheduler.submit("warm-up", "chat", model=GENERATION_MODEL,
+                                  messages=[{"role": "system", "content": SYSTEM_PROMPT},
+                                            {"role": "user", "content": "Hello"}],
+                                  options={**GENERATION_OPTIONS, "num_predict": 1},
+                                  keep_alive=GENERATION_KEEP_ALIVE)
+        ticket.collect()
+        print(f"[LLM] Warm-up of {GENERATION_MODEL} complete in {time.time() - start_time:.2f}s")
+        return True
+    except Exception as e:
+        print(f"[ERROR] Generation model warm-up failed: {e}")
+        return False
+
+
+# --- QUERY ROUTING ---
+def plan_answer(query, category=None):
+    """
+    Classifies the query. Returns (query_type, profile, glossary_answer), where
+    glossary_answer is set when a definition question is answered by the glossary
+    index, in which case no retrieval or generation is needed. A definition question
+    the glossary cannot answer keeps the short definition profile only for an acronym
+    ("what is LTC"); "what is gratuity" is answered from the clauses instead.
+    Callers that try the glossary before generating compute the plan once and pass it
+    to answer_from_glossary and generate_llm_response(_stream), so each query is
+    classified and looked up once.
+    """
+    with metrics.stage_timer("query_classification"):
+        query_type = query_classifier.classify_query(query)
+    glossary_answer = None
+    if query_type == query_classifier.DEFINITION:
+        with metrics.stage_timer("glossary_lookup"):
+            term = query_classifier.definition_term(query)
+            definition = glossary_index.lookup_term(term, category)
+        metrics.record_cache_lookup("glossary", "hit" if definition else "miss")
+        if definition:
+            glossary_answer = f"{term.upper()} stands for '{definition}'."
+        elif not query_classifier.is_acronym_query(query):
+            query_type = query_classifier.CLAUSE
+    return query_type, QUERY_PROFILES[query_type], glossary_answer
+
+
+def _save_glossary_answer(query, query_type, answer, category, session_id, start_time):
+    if session_id:
+        save_conversation(session_id, query, answer, category)
+    _record_query(query_type, "glossary", start_time)
+    print(f"[PERF] Glossary answer. Total query time: {(time.time() - start_time) * 1000:.2f}ms")
+
+
+def answer_from_glossary(query, category=None, session_id=None, plan=None):
+    """
+    Answers "what is X" / "full form of X" from the glossary index built at ingest.
+    Only a classification and a dictionary lookup: the chat route calls it before any
+    retrieval or generation. Returns the answer, or None to go on as usual.
+    """
+    start_time = time.time()
+    query_type, _, answer = plan or plan_answer(query, category)
+    if answer:
+        _save_glossary_answer(query, query_type, answer, category, session_id, start_time)
+    return answer
+
+
+def answer_from_faq(query, category=None, session_id=None):
+    """
+    Answers from the FAQ sheet (faq_matcher, shared with the voice assistant) when the
+    question nearly matches an entry. Returns the answer, or None to go on as usual.
+    """
+    start_time = time.time()
+    match = faq_matcher.match_faq(query, threshold=FAQ_CHAT_MATCH_THRESHOLD, scorer=FAQ_CHAT_SCORER)
+    if match is None:
+        return None
+    if session_id:
+        save_conversation(session_id, query, match["response"], category)
+    _record_query(query_classifier.classify_query(query), "faq", start_time)
+    print(f"[PERF] FAQ answer (score {match['score']:.0f}). Total query time: {(time.time() - start_time) * 1000:.2f}ms")
+    return match["response"]
+
+
+def _cache_query(query_type, clean_query):
+    """Answer-cache key text: other types get their own entries so formats never mix."""
+    return clean_query if query_type == query_classifier.CLAUSE else f"[{query_type}] {clean_query}"
+
+
+def _record_query(query_type, answered_by, start_time):
+    """Counts and times each query by type and by what answered it (glossary, cache, llm...)."""
+    metrics.inc("chatbot_queries_total", query_type=query_type, answered_by=answered_by)
+    metrics.observe("chatbot_query_seconds", time.time() - start_time, query_type=query_type, answered_by=answered_by)
+
+
+@metrics.timed("generate_llm_response")
+def generate_llm_response(query, document_name=None, category=None, session_id=None, plan=None):
+    start_time = time.time()
+    debug = metrics.sample_debug()
+    query_type, profile, glossary_answer = plan or plan_answer(query, category)
+    if glossary_answer:
+        _save_glossary_answer(query, query_type, glossary_answer, category, session_id, start_time)
+        return {"response": glossary_answer, "context": "", "document": category}
+
+    history = get_conversation_messages(session_id) if session_id else []
+    context, clause_ref = None, None
+    if profile["max_context_tokens"]:
+        context, clause_ref = _retrieve_context(query, document_name, category, debug=debug, history=history,
+                                                profile=profile)
+
+        # 3. Handle "Not Found" case if both strategies fail.
+        if not context:
+            response_text = _not_found_text(query, clause_ref, category)
+            if session_id:
+                save_conversation(session_id, query, response_text, category)
+            _record_query(query_type, "not_found", start_time)
+            return {"response": response_text, "context": "", "document": category}
+
+    clean_query = _cache_query(query_type, preprocess_query(query))
+    cached_answer = get_cached_answer(category, clean_query, context) if context else None
+    if cached_answer is not None:
+        if session_id:
+            save_conversation(session_id, query, cached_answer, category)
+        _record_query(query_type, "answer_cache", start_time)
+        print(f"[PERF] Answer cache hit. Total query time: {time.time() - start_time:.2f}s")
+        return {"response": cached_answer, "context": context, "document": category}
+
+    with metrics.stage_timer("prompt_build"):
+        messages = _build_messages(query, context, history, profile["instruction"])
+
+    if debug:
+        print(f"[DEBUG] Sending {query_type} prompt to Ollama generation model: {GENERATION_MODEL}")
+        print("=" * 80)
+        print("[DEBUG] CONTEXT SENT TO OLLAMA:")
+        print(context)
+        print("=" * 80)
+
+    # Generations go through the shared scheduler: bounded concurrency, a fair
+    # queue per session, and identical prompts answered by one generation.
+    ticket = scheduler.submit(session_id or "anonymous", "chat", model=GENERATION_MODEL, messages=messages,
+                              options=_generation_options(profile), keep_alive=GENERATION_KEEP_ALIVE)
+    try:
+        with metrics.stage_timer("llm_generation"):
+            response_text, _ = ticket.collect()
+        # An empty generation must not be cached and served again on every repeat.
+        if context and response_text.strip():
+            store_answer(category, clean_query, context, response_text)
+        if session_id:
+            save_conversation(session_id, query, response_text, category)
+        _record_query(query_type, "llm", start_time)
+        print(f"[PERF] Total query time ({query_type}): {time.time() - start_time:.2f}s")
+        return {"response": response_text, "context": context or "", "document": category}
+    except SchedulerTimeout as e:
+        print(f"[ERROR] Generation queue timeout: {e}")
+        _record_query(query_type, "busy", start_time)
+        return {"response": BUSY_RESPONSE, "context": context or "", "document": category}
+    except GenerationTimeout as e:
+        # Keep what was generated; it is not cached, being incomplete.
+        print(f"[ERROR] {e}")
+        response_text = e.partial_text + TRUNCATED_NOTICE
         if session_id:
             save_conversation(session_id, query, response_text, category)
-        print(f"[PERF] Total query time: {time.time() - start_time:.2f}s")
-        return {"response": response_text, "context": context, "document": category}
+        _record_query(query_type, "truncated", start_time)
+        return {"response": response_text, "context": context or "", "document": category}
     except Exception as e:
         print(f"[ERROR] Ollama generation failed: {e}")
         error_response = "I'm having trouble generating a response. Please try again."
         if session_id:
             save_conversation(session_id, query, error_response, category)
-        return {"response": error_response, "context": context, "document": category}
+        _record_query(query_type, "error", start_time)
+        return {"response": error_response, "context": context or "", "document": category}
+
+
+def generate_llm_response_stream(query, document_name=None, category=None, session_id=None, plan=None):
+    """
+    Streaming variant of generate_llm_response. Yields event dicts:
+    {"type": "meta"}, then one {"type": "token", "text": ...} per generated piece,
+    then {"type": "done"}. If the client stops reading part-way through, the
+    generation is released and the part already streamed is what gets saved to
+    the conversation history. plan is plan_answer()'s result, if the caller has it.
+    """
+    start_time = time.time()
+    debug = metrics.sample_debug()
+    query_type, profile, glossary_answer = plan or plan_answer(query, category)
+    if glossary_answer:
+        _save_glossary_answer(query, query_type, glossary_answer, category, session_id, start_time)
+        yield {"type": "meta", "document": category, "context_length": 0, "query_type": query_type}
+        yield {"type": "token", "text": glossary_answer}
+        yield {"type": "done", "document": category}
+        return
+
+    history = get_conversation_messages(session_id) if session_id else []
+    context, clause_ref = None, None
+    if profile["max_context_tokens"]:
+        context, clause_ref = _retrieve_context(query, document_name, category, debug=debug, history=history,
+                                                profile=profile)
+        if not context:
+            response_text = _not_found_text(query, clause_ref, category)
+            if session_id:
+                save_conversation(session_id, query, response_text, category)
+            _record_query(query_type, "not_found", start_time)
+            yield {"type": "meta", "document": category, "context_length": 0, "query_type": query_type}
+            yield {"type": "token", "text": response_text}
+            yield {"type": "done", "document": category}
+            return
+
+    yield {"type": "meta", "document": category, "context_length": len(context or ""), "query_type": query_type}
+
+    clean_query = _cache_query(query_type, preprocess_query(query))
+    cached_answer = get_cached_answer(category, clean_query, context) if context else None
+    if cached_answer is not None:
+        if session_id:
+            save_conversation(session_id, query, cached_answer, category)
+        _record_query(query_type, "answer_cache", start_time)
+        print(f"[PERF] Answer cache hit. Total query time: {time.time() - start_time:.2f}s")
+        yield {"type": "token", "text": cached_answer}
+        yield {"type": "done", "document": category}
+        return
+
+    with metrics.stage_timer("prompt_build"):
+        messages = _build_messages(query, context, history, profile["instruction"])
+    if debug:
+        print(f"[DEBUG] Streaming {query_type} prompt to Ollama generation model: {GENERATION_MODEL}")
+        print("[DEBUG] CONTEXT SENT TO OLLAMA:")
+        print(context)
+
+    pieces = []
+    generation_start = time.time()
+    ticket = scheduler.submit(session_id or "anonymous", "chat", model=GENERATION_MODEL, messages=messages,
+                              options=_generation_options(profile), keep_alive=GENERATION_KEEP_ALIVE)
+    try:
+        for kind, part in ticket.events():
+            if kind == "queued":
+                # Waiting for a generation slot: tell the UI where it is in the queue.
+                yield {"type": "queued", "position": part}
+                continue
+            token = part_text("chat", part)
+            if not token:
+                continue
+            if not pieces:
+                metrics.observe("chatbot_stage_seconds", time.time() - start_time, stage="time_to_first_token")
+                print(f"[PERF] Time to first token: {time.time() - start_time:.2f}s")
+            pieces.append(token)
+            yield {"type": "token", "text": token}
+        # Only complete answers are cached; a disconnect raises GeneratorExit above.
+        metrics.observe("chatbot_stage_seconds", time.time() - generation_start, stage="llm_generation")
+        metrics.observe("chatbot_stage_seconds", time.time() - start_time, stage="generate_llm_response_stream")
+        if context and "".join(pieces).strip():
+            store_answer(category, clean_query, context, "".join(pieces))
+        _record_query(query_type, "llm", start_time)
+        print(f"[PERF] Total query time ({query_type}): {time.time() - start_time:.2f}s")
+    except SchedulerTimeout as e:
+        print(f"[ERROR] Generation queue timeout: {e}")
+        _record_query(query_type, "busy", start_time)
+        pieces = [BUSY_RESPONSE]
+        yield {"type": "token", "text": BUSY_RESPONSE}
+    except GenerationTimeout as e:
+        # The streamed part stays on screen and in the history, followed by a notice.
+        print(f"[ERROR] {e}")
+        _record_query(query_type, "truncated", start_time)
+        pieces.append(TRUNCATED_NOTICE)
+        yield {"type": "token", "text": TRUNCATED_NOTICE}
+    except Exception as e:
+        print(f"[ERROR] Ollama streaming generation failed: {e}")
+        _record_query(query_type, "error", start_time)
+        error_response = "I'm having trouble generating a response. Please try again."
+        pieces = [error_response]
+        yield {"type": "token", "text": error_response}
+    finally:
+        # A client disconnect closes this generator; releasing the ticket lets the
+        # scheduler drop the queued request or stop the generation if nobody else shares it.
+        ticket.cancel()
+        if session_id and pieces:
+            save_conversation(session_id, query, "".join(pieces), category)
 
+    yield {"type": "done", "document": category}
@@ -0,0 +1,114 @@
+import re
+
+# --- CONFIGURATION ---
+CLAUSE = "clause"
+DEFINITION = "definition"
+OVERVIEW = "overview"
+SMALL_TALK = "small_talk"
+QUERY_TYPES = (CLAUSE, DEFINITION, OVERVIEW, SMALL_TALK)
+
+# A definition asks about a short term; longer subjects are policy questions.
+MAX_DEFINITION_TERM_WORDS = 4
+# Small talk is short by nature; anything longer goes through retrieval.
+MAX_SMALL_TALK_WORDS = 6
+
+CLAUSE_REFERENCE = re.compile(r"\b\d+(?:\.\d+)+\b|\b(?:clause|section|para(?:graph)?|rule|article|annexure)\s*(?:no\.?\s*)?\d+",
+                              re.IGNORECASE)
+# Matched case-insensitively against the message as typed, so the term keeps its case.
+DEFINITION_PATTERNS = [
+    re.compile(r"^(?:what\s+is|what's|whats)\s+(?:the\s+)?(?:full\s*form|fullform|expansion|abbreviation)\s+of\s+(.+)$",
+               re.IGNORECASE),
+    re.compile(r"^(?:full\s*form|fullform|expansion|abbreviation|meaning|definition)\s+of\s+(.+)$", re.IGNORECASE),
+    re.compile(r"^(?:define|expand)\s+(.+)$", re.IGNORECASE),
+    re.compile(r"^what\s+does\s+(.+?)\s+(?:stand\s+for|mean)$", re.IGNORECASE),
+    re.compile(r"^(?:what\s+is|what's|whats|who\s+is)\s+(?:an?\s+|the\s+)?(.+)$", re.IGNORECASE),
+]
+# Words that turn a short message into a question about a rule.
+POLICY_WORDS = re.compile(
+    r"\b(?:procedure|process|policy|rules?|limit|entitle\w*|eligib\w*|allowance|amount|rate|maximum|minimum|"
+    r"days?|period|required|allowed|permissible|admissible)\b")
+# ...and those that make "what is ..." one ("what is the limit for LTC", "who is eligible").
+RULE_QUESTION_WORDS = re.compile(r"\b(?:how|when|who|where|which|for|of|in|under|after|before)\b")
+OVERVIEW_PATTERNS = re.compile(
+    r"\b(?:overview|summary|summari[sz]e|in\s+brief|briefly|gist|outline|highlights|key\s+points|main\s+points|"
+    r"tell\s+me\s+about|explain\s+the\s+\w+(?:\s+\w+)?\s+(?:policy|rules|procedure)|what\s+are\s+the\s+(?:rules|provisions))\b")
+GREETINGS = (r"hi+|hello+|hey+|namaste|good\s+(?:morning|afternoon|evening|night)|thanks?|thank\s+you|ty|thx|"
+             r"ok(?:ay)?|cool|great|nice|awesome|got\s+it|bye|goodbye|see\s+you")
+SMALL_TALK_QUESTIONS = r"how\s+are\s+you|who\s+are\s+you|what\s+can\s+you\s+do|are\s+you\s+there"
+# Words that may follow a greeting without making it a question ("thanks a lot", "hi there").
+SMALL_TALK_FILLERS = r"there|all|everyone|sir|ma'?am|bot|again|so\s+much|a\s+lot|very\s+much"
+# The whole message must be small talk: "hi, what is LTC" is a definition question.
+SMALL_TALK_PATTERNS = re.compile(
+    rf"^(?:{GREETINGS}|{SMALL_TALK_QUESTIONS})(?:[\s,!.]+(?:{GREETINGS}|{SMALL_TALK_QUESTIONS}|{SMALL_TALK_FILLERS}))*$")
+# A greeting in front of a question, stripped before the question is classified.
+GREETING_PREFIX = re.compile(rf"^(?:{GREETINGS})\b(?:[\s,!.]+(?:{GREETINGS}|{SMALL_TALK_FILLERS})\b)*[\s,!.:-]*",
+                             re.IGNORECASE)
+ACRONYM = re.compile(r"^[A-Z][A-Z&.]{1,9}$")
+
+
+def _normalise(query):
+    return re.sub(r"\s+", " ", query.strip().rstrip("?!. ")).strip()
+
+
+def strip_greeting(text):
+    """The question after a leading greeting ("hi, what is LTC" -> "what is LTC")."""
+    return GREETING_PREFIX.sub("", text, count=1) or text
+
+
+def _definition_match(query):
+    """The term a definition question asks about, as typed, or None."""
+    text = strip_greeting(_normalise(query))
+    if ACRONYM.match(text):
+        return text
+    for pattern in DEFINITION_PATTERNS:
+        match = pattern.match(text)
+        if not match:
+            continue
+        term = match.group(1).strip()
+        words = term.split()
+        if not words or len(words) > MAX_DEFINITION_TERM_WORDS:
+            return None
+        # "what is the leave encashment limit" is a policy question, "what is LTC" is not.
+        lowered = term.lower()
+        if pattern is DEFINITION_PATTERNS[-1] and (POLICY_WORDS.search(lowered) or RULE_QUESTION_WORDS.search(lowered)):
+            return None
+        return term
+    return None
+
+
+def definition_term(query):
+    """The term a definition question asks about ("full form of LTC" -> "ltc"), or None."""
+    term = _definition_match(query)
+    return term.lower() if term else None
+
+
+def is_acronym_query(query):
+    """True if the definition question's term was typed as an acronym ("what is LTC")."""
+    term = _definition_match(query)
+    return bool(term and ACRONYM.match(term))
+
+
+def classify_query(query):
+    """
+    Sorts a chat message into one of QUERY_TYPES with a few regular expressions (no
+    model call), so the answer can use a matching prompt and output budget:
+    small_talk for messages that are only greetings or acknowledgements, definition for
+    "what is X" / "full form of X", overview for requests to summarise a policy, and
+    clause for everything else, i.e. questions answered by quoting the governing clauses.
+    A greeting in front of a question is ignored.
+    """
+    text = _normalise(query)
+    lowered = text.lower()
+    if not lowered:
+        return SMALL_TALK
+    if CLAUSE_REFERENCE.search(lowered):
+        return CLAUSE
+    if len(lowered.split()) <= MAX_SMALL_TALK_WORDS and SMALL_TALK_PATTERNS.match(lowered):
+        return SMALL_TALK
+    text = strip_greeting(text)
+    lowered = text.lower()
+    if definition_term(text):
+        return DEFINITION
+    if OVERVIEW_PATTERNS.search(lowered):
+        return OVERVIEW
+    return CLAUSE
@@ -1,35 +1,77 @@
 import os
 import json
-from langchain_community.vectorstores import Chroma
-from langchain_ollama import OllamaEmbeddings
+import hashlib
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+import metrics
+
 # Use the correct function name from our final shared_utils.py
-from shared_utils import get_all_document_paths, extract_text_from_file
+from shared_utils import find_document_by_name, extract_text_from_file, get_vector_store
 
 # --- CONFIGURATION ---
 EMBEDDING_MODEL = "all-minilm"
 CHROMA_PATH = "data/chroma_db"
 
 
+def get_document_chunk_ids(document_name):
+    """Returns the ids of every chunk currently stored for a document."""
+    return get_vector_store().get(where={"source": document_name}, include=[])["ids"]
+
+
+def delete_document_embeddings(document_name, ids=None):
+    """
+    Removes a document's chunks from ChromaDB. With ids, only those chunks are
+    removed, so a new version can be added before the old one is dropped.
+    """
+    try:
+        if ids is None:
+            ids = get_document_chunk_ids(document_name)
+        if ids:
+            get_vector_store().delete(ids=ids)
+        return True
+    except Exception as e:
+        print(f"[ERROR] Failed to delete embeddings for {document_name}: {e}")
+        return False
+
+
+def make_chunk_id(document_hash, start_index):
+    """Chunk ids are stable for the same document text, so re-adding a document overwrites it."""
+    return f"{document_hash}:{start_index}"
+
+
+def split_document_chunks(document_name, full_text):
+    """
+    Splits a document's text into overlapping chunks. Returns (ids, texts).
+    The id is the document hash plus the chunk's offset in the text, so
+    storing the same document twice replaces its chunks instead of duplicating them.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        length_function=len,
+        add_start_index=True
+    )
+    document_hash = hashlib.md5(f"{document_name}\0{full_text}".encode('utf-8')).hexdigest()
+    chunks_by_id = {}
+    for chunk in text_splitter.create_documents([full_text]):
+        chunks_by_id.setdefault(make_chunk_id(document_hash, chunk.metadata["start_index"]), chunk.page_content)
+    return list(chunks_by_id), list(chunks_by_id.values())
+
+
 def build_and_cache_embeddings(document_name):
     """
     Takes a document name, loads its OCR'd text, chunks it,
-    and stores the embeddings in ChromaDB.
+    and upserts the embeddings in ChromaDB under deterministic ids.
+    Returns the list of chunk ids stored (empty on failure).
     """
     print(f"--- Building embeddings for: {document_name} ---")
 
     # 1. Find the file path
-    docs = get_all_document_paths()
-    file_path = None
-    for doc in docs:
-        if doc['filename'] == document_name:
-            file_path = doc['path']
-            break
+    file_path = find_document_by_name(document_name)
 
     if not file_path:
         print(f"[ERROR] Could not find document path for {document_name}. Skipping.")
-        return
+        return []
 
     # 2. Extract the full text using our corrected function
     # This call will now work because 'extract_text_from_file' exists in the final shared_utils.py
@@ -37,32 +79,49 @@ def build_and_cache_embeddings(document_name):
 
     if not full_text:
         print(f"[ERROR] No text found for {document_name}. Skipping.")
-        return
+        return []
 
-    # 3. Split the text into manageable chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len
-    )
-    chunks = text_splitter.split_text(full_text)
+    # 3. Split the text into manageable chunks with stable ids
+    ids, texts = split_document_chunks(document_name, full_text)
 
-    if not chunks:
+    if not ids:
         print(f"[ERROR] Text splitting resulted in no chunks for {document_name}. Skipping.")
-        return
+        return []
 
-    # 4. Generate and store embeddings in ChromaDB
+    # 4. Generate and upsert embeddings in ChromaDB
     try:
-        embedding_function = OllamaEmbeddings(model=EMBEDDING_MODEL)
-        vector_store = Chroma.from_texts(
-            texts=chunks,
-            embedding=embedding_function,
-            persist_directory=CHROMA_PATH,
-            # Add metadata to know which document a chunk came from
-            metadatas=[{"source": document_name} for _ in chunks]
-        )
-
-        print(f"[SUCCESS] Successfully built and cached {len(chunks)} embeddings for {document_name}.")
+        with metrics.stage_timer("embed_document"):
+            get_vector_store().add_texts(
+                texts=texts,
+                # Add metadata to know which document a chunk came from
+                metadatas=[{"source": document_name} for _ in ids],
+                ids=ids
+            )
+        metrics.inc("chatbot_chunks_embedded_total", len(ids))
+
+        print(f"[SUCCESS] Successfully built and cached {len(ids)} embeddings for {document_name}.")
+        return ids
     except Exception as e:
         print(f"[FATAL ERROR] Failed to generate or store embeddings for {document_name}: {e}")
+        return []
+
+
+def replace_document_embeddings(document_name):
+    """
+    Replaces a document's chunks in ChromaDB: the current chunks are upserted,
+    then any chunk of the document that is not part of the new set (from an
+    older version of the text) is deleted. Returns True on success.
+    """
+    try:
+        old_ids = get_document_chunk_ids(document_name)
+    except Exception as e:
+        print(f"[ERROR] Could not list existing chunks for {document_name}: {e}")
+        return False
+    new_ids = build_and_cache_embeddings(document_name)
+    if not new_ids:
+        return False
+    stale_ids = sorted(set(old_ids) - set(new_ids))
+    if stale_ids:
+        print(f"Removing {len(stale_ids)} stale chunks for {document_name}.")
+    return delete_document_embeddings(document_name, ids=stale_ids)
 
@@ -0,0 +1,170 @@
+import sqlite_pool
+
+# --- CONFIGURATION ---
+# Schemas that live inside another database file rather than being one; their versions
+# are kept in the schema_versions table of that file instead of PRAGMA user_version.
+CONVERSATION_SCHEMA = "conversation_memory"
+# Ordered schema changes per database file: (version, description, statements). A
+# database's version is kept in PRAGMA user_version; every migration above it is applied
+# once, each in its own transaction. Never edit a released migration: append a new one.
+# Version 1 is the schema the app created before migrations existed (CREATE ... IF NOT
+# EXISTS), so existing databases upgrade in place.
+MIGRATIONS = {
+    sqlite_pool.AUTH_DB_PATH: [
+        (1, "baseline", [
+            """CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT UNIQUE NOT NULL,
+                password BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )""",
+            """CREATE TABLE IF NOT EXISTS account_requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT UNIQUE NOT NULL,
+                password BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )""",
+            """CREATE TABLE IF NOT EXISTS password_reset_requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )""",
+        ]),
+        (2, "indexes for admin listings and reset lookups", [
+            "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS idx_account_requests_created_at ON account_requests (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS idx_password_reset_requests_created_at ON password_reset_requests (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS idx_password_reset_requests_email ON password_reset_requests (email)",
+        ]),
+    ],
+    sqlite_pool.LOG_DB_PATH: [
+        (1, "baseline", [
+            """CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT UNIQUE NOT NULL,
+                password TEXT NOT NULL
+            )""",
+            """CREATE TABLE IF NOT EXISTS chat_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                user_input TEXT NOT NULL,
+                bot_response TEXT NOT NULL,
+                used_general_knowledge BOOLEAN NOT NULL DEFAULT 0
+            )""",
+            """CREATE TABLE IF NOT EXISTS voice_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                query TEXT NOT NULL,
+                response TEXT NOT NULL,
+                used_general_knowledge BOOLEAN NOT NULL DEFAULT 0
+            )""",
+            """CREATE TABLE IF NOT EXISTS feedback (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                response_id INTEGER,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                rating INTEGER NOT NULL,
+                comments TEXT
+            )""",
+            """CREATE TABLE IF NOT EXISTS account_requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT UNIQUE NOT NULL,
+                password TEXT NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )""",
+            """CREATE TABLE IF NOT EXISTS password_requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT NOT NULL,
+                token TEXT NOT NULL,
+                request_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+                expiry DATETIME NOT NULL,
+                status TEXT DEFAULT 'Pending'
+            )""",
+            """CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL,
+                content TEXT NOT NULL,
+                uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )""",
+        ]),
+        (2, "indexes for per-user and time-ordered log listings", [
+            "CREATE INDEX IF NOT EXISTS idx_chat_logs_user_timestamp ON chat_logs (user_id, timestamp, id)",
+            "CREATE INDEX IF NOT EXISTS idx_chat_logs_timestamp ON chat_logs (timestamp, id)",
+            "CREATE INDEX IF NOT EXISTS idx_voice_logs_user_timestamp ON voice_logs (user_id, timestamp, id)",
+            "CREATE INDEX IF NOT EXISTS idx_voice_logs_timestamp ON voice_logs (timestamp, id)",
+            "CREATE INDEX IF NOT EXISTS idx_feedback_response_id ON feedback (response_id)",
+            "CREATE INDEX IF NOT EXISTS idx_password_requests_email ON password_requests (email)",
+        ]),
+    ],
+    # Not a file of its own: conversation_memory.SQLiteMemory keeps it in whichever
+    # database it is given (sail_chatbot.db by default).
+    CONVERSATION_SCHEMA: [
+        (1, "conversation memory", [
+            """CREATE TABLE IF NOT EXISTS conversation_memory (
+                session_id TEXT PRIMARY KEY,
+                turns TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_conversation_memory_expires_at ON conversation_memory (expires_at)",
+        ]),
+    ],
+}
+
+
+def schema_version(conn, schema=None):
+    if schema is None:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_versions (schema TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+    row = conn.execute("SELECT version FROM schema_versions WHERE schema = ?", (schema,)).fetchone()
+    return row[0] if row else 0
+
+
+def _set_schema_version(conn, schema, version):
+    if schema is None:
+        conn.execute(f"PRAGMA user_version = {int(version)}")
+    else:
+        conn.execute("INSERT OR REPLACE INTO schema_versions (schema, version) VALUES (?, ?)", (schema, version))
+
+
+def migrate(path, schema=None):
+    """
+    Brings one database file up to its latest schema version. Safe to call from several
+    processes at start-up: the version is re-read under the write lock before each step.
+    schema names a MIGRATIONS entry kept inside the file (e.g. CONVERSATION_SCHEMA) and
+    migrates only that; by default the file's own entry is used.
+    Returns the version the schema is at afterwards.
+    """
+    if schema == path:
+        schema = None
+    migrations = MIGRATIONS[schema or path]
+    label = f"{path} ({schema})" if schema else path
+    conn = sqlite_pool.get_connection(path)
+    try:
+        for version, description, statements in migrations:
+            if schema_version(conn, schema) >= version:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if schema_version(conn, schema) >= version:  # Another process got here first.
+                    conn.rollback()
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                _set_schema_version(conn, schema, version)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            print(f"[DB] {label}: migrated to version {version} ({description}).")
+        return schema_version(conn, schema)
+    finally:
+        conn.close()
+
+
+def migrate_all():
+    """Migrates every database file, plus the conversation schema in its default file."""
+    versions = {path: migrate(path) for path in MIGRATIONS if path != CONVERSATION_SCHEMA}
+    versions[CONVERSATION_SCHEMA] = migrate(sqlite_pool.LOG_DB_PATH, schema=CONVERSATION_SCHEMA)
+    return versions
@@ -1,64 +1,144 @@
 import os
 import re
 import json
+import threading
+import time
 import pytesseract
 from pdf2image import convert_from_path
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 
 # --- FIX: Updated imports to resolve deprecation warnings ---
 from langchain_chroma import Chroma
 from langchain_ollama import OllamaEmbeddings
 
+import clause_index
+import glossary_index
+import lexical_index
+import metrics
+import text_cache
+from document_catalog import DocumentCatalog
+
 # --- CONFIGURATION (Unchanged) ---
 EMBEDDING_MODEL = "all-minilm"
 CHROMA_PATH = "data/chroma_db"
 DOCUMENT_DIRECTORIES = ["data/documents", "data/uploads"]
 OCR_CACHE_DIR = "data/ocr_cache"
+# "vector" (Chroma only), "lexical" (BM25 only) or "hybrid" (both, fused by reciprocal rank).
+RETRIEVAL_MODE = "hybrid"
+# Candidates taken from each ranker before fusion, and the RRF damping constant.
+HYBRID_CANDIDATES = 10
+RRF_K = 60
+# If the vector search has not answered within this budget, the lexical results are used alone.
+VECTOR_SEARCH_BUDGET_SECONDS = 1.5
+
+# --- RETRIEVAL CLIENT POOL ---
+# One embedding client and one Chroma handle per process. Opening Chroma reloads the
+# SQLite/HNSW files from disk, so it must not happen on every chat turn.
+_retrieval_lock = threading.RLock()
+_vector_store = None
+
+
+def get_vector_store():
+    """Returns the process-wide Chroma store, opening it on first use."""
+    global _vector_store
+    if _vector_store is None:
+        with _retrieval_lock:
+            if _vector_store is None:
+                embedding_function = OllamaEmbeddings(model=EMBEDDING_MODEL)
+                _vector_store = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
+    return _vector_store
+
+
+def reload_vector_store():
+    """
+    Drops the pooled store and the loaded clause, lexical and glossary indexes so they
+    are reopened from disk (e.g. after a rebuild or a batch ingest in another process).
+    """
+    global _vector_store, _clause_index_ready, _lexical_index_ready, _glossary_index_ready
+    with _retrieval_lock:
+        _vector_store = None
+        _clause_index_ready = False
+        _lexical_index_ready = False
+    with _glossary_lock:
+        _glossary_index_ready = False
+    ensure_clause_index()
+    ensure_lexical_index()
+    ensure_glossary_index()
+    return get_vector_store()
+
+
+def warm_up_retrieval():
+    """Opens the store and loads the embedding model so the first query only pays for the lookup."""
+    try:
+        start_time = time.time()
+        db = get_vector_store()
+        db.embeddings.embed_query("warm up")
+        print(f"[RETRIEVAL] Warm-up complete in {time.time() - start_time:.2f}s")
+        return True
+    except Exception as e:
+        print(f"[ERROR] Retrieval warm-up failed: {e}")
+        return False
+
+
+def retrieval_health():
+    """Reports whether the pooled store is open and how many chunks it holds."""
+    try:
+        db = get_vector_store()
+        ensure_lexical_index()
+        return {"status": "ok", "mode": RETRIEVAL_MODE, "chunks": len(db.get(include=[])["ids"]),
+                "lexical_documents": len(lexical_index.indexed_documents()),
+                "glossary_documents": len(glossary_index.indexed_documents())}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+
+# --- DYNAMIC DOCUMENT DISCOVERY (Cached Catalog) ---
+# Walking the document folders is cached; the catalog rescans only when a
+# directory mtime changes, the watcher fires, or it is invalidated explicitly.
+document_catalog = DocumentCatalog(DOCUMENT_DIRECTORIES)
+
 
-# --- DYNAMIC DOCUMENT DISCOVERY (Robust Version) ---
 def get_all_document_paths():
     """
-    Dynamically scans document directories to find all files and their categories.
-    This version is more robust and correctly identifies categories from folder paths.
+    Returns every document with its path and category (the first folder below
+    'documents' or 'uploads'; files in the root are 'general').
     """
-    all_docs = []
-    for directory in DOCUMENT_DIRECTORIES:
-        if not os.path.exists(directory):
-            continue
-        for root, _, files in os.walk(directory):
-            for file in files:
-                if file.lower().endswith('.pdf'):
-                    full_path = os.path.join(root, file)
-                    try:
-                        # This new logic is more reliable. It gets the path relative
-                        # to the base 'documents' or 'uploads' directory.
-                        relative_path = os.path.relpath(root, directory)
-                        # The category is the first part of the relative path.
-                        # e.g., 'hr/policies' -> 'hr'
-                        category = relative_path.split(os.sep)[0]
-                        # Handle cases where file is in the root of 'documents'
-                        if category == '.':
-                            category = 'general'
-                    except (ValueError, IndexError):
-                        category = "general" # Fallback
-
-                    all_docs.append({
-                        "filename": file,
-                        "path": full_path,
-                        "category": category.lower()
-                    })
-    return all_docs
-
-# --- CORE TEXT EXTRACTION (Unchanged) ---
+    return document_catalog.all_documents()
+
+
+def get_documents_in_category(category):
+    return document_catalog.documents_in_category(category)
+
+
+def get_catalog_categories():
+    return sorted(document_catalog.categories())
+
+
+def invalidate_document_catalog():
+    """Call after adding or removing documents so the next lookup rescans."""
+    document_catalog.invalidate()
+
+
+def start_document_watcher():
+    return document_catalog.start_watcher()
+
+# --- CORE TEXT EXTRACTION ---
 def extract_text_from_file(file_path):
-    """Loads text for a given file path from the OCR cache."""
-    cache_filename = os.path.basename(file_path) + ".txt"
-    cache_path = os.path.join(OCR_CACHE_DIR, cache_filename)
-    if os.path.exists(cache_path):
-        with open(cache_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    else:
-        return ""
+    """Loads text for a given file path from the shared text cache."""
+    text = text_cache.read_text(file_path)
+    if text is not None:
+        return text
+    # Migrate a cache file written before the shared text cache existed.
+    legacy_cache_path = os.path.join(OCR_CACHE_DIR, os.path.basename(file_path) + ".txt")
+    if os.path.exists(legacy_cache_path):
+        with open(legacy_cache_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        try:
+            text_cache.write_text(file_path, text)
+            os.remove(legacy_cache_path)
+        except OSError as e:
+            print(f"[WARN] Could not migrate legacy OCR cache for {file_path}: {e}")
+        return text
+    return ""
 
 # --- CLAUSE AND PREPROCESSING LOGIC (Unchanged) ---
 def preprocess_query(text):
@@ -67,45 +147,122 @@ def preprocess_query(text):
     return text
 
 def find_document_by_name(doc_name):
-    for doc in get_all_document_paths():
-        if doc['filename'] == doc_name:
-            return doc['path']
-    return None
+    doc = document_catalog.find(doc_name)
+    return doc['path'] if doc else None
 
+# --- CLAUSE INDEX ---
+_clause_index_ready = False
+
+
+def ensure_clause_index():
+    """
+    Loads the persisted clause index once per process. Documents that have OCR text
+    but are missing from the index (e.g. cached before the index existed) are indexed
+    here, entries of documents no longer in that category are dropped, and the index
+    is saved, so lookups never have to scan the OCR cache.
+    """
+    global _clause_index_ready
+    if _clause_index_ready:
+        return
+    with _retrieval_lock:
+        if _clause_index_ready:
+            return
+        clause_index.load_clause_index()
+        added = 0
+        current = set()
+        for doc in get_all_document_paths():
+            current.add((doc['category'], doc['filename']))
+            if clause_index.is_indexed(doc['filename'], doc['category']):
+                continue
+            full_text = extract_text_from_file(doc['path'])
+            if full_text:
+                clause_index.index_document(doc['filename'], doc['category'], full_text, doc['path'])
+                added += 1
+        stale = [key for key in clause_index.indexed_documents() if key not in current]
+        for category, filename in stale:
+            clause_index.remove_document(filename, category)
+        if added or stale:
+            clause_index.save_clause_index()
+            print(f"[CLAUSE INDEX] Indexed {added} documents missing from the clause index, "
+                  f"dropped {len(stale)} no longer present.")
+        _clause_index_ready = True
+
+
+def update_clause_index(filename, category, file_path, save=True):
+    """Re-indexes one document's clauses from its OCR text. Called at ingest time."""
+    full_text = extract_text_from_file(file_path)
+    if full_text:
+        clause_index.index_document(filename, category, full_text, file_path)
+    else:
+        clause_index.remove_document(filename, category)
+    if save:
+        clause_index.save_clause_index()
+
+
+# --- GLOSSARY INDEX ---
+_glossary_index_ready = False
+# Separate from _retrieval_lock: back-filling reads every uncached document, and the
+# vector store, clause and lexical indexes must not wait for that.
+_glossary_lock = threading.Lock()
+
+
+def ensure_glossary_index():
+    """
+    Loads the merged glossary index written at ingest time, once per process. Documents
+    missing from it (e.g. ingested before it existed) are added from their cached text
+    and the index is saved. Chat lookups never wait for this: until it has run they
+    simply miss and the query goes through retrieval.
+    """
+    global _glossary_index_ready
+    if _glossary_index_ready:
+        return
+    with _glossary_lock:
+        if _glossary_index_ready:
+            return
+        count = glossary_index.load_glossary_index()
+        added = 0
+        for doc in get_all_document_paths():
+            if glossary_index.is_indexed(doc['filename'], doc['category']):
+                continue
+            # Documents without cached text are recorded too (with no terms), so they are
+            # not read again on every start; ingest re-indexes them once they have text.
+            glossary_index.index_document(doc['filename'], doc['category'], extract_text_from_file(doc['path']))
+            added += 1
+        if added:
+            glossary_index.save_glossary_index()
+        print(f"[GLOSSARY INDEX] Loaded {count} documents, added {added} missing ones.")
+        _glossary_index_ready = True
+
+
+@metrics.timed("clause_extraction")
 def extract_clause_section(document_name=None, clause_ref=None, category=None):
-    """Extracts a clause by finding its start and a flexible end boundary."""
+    """
+    Looks a clause up in the precomputed clause index (start to the next section heading)
+    and cuts it out of the document's cached text.
+    """
     if not clause_ref or not category: return []
-    target_docs = [doc for doc in get_all_document_paths() if doc['category'] == category]
-    if not target_docs: return []
+    ensure_clause_index()
     results = []
-    for doc in target_docs:
-        full_text = extract_text_from_file(doc['path'])
-        if not full_text: continue
-        start_pattern_str = r"^\s*" + re.escape(clause_ref) + r"\.?\s+.*"
-        start_match = re.search(start_pattern_str, full_text, re.MULTILINE | re.IGNORECASE)
-        if not start_match: continue
-        start_index = start_match.start()
-        end_index = len(full_text)
-        generic_end_pattern = re.compile(r"^\s*(\d{1,2}\.)\s+[A-Z\s/]+$", re.MULTILINE)
-        for match in generic_end_pattern.finditer(full_text, pos=start_match.end()):
-            end_index = match.start()
-            break
-        extracted_text = full_text[start_index:end_index].strip()
-        if extracted_text:
-            results.append({"document": doc['filename'], "text": extracted_text})
+    for entry in clause_index.lookup_clause(category, clause_ref):
+        if document_name and entry['document'] != document_name:
+            continue
+        text = clause_index.clause_text(entry, extract_text_from_file(entry['path']))
+        if text is None:
+            print(f"[CLAUSE INDEX] {entry['document']}: cached text changed since it was indexed; skipping.")
+            continue
+        results.append({"document": entry['document'], "text": text})
     return results
 
 # --- SEMANTIC SEARCH FUNCTION (Unchanged Logic, Uses Correct Imports) ---
+@metrics.timed("vector_search")
 def semantic_search(query, document_name=None, top_k=3, category=None):
     """Performs semantic search using ChromaDB on a specific category of documents."""
     if not category:
         print("[ERROR] Semantic search requires a category.")
         return []
     try:
-        embedding_function = OllamaEmbeddings(model=EMBEDDING_MODEL)
-        db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
-        all_docs = get_all_document_paths()
-        docs_in_cat = [doc['filename'] for doc in all_docs if doc['category'] == category]
+        db = get_vector_store()
+        docs_in_cat = [doc['filename'] for doc in get_documents_in_category(category)]
         if not docs_in_cat:
             print(f"[WARN] No documents found in category '{category}' for semantic search.")
             return []
@@ -115,3 +272,70 @@ def semantic_search(query, document_name=None, top_k=3, category=None):
     except Exception as e:
         print(f"[FATAL ERROR] An error occurred during semantic search: {e}")
         return []
+
+
+
+# --- LEXICAL (BM25) AND HYBRID SEARCH ---
+_lexical_index_ready = False
+_search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vector-search")
+
+
+def ensure_lexical_index():
+    """Loads the BM25 index written at ingest time, once per process."""
+    global _lexical_index_ready
+    if _lexical_index_ready:
+        return
+    with _retrieval_lock:
+        if _lexical_index_ready:
+            return
+        count = lexical_index.load_lexical_index()
+        print(f"[LEXICAL INDEX] Loaded {count} documents.")
+        _lexical_index_ready = True
+
+
+@metrics.timed("lexical_search")
+def lexical_search(query, document_name=None, top_k=3, category=None):
+    """BM25 keyword search over the same chunks as the vector store."""
+    if not category:
+        print("[ERROR] Lexical search requires a category.")
+        return []
+    ensure_lexical_index()
+    sources = {doc['filename'] for doc in get_documents_in_category(category)}
+    if document_name:
+        sources &= {document_name}
+    return [text for _, _, text, _ in lexical_index.search(query, top_k=top_k, sources=sources)]
+
+
+@metrics.timed("hybrid_search")
+def hybrid_search(query, document_name=None, top_k=3, category=None):
+    """
+    Runs the vector and BM25 searches side by side and fuses their rankings with
+    reciprocal-rank fusion, so exact terms (clause numbers, acronyms, Hindi words)
+    and paraphrases both find their chunks. The vector search gets
+    VECTOR_SEARCH_BUDGET_SECONDS; if it is late the lexical ranking is used alone.
+    """
+    start_time = time.time()
+    vector_future = _search_executor.submit(semantic_search, query, document_name, HYBRID_CANDIDATES, category)
+    lexical_results = lexical_search(query, document_name, HYBRID_CANDIDATES, category)
+    try:
+        remaining = max(0.0, VECTOR_SEARCH_BUDGET_SECONDS - (time.time() - start_time))
+        vector_results = vector_future.result(timeout=remaining)
+    except FutureTimeout:
+        print(f"[WARN] Vector search exceeded its {VECTOR_SEARCH_BUDGET_SECONDS}s budget; using lexical results only.")
+        vector_results = []
+
+    # Both rankers return the stored chunk text, so identical chunks fuse on their text.
+    scores = {}
+    for results in (vector_results, lexical_results):
+        for rank, text in enumerate(results):
+            scores[text] = scores.get(text, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:top_k]
+
+
+def search_chunks(query, document_name=None, top_k=3, category=None):
+    """Retrieves chunks with the configured RETRIEVAL_MODE."""
+    if RETRIEVAL_MODE == "lexical":
+        return lexical_search(query, document_name, top_k, category)
+    if RETRIEVAL_MODE == "hybrid":
+        return hybrid_search(query, document_name, top_k, category)
+    return semantic_search(query, document_name, top_k, category)
@@ -0,0 +1,355 @@
+import io
+import os
+import re
+import time
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import faq_matcher
+
+# --- CONFIGURATION ---
+# "pyttsx3" speaks offline through the system voices (WAV); "gtts" uses Google's service (MP3).
+TTS_ENGINE = "pyttsx3"
+# pyttsx3 voice id (None = system default) or gTTS language; part of the cache key.
+TTS_VOICE = None
+TTS_RATE = 170
+TTS_LANGUAGE = "en"
+TTS_CACHE_DIR = "data/tts_cache"
+TTS_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Answers are spoken in chunks of whole sentences. The first chunk is kept short so
+# its audio is ready, and playback starts, while the rest is still being synthesized.
+TTS_FIRST_CHUNK_CHARS = 120
+TTS_CHUNK_CHARS = 400
+# How long a request for a chunk's audio waits for its synthesis to finish.
+TTS_WAIT_SECONDS = 30
+# Answers waiting to be synthesized beyond this many are sent without audio.
+TTS_MAX_PENDING = 16
+# Synthesize every FAQ answer when the app starts, so those are never synthesized on demand.
+TTS_PRERENDER_FAQ = True
+
+# Sentence ends, including the Devanagari danda.
+SENTENCE_END = re.compile(r"(?<=[.!?\u0964])\s+|\n+")
+CACHE_KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+AUDIO_FORMATS = {"pyttsx3": ("wav", "audio/wav"), "gtts": ("mp3", "audio/mpeg")}
+
+
+class SpeechBusy(Exception):
+    pass
+
+
+# --- ENGINES ---
+class Pyttsx3Engine:
+    """One pyttsx3 engine for the whole process; it is not thread-safe, so calls are serialized."""
+
+    def __init__(self, voice=TTS_VOICE, rate=TTS_RATE):
+        import pyttsx3
+        self.engine = pyttsx3.init()
+        if voice:
+            self.engine.setProperty('voice', voice)
+        self.engine.setProperty('rate', rate)
+        self.lock = threading.Lock()
+
+    def synthesize(self, text):
+        with self.lock:
+            fd, tmp_path = tempfile.mkstemp(suffix=".wav")
+            os.close(fd)
+            try:
+                self.engine.save_to_file(text, tmp_path)
+                self.engine.runAndWait()
+                with open(tmp_path, 'rb') as f:
+                    return f.read()
+            finally:
+                os.remove(tmp_path)
+
+
+class GttsEngine:
+    """gTTS, written to memory instead of a temporary MP3 file."""
+
+    def __init__(self, language=TTS_VOICE or TTS_LANGUAGE):
+        from gtts import gTTS
+        self.gTTS = gTTS
+        self.language = language
+
+    def synthesize(self, text):
+        buf = io.BytesIO()
+        self.gTTS(text, lang=self.language).write_to_fp(buf)
+        return buf.getvalue()
+
+
+TTS_ENGINES = {"pyttsx3": Pyttsx3Engine, "gtts": GttsEngine}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+# Every synthesis runs on this one thread. It creates the engine and is the only thread
+# that drives it (SAPI5 is a COM object bound to its thread), and speech never takes a
+# voice worker away from speech recognition.
+_tts_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+_tts_pending = 0
+_tts_pending_lock = threading.Lock()
+
+
+def get_tts_engine():
+    """Initializes the configured engine once per process (on the TTS thread)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = TTS_ENGINES[TTS_ENGINE]()
+                print(f"[TTS] Using {TTS_ENGINE} speech synthesis.")
+    return _engine
+
+
+# --- TEXT CHUNKING ---
+def _split_long(sentence, max_chars):
+    """Breaks a sentence longer than max_chars at commas, then at spaces."""
+    pieces, current = [], ""
+    for part in re.split(r"(?<=[,;:])\s+|\s+", sentence):
+        if current and len(current) + 1 + len(part) > max_chars:
+            pieces.append(current)
+            current = part
+        else:
+            current = f"{current} {part}" if current else part
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_for_speech(text):
+    """Whole sentences grouped into chunks: a short first one, then up to TTS_CHUNK_CHARS each."""
+    chunks, current = [], ""
+    for sentence in (s.strip() for s in SENTENCE_END.split(text or "")):
+        if not sentence:
+            continue
+        limit = TTS_FIRST_CHUNK_CHARS if not chunks else TTS_CHUNK_CHARS
+        for piece in (_split_long(sentence, limit) if len(sentence) > limit else [sentence]):
+            limit = TTS_FIRST_CHUNK_CHARS if not chunks else TTS_CHUNK_CHARS
+            if current and len(current) + 1 + len(piece) > limit:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# --- AUDIO CACHE ---
+# Files are named by a hash of the engine, voice, rate and text, so a chunk spoken
+# once (in any answer) is never synthesized again.
+_cache_bytes = None
+_cache_lock = threading.Lock()
+# key -> Event set when a queued chunk's synthesis has finished (or failed)
+_pending = {}
+
+
+def cache_key(text):
+    raw = f"{TTS_ENGINE}|{TTS_VOICE}|{TTS_RATE}|{TTS_LANGUAGE}|{text}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def audio_format():
+    """(file extension, MIME type) of the configured engine's audio."""
+    return AUDIO_FORMATS[TTS_ENGINE]
+
+
+def _cache_path(key):
+    return os.path.join(TTS_CACHE_DIR, key[:2], f"{key}.{audio_format()[0]}")
+
+
+def _cache_size():
+    global _cache_bytes
+    if _cache_bytes is None:
+        total = 0
+        for root, _, files in os.walk(TTS_CACHE_DIR):
+            total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        _cache_bytes = total
+    return _cache_bytes
+
+
+def _prune_cache():
+    """Deletes the least recently used files until the cache is below 90% of its cap."""
+    global _cache_bytes
+    files = []
+    for root, _, names in os.walk(TTS_CACHE_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+    for _, size, path in files:
+        if _cache_bytes <= TTS_CACHE_MAX_BYTES * 0.9:
+            break
+        try:
+            os.remove(path)
+            _cache_bytes -= size
+        except OSError:
+            pass
+
+
+def is_cached(key):
+    return os.path.exists(_cache_path(key))
+
+
+def synthesize_to_cache(key, text):
+    """Synthesizes one chunk into the cache unless it is already there. Returns its path."""
+    global _cache_bytes
+    path = _cache_path(key)
+    if os.path.exists(path):
+        return path
+    with metrics.stage_timer("tts_synthesis"):
+        audio = get_tts_engine().synthesize(text)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(audio)
+    os.replace(tmp_path, path)
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_size()  # The first count already includes this file.
+        else:
+            _cache_bytes += len(audio)
+        if _cache_bytes > TTS_CACHE_MAX_BYTES:
+            _prune_cache()
+    return path
+
+
+def _render_chunks(todo):
+    """Synthesizes an answer's missing chunks in order (one TTS job per answer)."""
+    for key, text in todo:
+        try:
+            synthesize_to_cache(key, text)
+        except Exception as e:
+            print(f"[TTS] Synthesis failed: {e}")
+        finally:
+            with _cache_lock:
+                event = _pending.pop(key, None)
+            if event is not None:
+                event.set()
+
+
+def _tts_job_done(_future):
+    global _tts_pending
+    with _tts_pending_lock:
+        _tts_pending -= 1
+
+
+def submit_to_tts_thread(stage, func, *args):
+    """
+    Queues func(*args) on the TTS thread, timed as chatbot_stage_seconds{stage=...}, and
+    returns its Future. Raises SpeechBusy when TTS_MAX_PENDING jobs are already waiting.
+    """
+    global _tts_pending
+    with _tts_pending_lock:
+        if _tts_pending >= TTS_MAX_PENDING:
+            raise SpeechBusy("Too many answers waiting for speech synthesis.")
+        _tts_pending += 1
+
+    def job():
+        with metrics.stage_timer(stage):
+            return func(*args)
+
+    future = _tts_executor.submit(job)
+    future.add_done_callback(_tts_job_done)
+    return future
+
+
+# --- PUBLIC API ---
+def prepare_speech(text):
+    """
+    Splits an answer into chunks and returns their cache keys in speaking order. Chunks
+    not cached yet are synthesized in the background on the TTS thread, so the caller
+    can hand out the keys (e.g. as audio URLs) straight away.
+    """
+    chunks = split_for_speech(text)
+    keys = [cache_key(chunk) for chunk in chunks]
+    todo = []
+    with _cache_lock:
+        for key, chunk in zip(keys, chunks):
+            if key in _pending:
+                continue
+            if is_cached(key):
+                metrics.record_cache_lookup("tts", "hit")
+                continue
+            metrics.record_cache_lookup("tts", "miss")
+            _pending[key] = threading.Event()
+            todo.append((key, chunk))
+    if todo:
+        try:
+            submit_to_tts_thread("tts", _render_chunks, todo)
+        except Exception:
+            with _cache_lock:
+                for key, _ in todo:
+                    _pending.pop(key).set()
+            raise
+    return keys
+
+
+def get_audio_path(key, wait=TTS_WAIT_SECONDS):
+    """Path of a chunk's audio, waiting for it if it is still being synthesized. None if unknown."""
+    if not CACHE_KEY_PATTERN.fullmatch(key or ""):
+        return None
+    path = _cache_path(key)
+    if not os.path.exists(path):
+        event = _pending.get(key)
+        if event is None or not event.wait(wait) or not os.path.exists(path):
+            return None
+    try:
+        os.utime(path)  # Recently played audio survives pruning longest.
+    except OSError:
+        pass
+    return path
+
+
+def iter_audio_files(text):
+    """Yields an answer's audio files in order, each as soon as it is ready."""
+    for key in prepare_speech(text):
+        path = get_audio_path(key)
+        if path:
+            yield path
+
+
+def _prerender_text(text):
+    added = 0
+    for chunk in split_for_speech(text):
+        key = cache_key(chunk)
+        if not is_cached(key):
+            synthesize_to_cache(key, chunk)
+            added += 1
+    return added
+
+
+def prerender(texts):
+    """
+    Synthesizes the given answers into the cache ahead of time. Returns the chunks added.
+    Answers are queued on the TTS thread one at a time, so live answers wait for at most
+    one pre-rendered answer.
+    """
+    added = 0
+    start_time = time.time()
+    for text in texts:
+        while True:
+            try:
+                future = submit_to_tts_thread("tts_prerender", _prerender_text, text)
+                break
+            except SpeechBusy:
+                time.sleep(1)  # Live answers come first; try this one again shortly.
+        try:
+            added += future.result()
+        except Exception as e:
+            print(f"[TTS] Pre-rendering failed: {e}")
+            return added
+    print(f"[TTS] Pre-rendered {added} chunks in {time.time() - start_time:.2f}s")
+    return added
+
+
+def prerender_faq():
+    """Pre-renders every answer in the FAQ sheet (run in a background thread at start-up)."""
+    return prerender(faq_matcher.faq_responses())
+
+
+metrics.register_gauge("chatbot_tts_pending", "Answers being synthesized or waiting for the TTS thread.",
+                       lambda: _tts_pending)
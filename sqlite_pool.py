@@ -0,0 +1,180 @@
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+
+import metrics
+
+# --- CONFIGURATION ---
+# Accounts, access requests and password resets (app.py).
+AUTH_DB_PATH = "chatbot.db"
+# Chat/voice logs, feedback and conversation memory (database.py, conversation_memory.py).
+LOG_DB_PATH = "sail_chatbot.db"
+# How long a connection waits for another writer's lock before failing.
+SQLITE_BUSY_TIMEOUT_SECONDS = 10
+# Applied to every new connection. WAL lets readers and the single writer work at the
+# same time; synchronous=NORMAL is crash-safe in WAL mode and fsyncs only at checkpoints.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",  # 16 MB of page cache
+    "PRAGMA mmap_size=134217728",
+)
+# Idle connections kept per database file; more are opened under load and closed afterwards.
+SQLITE_POOL_SIZE = 8
+# Log rows are committed by a background thread in batches of up to this many...
+LOG_BATCH_SIZE = 200
+# ...at most this long after they were queued.
+LOG_FLUSH_INTERVAL_SECONDS = 0.5
+# Rows beyond this many waiting are written on the caller's thread instead of dropped.
+LOG_QUEUE_MAX = 10000
+
+
+class PooledConnection(sqlite3.Connection):
+    """A sqlite3 connection whose close() hands it back to the pool instead of closing it."""
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()  # What closing used to do with uncommitted changes.
+        self.row_factory = sqlite3.Row
+        with _pool_lock:
+            idle = _idle.setdefault(self.pool_path, [])
+            if len(idle) < SQLITE_POOL_SIZE:
+                idle.append(self)
+                return
+        super().close()
+
+
+# path -> [PooledConnection, ...] not in use
+_idle = {}
+_pool_lock = threading.Lock()
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT_SECONDS, check_same_thread=False,
+                           factory=PooledConnection)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    conn.pool_path = path
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def get_connection(path):
+    """
+    A connection to the given database file, reused from the pool when one is idle.
+    Callers close() it as before, which returns it to the pool.
+    """
+    with _pool_lock:
+        idle = _idle.get(path)
+        if idle:
+            return idle.pop()
+    return _connect(path)
+
+
+def close_all():
+    """Really closes every idle connection (e.g. before a database file is replaced)."""
+    with _pool_lock:
+        connections = [conn for idle in _idle.values() for conn in idle]
+        _idle.clear()
+    for conn in connections:
+        sqlite3.Connection.close(conn)
+
+
+# --- BACKGROUND WRITER ---
+# (path, sql, params) rows waiting to be written; None asks the writer to flush now.
+_writes = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+_flushed = threading.Condition()
+_queued_count = 0
+_written_count = 0
+
+
+def _write_batch(batch):
+    """Commits a batch with one transaction (and at most one fsync) per database file."""
+    by_path = {}
+    for path, sql, params in batch:
+        by_path.setdefault(path, []).append((sql, params))
+    for path, rows in by_path.items():
+        conn = get_connection(path)
+        try:
+            with metrics.stage_timer("db_log_write"):
+                with conn:
+                    for sql, params in rows:
+                        conn.execute(sql, params)
+        except Exception as e:
+            # One bad row must not lose the rest of the batch.
+            print(f"[DB] Batch write to {path} failed ({e}); retrying row by row.")
+            for sql, params in rows:
+                try:
+                    with conn:
+                        conn.execute(sql, params)
+                except Exception as row_error:
+                    print(f"[DB] Dropped log row: {row_error}")
+        finally:
+            conn.close()
+
+
+def _writer_loop():
+    global _written_count
+    while True:
+        item = _writes.get()
+        batch = [] if item is None else [item]
+        deadline = time.time() + LOG_FLUSH_INTERVAL_SECONDS
+        while item is not None and len(batch) < LOG_BATCH_SIZE:
+            try:
+                item = _writes.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                break
+            if item is not None:
+                batch.append(item)
+        if batch:
+            _write_batch(batch)
+        with _flushed:
+            _written_count += len(batch)
+            _flushed.notify_all()
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_writer_loop, name="sqlite-log-writer", daemon=True)
+                _writer.start()
+
+
+def enqueue_write(path, sql, params=()):
+    """
+    Queues one INSERT for the background writer and returns at once; the row is committed
+    within LOG_FLUSH_INTERVAL_SECONDS. When the queue is full the row is written here instead.
+    """
+    global _queued_count
+    if _writes.qsize() >= LOG_QUEUE_MAX:
+        metrics.inc("chatbot_db_writes_total", mode="direct")
+        _write_batch([(path, sql, params)])
+        return
+    _ensure_writer()
+    with _flushed:
+        _queued_count += 1
+    metrics.inc("chatbot_db_writes_total", mode="queued")
+    _writes.put((path, sql, params))
+
+
+def flush_writes(timeout=5.0):
+    """Waits until every row queued so far is committed. Returns False on timeout."""
+    with _flushed:
+        target = _queued_count
+        if _written_count >= target:
+            return True
+    _writes.put(None)
+    with _flushed:
+        return _flushed.wait_for(lambda: _written_count >= target, timeout)
+
+
+atexit.register(flush_writes)
+metrics.register_gauge("chatbot_db_write_queue", "Log rows waiting for the background SQLite writer.",
+                       _writes.qsize)
@@ -519,6 +519,61 @@ function resetUserPasswordPrompt(email) {
     }
 }
 
+// Admin listings are paged: each "Load more" fetches the rows after the last one shown
+function loadMoreRows(button, listing, tbodyId) {
+    const tbody = document.getElementById(tbodyId);
+    const cursor = button.dataset.cursor;
+    if (!tbody || !cursor) return;
+
+    button.disabled = true;
+    fetch(`/admin/listings/${listing}?cursor=${encodeURIComponent(cursor)}`)
+    .then(response => {
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        return response.json();
+    })
+    .then(page => {
+        page.rows.forEach(row => tbody.appendChild(listingRow(listing, row)));
+        if (page.next_cursor) {
+            button.dataset.cursor = page.next_cursor;
+            button.disabled = false;
+        } else {
+            button.remove();
+        }
+    })
+    .catch(error => {
+        console.error('❌ Loading more rows failed:', error);
+        button.disabled = false;
+    });
+}
+
+function listingRow(listing, row) {
+    const tr = document.createElement('tr');
+    [row.email, row.created_at].forEach(value => {
+        const td = document.createElement('td');
+        td.textContent = value;
+        tr.appendChild(td);
+    });
+
+    const actions = document.createElement('td');
+    if (listing === 'account_requests') {
+        tr.id = `account-req-${row.id}`;
+        actions.appendChild(actionButton('btn-approve', '✅ Approve', () => approveAccount(row.id)));
+        actions.appendChild(actionButton('btn-deny', '❌ Deny', () => denyAccount(row.id)));
+    } else {
+        actions.appendChild(actionButton('btn-deny', '🔑 Reset Password', () => resetUserPasswordPrompt(row.email)));
+    }
+    tr.appendChild(actions);
+    return tr;
+}
+
+function actionButton(className, label, onClick) {
+    const button = document.createElement('button');
+    button.className = className;
+    button.textContent = label;
+    button.addEventListener('click', onClick);
+    return button;
+}
+
 // Utility functions
 function refreshDebugInfo() {
     console.log('🔄 Refreshing debug info...');
@@ -705,6 +760,7 @@ function sendMessage(customMessage = null) {
         message: message,
         category: category,
         type: 'text',
+        stream: true,
         timestamp: new Date().toISOString()
     };
 
@@ -717,17 +773,20 @@ function sendMessage(customMessage = null) {
         if (!response.ok) {
             throw new Error(`HTTP ${response.status}: ${response.statusText}`);
         }
-        return response.json();
-    })
-    .then(data => {
-        hideTypingIndicator();
-
-        if (data.error) {
-            addBotMessage('❌ Error: ' + data.error);
-            scheduleUnlock(1000);
-        } else {
-            addBotMessageWithRealDynamicTiming(data);
+        const contentType = response.headers.get('Content-Type') || '';
+        if (contentType.includes('application/x-ndjson') && response.body) {
+            return readStreamedResponse(response);
         }
+        return response.json().then(data => {
+            hideTypingIndicator();
+
+            if (data.error) {
+                addBotMessage('❌ Error: ' + data.error);
+                scheduleUnlock(1000);
+            } else {
+                addBotMessageWithRealDynamicTiming(data);
+            }
+        });
     })
     .catch(error => {
         console.error('❌ Request failed:', error);
@@ -737,6 +796,83 @@ function sendMessage(customMessage = null) {
     });
 }
 
+// ===== REAL TOKEN STREAMING =====
+async function readStreamedResponse(response) {
+    const chat = document.getElementById('chat');
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    let contentDiv = null;
+    let messageDiv = null;
+    let timeDiv = null;
+
+    const ensureMessage = (category) => {
+        if (messageDiv || !chat) return;
+        hideTypingIndicator();
+
+        messageDiv = document.createElement('div');
+        messageDiv.className = 'message bot-message streaming-message';
+
+        contentDiv = document.createElement('div');
+        contentDiv.className = 'message-content';
+
+        timeDiv = document.createElement('div');
+        timeDiv.className = 'message-time';
+        timeDiv.textContent = new Date().toLocaleTimeString();
+        if (category && category !== 'general') {
+            timeDiv.textContent += ' • ' + category;
+        }
+
+        messageDiv.appendChild(contentDiv);
+        messageDiv.appendChild(timeDiv);
+        chat.appendChild(messageDiv);
+    };
+
+    const handleEvent = (event) => {
+        if (event.type === 'meta') {
+            ensureMessage(event.category);
+        } else if (event.type === 'queued') {
+            ensureMessage();
+            if (!text && contentDiv) {
+                contentDiv.textContent = `⏳ Waiting for the assistant (position ${event.position} in queue)...`;
+            }
+        } else if (event.type === 'token') {
+            ensureMessage();
+            text += event.text;
+            if (contentDiv) contentDiv.textContent = text;
+            if (chat) chat.scrollTop = chat.scrollHeight;
+        } else if (event.type === 'error') {
+            ensureMessage();
+            text += (text ? '\n\n' : '') + '❌ Error: ' + event.error;
+            if (contentDiv) contentDiv.textContent = text;
+        }
+    };
+
+    streamingInProgress = true;
+    try {
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let newlineIndex;
+            while ((newlineIndex = buffer.indexOf('\n')) >= 0) {
+                const line = buffer.slice(0, newlineIndex).trim();
+                buffer = buffer.slice(newlineIndex + 1);
+                if (line) handleEvent(JSON.parse(line));
+            }
+        }
+        if (buffer.trim()) handleEvent(JSON.parse(buffer));
+    } finally {
+        streamingInProgress = false;
+        hideTypingIndicator();
+        if (messageDiv) messageDiv.classList.remove('streaming-message');
+        console.log(`✅ Streaming complete! ${text.length} chars`);
+        scheduleUnlock(calculateReadingTime(text));
+    }
+}
+
 // ===== STREAMING WITH QUICK UNLOCK =====
 function addBotMessageWithRealDynamicTiming(data) {
     const chat = document.getElementById('chat');
@@ -1123,6 +1259,10 @@ function sendVoiceToServer(audioData) {
                 category: category
             });
         }
+
+        if (data.audio && data.audio.length) {
+            playVoiceAnswer(data.audio);
+        }
     })
     .catch(error => {
         hideTypingIndicator();
@@ -1253,6 +1393,29 @@ function getFileIcon(fileType) {
 // Make sure the function is globally available
 window.viewFolder = viewFolder;
 
+// Plays a spoken answer chunk by chunk; the next chunk is fetched while one plays.
+function playVoiceAnswer(urls) {
+    const load = (url) => {
+        const audio = new Audio(url);
+        audio.preload = 'auto';
+        return audio;
+    };
+    let index = 0;
+    let next = load(urls[0]);
+
+    const playNext = () => {
+        if (index >= urls.length) return;
+        const current = next;
+        index++;
+        next = index < urls.length ? load(urls[index]) : null;
+        current.onended = playNext;
+        current.onerror = playNext;
+        current.play().catch(error => console.error('❌ Audio playback failed:', error));
+    };
+
+    playNext();
+}
+
 function resetVoiceInterface() {
     voiceState = 'idle';
     updateVoiceUI();
@@ -1288,6 +1451,7 @@ window.testAllEndpoints = testAllEndpoints;
 window.approveAccount = approveAccount;
 window.denyAccount = denyAccount;
 window.resetUserPasswordPrompt = resetUserPasswordPrompt;
+window.loadMoreRows = loadMoreRows;
 window.refreshDebugInfo = refreshDebugInfo;
 window.refreshLogs = refreshLogs;
 window.viewFolder = viewFolder;
@@ -0,0 +1,194 @@
+import os
+import re
+import json
+import time
+import hashlib
+import atexit
+import zipfile
+import threading
+
+# --- CONFIGURATION ---
+OCR_CACHE_DIR = "data/ocr_cache"
+TEXT_STORE_DIR = os.path.join(OCR_CACHE_DIR, "store")
+TEXT_INDEX_PATH = os.path.join(OCR_CACHE_DIR, "text_index.json")
+# New hashes are written to the index at most this often (and at exit).
+INDEX_SAVE_INTERVAL_SECONDS = 5.0
+
+PAGE_MARKER = re.compile(r"\n--- Page (\d+) ---\n")
+
+# One content-addressed store for every extracted text (OCR, PDF text layer, DOCX, TXT).
+# Each document is a zip named after the MD5 of the source file, holding one
+# compressed entry per page, so a single page can be read without the rest.
+# text_index.json maps path -> (mtime, size, hash), so a file is only hashed
+# again when it changes.
+_index = None
+_index_dirty = False
+_index_saved_at = 0.0
+_index_lock = threading.RLock()
+
+
+def _load_index():
+    global _index
+    if _index is None:
+        _index = {}
+        if os.path.exists(TEXT_INDEX_PATH):
+            try:
+                with open(TEXT_INDEX_PATH, 'r', encoding='utf-8') as f:
+                    _index = json.load(f)
+            except Exception as e:
+                print(f"[TEXT CACHE] Error loading index, files will be re-hashed: {e}")
+    return _index
+
+
+def flush_index():
+    """Writes pending index changes to disk."""
+    global _index_dirty, _index_saved_at
+    with _index_lock:
+        if not _index_dirty:
+            return
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{TEXT_INDEX_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(_index, f)
+        os.replace(tmp_path, TEXT_INDEX_PATH)
+        _index_dirty = False
+        _index_saved_at = time.monotonic()
+
+
+atexit.register(flush_index)
+
+
+def hash_file(file_path):
+    hash_md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+def get_content_hash(file_path):
+    """Returns the file's MD5, hashing it only if its size or mtime changed since last time."""
+    global _index_dirty
+    key = os.path.normpath(file_path)
+    stat = os.stat(file_path)
+    with _index_lock:
+        entry = _load_index().get(key)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            return entry["hash"]
+    file_hash = hash_file(file_path)
+    with _index_lock:
+        _load_index()[key] = {"mtime": stat.st_mtime, "size": stat.st_size, "hash": file_hash}
+        _index_dirty = True
+        if time.monotonic() - _index_saved_at >= INDEX_SAVE_INTERVAL_SECONDS:
+            flush_index()
+    return file_hash
+
+
+def _blob_path(file_hash):
+    return os.path.join(TEXT_STORE_DIR, file_hash[:2], file_hash + ".zip")
+
+
+def _page_name(page_number):
+    return f"page_{page_number:05d}.txt"
+
+
+def split_pages(text):
+    """Splits text carrying '--- Page N ---' markers into {page_number: page_text}."""
+    parts = PAGE_MARKER.split(text)
+    if len(parts) == 1:
+        return None
+    pages = {}
+    for i in range(1, len(parts), 2):
+        pages[int(parts[i])] = parts[i + 1]
+    return pages
+
+
+# --- WRITES ---
+def write_pages(file_path, pages, paged=True):
+    """Stores {page_number: text} for a file. Pages are joined back with page markers on read."""
+    file_hash = get_content_hash(file_path)
+    blob_path = _blob_path(file_hash)
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    tmp_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("meta.json", json.dumps({
+            "source": os.path.basename(file_path),
+            "paged": paged,
+            "pages": sorted(pages),
+            "created": time.time(),
+        }))
+        for page_number, text in pages.items():
+            zf.writestr(_page_name(page_number), text)
+    os.replace(tmp_path, blob_path)
+
+
+def write_text(file_path, text):
+    """Stores extracted text for a file, split into pages if it carries page markers."""
+    pages = split_pages(text)
+    if pages is None:
+        write_pages(file_path, {1: text}, paged=False)
+    else:
+        write_pages(file_path, pages, paged=True)
+
+
+def remove_text(file_path=None, file_hash=None):
+    """Drops the cached text for a file's current content, or for a known hash (e.g. of a deleted file)."""
+    if file_hash is None:
+        try:
+            file_hash = get_content_hash(file_path)
+        except OSError:
+            return
+    blob_path = _blob_path(file_hash)
+    if os.path.exists(blob_path):
+        os.remove(blob_path)
+
+
+# --- READS ---
+def has_text(file_path):
+    try:
+        return os.path.exists(_blob_path(get_content_hash(file_path)))
+    except OSError:
+        return False
+
+
+def _open(file_path):
+    try:
+        blob_path = _blob_path(get_content_hash(file_path))
+    except OSError:
+        return None
+    if not os.path.exists(blob_path):
+        return None
+    return zipfile.ZipFile(blob_path, 'r')
+
+
+def read_text(file_path):
+    """Returns the whole cached text (with page markers for paged documents), or None."""
+    zf = _open(file_path)
+    if zf is None:
+        return None
+    with zf:
+        meta = json.loads(zf.read("meta.json"))
+        texts = [(page, zf.read(_page_name(page)).decode('utf-8')) for page in meta["pages"]]
+    if not meta["paged"]:
+        return texts[0][1] if texts else ""
+    return "".join(f"\n--- Page {page} ---\n" + text for page, text in texts)
+
+
+def read_page(file_path, page_number):
+    """Returns the text of one page without decompressing the others, or None."""
+    zf = _open(file_path)
+    if zf is None:
+        return None
+    with zf:
+        try:
+            return zf.read(_page_name(page_number)).decode('utf-8')
+        except KeyError:
+            return None
+
+
+def page_count(file_path):
+    zf = _open(file_path)
+    if zf is None:
+        return 0
+    with zf:
+        return len(json.loads(zf.read("meta.json"))["pages"])
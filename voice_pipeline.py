@@ -0,0 +1,192 @@
+import io
+import os
+import json
+import wave
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import numpy as np
+
+import metrics
+
+# --- CONFIGURATION ---
+# "auto" uses Vosk when its package and model are installed, otherwise Whisper through
+# transformers. Both run on this machine: no audio leaves the server.
+ASR_BACKEND = "auto"
+VOSK_MODEL_PATH = "models/vosk-model-small-en-in-0.4"
+WHISPER_MODEL = "openai/whisper-base"
+ASR_LANGUAGE = "en"
+# Load the ASR model when the app starts rather than on the first voice query.
+ASR_WARM_UP_AT_START = True
+SAMPLE_RATE = 16000
+# Browsers record webm/ogg (Opus); ffmpeg turns them into 16 kHz mono PCM. WAV needs no ffmpeg.
+FFMPEG_BINARY = "ffmpeg"
+# Speech recognition and synthesis run here, never on a Flask request thread.
+VOICE_WORKERS = 2
+# Requests beyond this many waiting for a worker are refused instead of piling up.
+VOICE_MAX_PENDING = 8
+VOICE_TIMEOUT_SECONDS = 60
+# The browser stops recording after 5 seconds; anything much larger is not a voice query.
+VOICE_MAX_AUDIO_BYTES = 5 * 1024 * 1024
+
+
+class VoiceBusy(Exception):
+    pass
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+# --- AUDIO DECODING ---
+def decode_audio(audio_bytes):
+    """Any recorded clip -> float32 mono samples at SAMPLE_RATE in [-1, 1]."""
+    if audio_bytes[:4] == b"RIFF":
+        try:
+            with wave.open(io.BytesIO(audio_bytes)) as wav:
+                if wav.getframerate() == SAMPLE_RATE and wav.getnchannels() == 1 and wav.getsampwidth() == 2:
+                    pcm = wav.readframes(wav.getnframes())
+                    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        except wave.Error:
+            pass  # e.g. a float WAV: let ffmpeg convert it
+    try:
+        result = subprocess.run(
+            [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+             "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+            input=audio_bytes, capture_output=True, timeout=VOICE_TIMEOUT_SECONDS, check=True)
+    except FileNotFoundError:
+        raise AudioDecodeError(f"{FFMPEG_BINARY} is not installed; only 16 kHz mono WAV can be decoded.")
+    except subprocess.CalledProcessError as e:
+        raise AudioDecodeError(e.stderr.decode('utf-8', 'replace').strip() or "ffmpeg failed")
+    return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+# --- ASR BACKENDS ---
+class VoskBackend:
+    """Kaldi models through the vosk package; small, fast on CPU."""
+
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        from vosk import Model
+        self.model = Model(model_path)
+
+    def transcribe(self, samples):
+        from vosk import KaldiRecognizer
+        recognizer = KaldiRecognizer(self.model, SAMPLE_RATE)
+        recognizer.AcceptWaveform((samples * 32767).astype(np.int16).tobytes())
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+
+class WhisperBackend:
+    """Whisper through the transformers pipeline (weights cached locally after the first download)."""
+
+    def __init__(self, model_name=WHISPER_MODEL):
+        from transformers import pipeline
+        self.pipe = pipeline("automatic-speech-recognition", model=model_name)
+
+    def transcribe(self, samples):
+        result = self.pipe({"raw": samples, "sampling_rate": SAMPLE_RATE},
+                           generate_kwargs={"language": ASR_LANGUAGE, "task": "transcribe"})
+        return result.get("text", "")
+
+
+ASR_BACKENDS = {"vosk": VoskBackend, "whisper": WhisperBackend}
+
+_asr = None
+_asr_lock = threading.Lock()
+
+
+def get_asr_backend():
+    """Loads the configured ASR backend once per process (on first use, in a voice worker)."""
+    global _asr
+    if _asr is None:
+        with _asr_lock:
+            if _asr is None:
+                names = [ASR_BACKEND] if ASR_BACKEND != "auto" else (
+                    ["vosk", "whisper"] if os.path.isdir(VOSK_MODEL_PATH) else ["whisper"])
+                errors = []
+                for name in names:
+                    try:
+                        _asr = ASR_BACKENDS[name]()
+                        print(f"[VOICE] Using {name} speech recognition.")
+                        break
+                    except Exception as e:
+                        errors.append(f"{name}: {e}")
+                if _asr is None:
+                    raise RuntimeError(f"No speech recognition backend available ({'; '.join(errors)})")
+    return _asr
+
+
+# --- WORKER POOL ---
+_executor = ThreadPoolExecutor(max_workers=VOICE_WORKERS, thread_name_prefix="voice")
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _job_done(_future):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+def submit_to_voice_pool(stage, func, *args):
+    """
+    Queues func(*args) on the voice worker pool, timed as chatbot_stage_seconds{stage=...},
+    and returns its Future. Raises VoiceBusy when VOICE_MAX_PENDING jobs are already waiting.
+    """
+    global _pending
+    with _pending_lock:
+        if _pending >= VOICE_MAX_PENDING + VOICE_WORKERS:
+            metrics.inc("chatbot_voice_rejected_total")
+            raise VoiceBusy("Too many voice requests in progress.")
+        _pending += 1
+
+    def job():
+        with metrics.stage_timer(stage):
+            return func(*args)
+
+    future = _executor.submit(job)
+    future.add_done_callback(_job_done)
+    return future
+
+
+def run_in_voice_pool(stage, func, *args):
+    """
+    Runs func(*args) on the voice worker pool and waits for its result. Raises VoiceBusy
+    when the pool is saturated or the job takes longer than VOICE_TIMEOUT_SECONDS.
+    """
+    future = submit_to_voice_pool(stage, func, *args)
+    try:
+        return future.result(timeout=VOICE_TIMEOUT_SECONDS)
+    except FutureTimeout:
+        metrics.inc("chatbot_voice_rejected_total")
+        raise VoiceBusy(f"Voice job took longer than {VOICE_TIMEOUT_SECONDS}s.")
+
+
+def _transcribe(audio_bytes):
+    with metrics.stage_timer("voice_decode"):
+        samples = decode_audio(audio_bytes)
+    if not len(samples):
+        return ""
+    return get_asr_backend().transcribe(samples).strip()
+
+
+def transcribe(audio_bytes):
+    """Recorded audio -> text, on the voice worker pool. Returns "" for silence."""
+    if len(audio_bytes) > VOICE_MAX_AUDIO_BYTES:
+        raise AudioDecodeError(f"Audio larger than {VOICE_MAX_AUDIO_BYTES} bytes.")
+    return run_in_voice_pool("asr", _transcribe, audio_bytes)
+
+
+def warm_up_asr():
+    """Loads the ASR model at start-up so the first voice query does not pay for it."""
+    try:
+        run_in_voice_pool("asr_warm_up", lambda: get_asr_backend().transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32)))
+        return True
+    except Exception as e:
+        print(f"[ERROR] Speech recognition warm-up failed: {e}")
+        return False
+
+
+metrics.register_gauge("chatbot_voice_pending", "Voice jobs running or waiting for a voice worker.",
+                       lambda: _pending)